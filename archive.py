@@ -0,0 +1,278 @@
+#!/usr/bin/python
+
+# archive.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2019
+#
+# Render Queue Job Archive
+# Archived jobs are stored as lines of JSON in gzip-compressed files, one
+# per month, e.g. archive/2019-06.jsonl.gz. Each line holds the job data and
+# a summary of its tasks. Jobs archived together are compressed as a single
+# gzip member appended to the file, so archiving never rewrites existing
+# data.
+# An uncompressed index (archive/index.jsonl) holds a line for each job with
+# its name, user and times, and the position of the gzip member holding the
+# job, so jobs can be found and loaded without decompressing the archive.
+#   python archive.py /path/to/database --user bob --since 2019-01-01
+#   python archive.py /path/to/database --job <jobID>
+#   python archive.py /path/to/database --migrate  (pack loose JSON files)
+
+
+import argparse
+import glob
+import gzip
+import io
+import json
+import os
+import sys
+import time
+import zlib
+
+
+# Job fields copied to the index
+INDEX_FIELDS = ['jobName', 'jobType', 'username', 'priority', 'frames', 'submitTime']
+
+
+def getTaskSummary(task, status):
+	""" Return a compact summary of a task for the archive.
+		'status' is the name of the folder the task was found in.
+	"""
+	summary = {
+		'taskNo': task.get('taskNo'),
+		'frames': task.get('frames'),
+		'status': status,
+	}
+	for key in ['workerID', 'startTime', 'endTime', 'resources']:
+		if task.get(key) is not None:
+			summary[key] = task[key]
+	if 'startTime' in task and 'endTime' in task:
+		summary['duration'] = round(task['endTime'] - task['startTime'], 2)
+	if task.get('attempts'):
+		summary['attempts'] = [
+			[attempt.get('result'), attempt.get('workerID'),
+			 round(attempt['endTime'] - attempt['startTime'], 2)
+			 if attempt.get('endTime') and attempt.get('startTime') else None]
+			for attempt in task['attempts']]
+	return summary
+
+
+class JobArchive(object):
+	""" Class to add jobs to the archive and look them up.
+		Appending is not safe for concurrent writers, so callers should hold
+		the 'archive' lock (see RenderQueue.acquireLock()).
+	"""
+	def __init__(self, location):
+		self.location = location
+		self.indexfile = os.path.join(location, 'index.jsonl')
+
+
+	def getPartition(self, timestamp):
+		""" Return the name of the archive file for the given time.
+		"""
+		return '%s.jsonl.gz' %time.strftime("%Y-%m", time.localtime(timestamp))
+
+
+	def append(self, records):
+		""" Add records to the archive. Each record is a dictionary with the
+			job data under 'job' and a list of task summaries under 'tasks'.
+			Returns True if successful.
+		"""
+		if not records:
+			return True
+
+		now = time.time()
+		partition = self.getPartition(now)
+		path = os.path.join(self.location, partition)
+
+		lines = []
+		for record in records:
+			record['archiveTime'] = now
+			lines.append(json.dumps(record, sort_keys=True) + "\n")
+		data = "".join(lines).encode('utf-8')
+
+		buf = io.BytesIO()
+		with gzip.GzipFile(fileobj=buf, mode='wb', mtime=now) as f:
+			f.write(data)
+		member = buf.getvalue()
+
+		try:
+			with open(path, 'ab') as f:
+				f.seek(0, os.SEEK_END)
+				offset = f.tell()
+				f.write(member)
+
+			index = []
+			for record in records:
+				job = record['job']
+				entry = dict((key, job.get(key)) for key in INDEX_FIELDS)
+				entry.update(
+					jobID=job['jobID'],
+					tasks=len(record['tasks']),
+					archiveTime=now,
+					partition=partition,
+					offset=offset,
+					length=len(member))
+				index.append(json.dumps(entry, sort_keys=True) + "\n")
+			with open(self.indexfile, 'a') as f:
+				f.write("".join(index))
+			return True
+
+		except (IOError, OSError) as e:
+			print("ERROR: Unable to write to job archive: %s" %e)
+			return False
+
+
+	def find(self, jobID=None, username=None, jobName=None, start=None, end=None):
+		""" Return the index entries of archived jobs matching all of the
+			given criteria. 'jobName' matches part of the name, and 'start'
+			and 'end' are timestamps limiting the time jobs were archived.
+		"""
+		found = []
+		try:
+			with open(self.indexfile) as f:
+				for line in f:
+					if jobID and jobID not in line:
+						continue  # Quick check before parsing
+					try:
+						entry = json.loads(line)
+					except ValueError:
+						continue
+					if jobID and entry['jobID'] != jobID:
+						continue
+					if username and entry.get('username') != username:
+						continue
+					if jobName and jobName.lower() not in (entry.get('jobName') or "").lower():
+						continue
+					if start is not None and entry['archiveTime'] < start:
+						continue
+					if end is not None and entry['archiveTime'] >= end:
+						continue
+					found.append(entry)
+		except IOError:
+			pass
+		return found
+
+
+	def readMember(self, partition, offset, length):
+		""" Return the records in the gzip member at the given position.
+		"""
+		with open(os.path.join(self.location, partition), 'rb') as f:
+			f.seek(offset)
+			data = zlib.decompress(f.read(length), 16 + zlib.MAX_WBITS)
+		return [json.loads(line) for line in data.decode('utf-8').splitlines() if line]
+
+
+	def getJob(self, jobID):
+		""" Return the archived record for a job, with the job data under
+			'job' and task summaries under 'tasks', or None if not found.
+		"""
+		for entry in reversed(self.find(jobID=jobID)):
+			try:
+				for record in self.readMember(entry['partition'], entry['offset'], entry['length']):
+					if record['job'].get('jobID') == jobID:
+						return record
+			except (IOError, OSError, ValueError, zlib.error) as e:
+				print("Warning: Unable to read archived job %s: %s" %(jobID, e))
+		return None
+
+
+	def readRecords(self, start=None, end=None):
+		""" Yield all archived records, optionally limited to those archived
+			between 'start' and 'end' (timestamps). Only the monthly files
+			overlapping the period are read.
+		"""
+		first = self.getPartition(start) if start is not None else None
+		last = self.getPartition(end) if end is not None else None
+		for path in sorted(glob.glob(os.path.join(self.location, '*.jsonl.gz'))):
+			partition = os.path.basename(path)
+			if (first and partition < first) or (last and partition > last):
+				continue
+			with gzip.open(path, 'rb') as f:
+				for line in f:
+					try:
+						record = json.loads(line.decode('utf-8'))
+					except ValueError:
+						continue
+					if start is not None and record['archiveTime'] < start:
+						continue
+					if end is not None and record['archiveTime'] >= end:
+						continue
+					yield record
+
+
+	def migrate(self):
+		""" Add job data files archived as loose JSON files to the archive,
+			then remove them. Their tasks were not kept, so the records have
+			no task summaries. Returns the number of jobs migrated.
+		"""
+		paths = sorted(glob.glob(os.path.join(self.location, '*.json')))
+		records = []
+		for path in paths:
+			try:
+				with open(path) as f:
+					job = json.load(f)
+			except (IOError, ValueError):
+				print("Warning: Unable to read %s" %path)
+				continue
+			records.append({'job': job, 'tasks': []})
+
+		if not self.append(records):
+			return 0
+		for path in paths:
+			os.remove(path)
+		return len(records)
+
+# ----------------------------------------------------------------------------
+# Run as standalone app
+# ----------------------------------------------------------------------------
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Render Queue Job Archive")
+	parser.add_argument('database',
+		help="path to the render queue database")
+	parser.add_argument('-j', '--job',
+		help="print the archived record for a job")
+	parser.add_argument('-u', '--user',
+		help="list jobs submitted by a user")
+	parser.add_argument('-n', '--name',
+		help="list jobs with names containing this text")
+	parser.add_argument('-s', '--since',
+		help="list jobs archived since a date (YYYY-MM-DD)")
+	parser.add_argument('--migrate', action='store_true',
+		help="pack job files archived by earlier versions into the archive")
+	args = parser.parse_args()
+
+	location = os.path.join(args.database, 'archive')
+	if not os.path.isdir(location):
+		print("ERROR: No archive found at: %s" %location)
+		sys.exit(1)
+	archive = JobArchive(location)
+
+	if args.migrate:
+		# Hold the same lock as RenderQueue.archiveJobs()
+		import database
+		rq = database.RenderQueue(args.database)
+		if not rq.acquireLock('archive'):
+			print("ERROR: The archive is locked by another client.")
+			sys.exit(1)
+		try:
+			print("Migrated %d job(s)." %archive.migrate())
+		finally:
+			rq.releaseLock('archive')
+
+	elif args.job:
+		record = archive.getJob(args.job)
+		if record is None:
+			print("ERROR: Job not found in archive: %s" %args.job)
+			sys.exit(1)
+		print(json.dumps(record, indent=4, sort_keys=True))
+
+	else:
+		since = time.mktime(time.strptime(args.since, "%Y-%m-%d")) if args.since else None
+		for entry in archive.find(username=args.user, jobName=args.name, start=since):
+			print("%s  %s  %-10s %5d tasks  %s" %(
+				time.strftime("%Y-%m-%d %H:%M", time.localtime(entry['archiveTime'])),
+				entry['jobID'], entry.get('username'), entry['tasks'], entry.get('jobName')))
+
+	sys.exit(0)
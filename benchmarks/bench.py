@@ -0,0 +1,264 @@
+#!/usr/bin/python
+
+# bench.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2019
+#
+# Render Queue Benchmarks
+# Times the database operations on the hot paths of the worker and the UI
+# against a synthetic database, and writes the results as JSON so they can
+# be compared between revisions, e.g.
+#   python benchmarks/bench.py --jobs 500 --tasks 100 -o before.json
+#   (make changes)
+#   python benchmarks/bench.py --jobs 500 --tasks 100 --compare before.json
+# Use --latency to add a delay to every file system call, to emulate a
+# database on a network file system. The number of file system calls made
+# by each scenario is also recorded, which unlike the timings doesn't
+# depend on the machine the benchmarks are run on.
+
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import custom modules
+import database
+import sequence
+
+from generate import generateDatabase
+from latency import FileSystemLatency
+
+
+# ----------------------------------------------------------------------------
+# Scenarios
+# ----------------------------------------------------------------------------
+
+def getJobs(rq, sample):
+	rq.getJobs()
+
+
+def getTasks(rq, sample):
+	rq.getTasks(sample['jobID'])
+
+
+def getWorkers(rq, sample):
+	rq.getWorkers()
+
+
+def getTaskToRender(rq, sample):
+	rq.getTaskToRender(sample['workerID'])
+
+
+def newJob(rq, sample):
+	""" Submit a job with the same number of tasks as the generated jobs.
+		The job is deleted again by cleanupNewJob(), outside of the timing.
+	"""
+	job = dict(sample['job'], jobName="bench_newJob")
+	del job['jobID']
+	sample['newJobID'] = rq.newJob(**job)
+
+
+def cleanupNewJob(rq, sample):
+	rq.deleteJob(sample.pop('newJobID'))
+
+
+def updateQueueView(rq, sample):
+	""" The database reads and frame counting done by
+		RenderQueueApp.updateQueueView() to refresh the queue view. The
+		widget updates themselves are not included, so Qt is not needed.
+	"""
+	for job in rq.getJobs():
+		sequence.numList(job['frames'])
+		for task in rq.getTasks(job['jobID']):
+			sequence.numList(task['frames'])
+
+
+# Scenarios in the order they are run: (name, function, cleanup function)
+SCENARIOS = [
+	('getJobs', getJobs, None),
+	('getTasks', getTasks, None),
+	('getWorkers', getWorkers, None),
+	('getTaskToRender', getTaskToRender, None),
+	('newJob', newJob, cleanupNewJob),
+	('updateQueueView', updateQueueView, None),
+]
+
+
+# ----------------------------------------------------------------------------
+# Benchmark functions
+# ----------------------------------------------------------------------------
+
+def getSample(rq):
+	""" Pick the job and worker used by scenarios which operate on a single
+		job or worker.
+	"""
+	jobs = sorted(rq.getJobs(), key=lambda job: job['submitTime'])
+	workers = sorted(rq.getWorkers(), key=lambda worker: worker['name'])
+	job = jobs[len(jobs)//2] if jobs else {}
+	return {
+		'job': job,
+		'jobID': job.get('jobID'),
+		'workerID': workers[0]['id'] if workers else None,
+	}
+
+
+def median(values):
+	values = sorted(values)
+	mid = len(values) // 2
+	if len(values) % 2:
+		return values[mid]
+	return (values[mid-1] + values[mid]) / 2.0
+
+
+def runScenario(rq, sample, function, cleanup=None, repeat=5, latency=0):
+	""" Run a scenario 'repeat' times after a warm-up run. Returns a
+		dictionary of timings in seconds and the number of file system calls
+		made per run.
+	"""
+	times = []
+	calls = {}
+	for i in range(repeat+1):
+		with FileSystemLatency(latency) as fs:
+			start = time.time()
+			function(rq, sample)
+			elapsed = time.time() - start
+		if cleanup:
+			cleanup(rq, sample)
+		if i:  # Discard warm-up run
+			times.append(elapsed)
+			calls = fs.calls
+
+	return {
+		'runs': times,
+		'min': min(times),
+		'median': median(times),
+		'mean': sum(times) / len(times),
+		'max': max(times),
+		'calls': calls,
+		'totalCalls': sum(calls.values()),
+	}
+
+
+def compare(results, baseline, threshold=0.2):
+	""" Print a comparison of the results with a baseline. Returns a list of
+		the scenarios which are slower by more than 'threshold' (as a
+		fraction of the baseline median) or which make more file system
+		calls.
+	"""
+	regressions = []
+	print("%-18s %12s %12s %8s %10s %10s" %(
+		"scenario", "baseline", "median", "change", "calls", "change"))
+	for name, result in results['results'].items():
+		base = baseline.get('results', {}).get(name)
+		if not base:
+			print("%-18s %12s %12.4f" %(name, "-", result['median']))
+			continue
+		change = (result['median'] - base['median']) / base['median'] if base['median'] else 0
+		call_change = result['totalCalls'] - base['totalCalls']
+		flag = ""
+		if change > threshold or call_change > 0:
+			regressions.append(name)
+			flag = "  <- REGRESSION"
+		print("%-18s %12.4f %12.4f %+7.0f%% %10d %+10d%s" %(
+			name, base['median'], result['median'], change*100,
+			result['totalCalls'], call_change, flag))
+
+	if baseline.get('params') != results['params']:
+		print("Warning: Baseline was run with different parameters: %s" %baseline.get('params'))
+	return regressions
+
+# ----------------------------------------------------------------------------
+# Run as standalone app
+# ----------------------------------------------------------------------------
+
+if __name__ == "__main__":
+	names = [scenario[0] for scenario in SCENARIOS]
+
+	parser = argparse.ArgumentParser(description="Render Queue Benchmarks")
+	parser.add_argument('-d', '--database',
+		help="benchmark an existing database instead of generating one (scenarios which write are skipped)")
+	parser.add_argument('-j', '--jobs', type=int, default=100,
+		help="number of jobs to generate (default: %(default)s)")
+	parser.add_argument('-t', '--tasks', type=int, default=50,
+		help="number of tasks per job (default: %(default)s)")
+	parser.add_argument('-w', '--workers', type=int, default=20,
+		help="number of workers (default: %(default)s)")
+	parser.add_argument('--seed', type=int, default=0,
+		help="random seed for the generated database (default: %(default)s)")
+	parser.add_argument('-l', '--latency', type=float, default=0,
+		help="seconds of latency to add to each file system call, e.g. 0.001 (default: %(default)s)")
+	parser.add_argument('-r', '--repeat', type=int, default=5,
+		help="number of timed runs of each scenario (default: %(default)s)")
+	parser.add_argument('-s', '--scenario', action='append', choices=names,
+		help="scenario to run; may be repeated (default: all)")
+	parser.add_argument('-o', '--output',
+		help="file to write the results to as JSON (default: stdout)")
+	parser.add_argument('-c', '--compare',
+		help="JSON results file to compare against; exits with status 1 on regressions")
+	parser.add_argument('--threshold', type=float, default=0.2,
+		help="slowdown counted as a regression, as a fraction (default: %(default)s)")
+	args = parser.parse_args()
+
+	# Set up database
+	tmpdir = None
+	if args.database:
+		rq = database.RenderQueue(args.database)
+	else:
+		tmpdir = tempfile.mkdtemp(prefix='rq_bench_')
+		print("Generating database: %d jobs x %d tasks x %d workers" %(
+			args.jobs, args.tasks, args.workers))
+		rq = generateDatabase(tmpdir, args.jobs, args.tasks, args.workers, seed=args.seed)
+
+	results = {
+		'params': {
+			'database': args.database,
+			'jobs': args.jobs,
+			'tasks': args.tasks,
+			'workers': args.workers,
+			'seed': args.seed,
+			'latency': args.latency,
+			'repeat': args.repeat,
+		},
+		'system': {
+			'python': platform.python_version(),
+			'platform': platform.platform(),
+		},
+		'time': time.time(),
+		'results': {},
+	}
+
+	try:
+		sample = getSample(rq)
+		for name, function, cleanup in SCENARIOS:
+			if args.scenario and name not in args.scenario:
+				continue
+			if args.database and cleanup:
+				continue
+			result = runScenario(rq, sample, function, cleanup, args.repeat, args.latency)
+			results['results'][name] = result
+			print("%-18s median %.4fs  (%d file system calls)" %(
+				name, result['median'], result['totalCalls']))
+	finally:
+		if tmpdir:
+			shutil.rmtree(tmpdir, ignore_errors=True)
+
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump(results, f, indent=4, sort_keys=True)
+	elif not args.compare:
+		print(json.dumps(results, indent=4, sort_keys=True))
+
+	if args.compare:
+		with open(args.compare) as f:
+			baseline = json.load(f)
+		if compare(results, baseline, args.threshold):
+			sys.exit(1)
+	sys.exit(0)
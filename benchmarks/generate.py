@@ -0,0 +1,168 @@
+#!/usr/bin/python
+
+# generate.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2019
+#
+# Synthetic Render Queue Database Generator
+# Builds a database of N jobs x M tasks x W workers in the current on-disk
+# layout, with a realistic mix of job and task states, for benchmarking.
+#   python benchmarks/generate.py /tmp/rq_bench --jobs 500 --tasks 100 --workers 50
+# The same seed always produces the same database.
+
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import custom modules
+import database
+
+
+# Proportion of jobs in each state
+JOB_STATES = [('done', 0.3), ('rendering', 0.3), ('queued', 0.3), ('waiting', 0.1)]
+
+JOB_TYPES = ['Maya', 'Nuke', 'Houdini', 'Blender']
+
+USERS = ['alice', 'bob', 'carol', 'dave', 'erin']
+
+
+def pickState(rng):
+	""" Pick a job state at random, weighted by the proportions above.
+	"""
+	r = rng.random()
+	for state, weight in JOB_STATES:
+		if r < weight:
+			return state
+		r -= weight
+	return JOB_STATES[-1][0]
+
+
+def generateDatabase(location, jobs=100, tasks=50, workers=20, taskSize=10, seed=0):
+	""" Generate a synthetic database at 'location'. Returns the
+		RenderQueue object connected to it.
+	"""
+	rng = random.Random(seed)
+	rq = database.RenderQueue(location)
+	time_format = rq.time_format
+	now = time.time()
+
+	# Workers
+	workerIDs = []
+	for i in range(workers):
+		workerID = '%032x' %rng.getrandbits(128)
+		workerIDs.append(workerID)
+		workerdir = os.path.join(rq.db['workers'], workerID)
+		if not os.path.isdir(workerdir):
+			os.makedirs(workerdir)
+		rq.write({
+			'id': workerID,
+			'name': 'node%03d' %i,
+			'hostname': 'node%03d.example.com' %i,
+			'ip_address': '10.0.%d.%d' %(i // 250, i % 250 + 1),
+			'enable': rng.random() > 0.1,
+			'online': now,
+			'username': 'render',
+			'pool': "None",
+			'comment': "",
+		}, os.path.join(workerdir, 'workerinfo.json'))
+	idleWorkers = list(workerIDs)
+
+	# Jobs and tasks
+	previous = None
+	for j in range(jobs):
+		jobID = '%032x' %rng.getrandbits(128)
+		state = pickState(rng)
+		if state == 'waiting' and previous is None:
+			state = 'queued'
+
+		frameRanges = ['%d-%d' %(t*taskSize+1, (t+1)*taskSize) for t in range(tasks)]
+		submitTime = now - (jobs-j) * 60
+		job = {
+			'jobID': jobID,
+			'jobName': 'bench_job_%04d' %j,
+			'jobType': rng.choice(JOB_TYPES),
+			'frames': '1-%d' %(tasks*taskSize),
+			'taskSize': taskSize,
+			'priority': rng.choice([25, 50, 50, 75]),
+			'username': rng.choice(USERS),
+			'submitTime': time.strftime(time_format, time.localtime(submitTime)),
+			'pool': "None",
+			'comment': "",
+			'tasks': frameRanges,
+			'dependencies': [],
+		}
+		if state == 'waiting':
+			job['dependencies'] = [{'jobID': previous, 'frames': None, 'perFrame': False}]
+			dependency = rq.getJob(previous)
+			dependency.setdefault('dependents', []).append(jobID)
+			rq.write(dependency, rq.getJobDatafile(previous))
+		rq.write(job, rq.getJobDatafile(jobID))
+
+		# Work out how far through rendering the job is
+		if state == 'done':
+			finished = tasks
+		elif state == 'rendering':
+			finished = rng.randint(0, tasks-1)
+		else:
+			finished = 0
+
+		for taskNo, frames in enumerate(frameRanges):
+			task = {'jobID': jobID, 'taskNo': taskNo, 'frames': frames}
+			if taskNo < finished:
+				task['startTime'] = submitTime + taskNo * 30
+				task['endTime'] = task['startTime'] + rng.uniform(10, 600)
+				task['workerID'] = rng.choice(workerIDs) if workerIDs else None
+				if rng.random() < 0.03:
+					task['attempts'] = [{'result': "Failed", 'time': task['endTime']}]
+					folder = rq.db['failed']
+				else:
+					folder = rq.db['completed']
+			elif state == 'rendering' and idleWorkers and taskNo < finished + 2:
+				task['workerID'] = idleWorkers.pop()
+				task['startTime'] = now - rng.uniform(0, 600)
+				folder = os.path.join(rq.db['workers'], task['workerID'])
+			elif state == 'waiting':
+				task['waitingFor'] = {previous: "Unknown"}
+				folder = rq.db['waiting']
+			else:
+				folder = rq.db['queued']
+			rq.write(task, os.path.join(folder, '%s.json' %rq.getTaskID(jobID, taskNo)))
+
+		if state != 'waiting':
+			previous = jobID
+
+	return rq
+
+# ----------------------------------------------------------------------------
+# Run as standalone app
+# ----------------------------------------------------------------------------
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Generate a synthetic render queue database")
+	parser.add_argument('location',
+		help="path to create the database at")
+	parser.add_argument('-j', '--jobs', type=int, default=100,
+		help="number of jobs (default: %(default)s)")
+	parser.add_argument('-t', '--tasks', type=int, default=50,
+		help="number of tasks per job (default: %(default)s)")
+	parser.add_argument('-w', '--workers', type=int, default=20,
+		help="number of workers (default: %(default)s)")
+	parser.add_argument('--task-size', type=int, default=10,
+		help="number of frames per task (default: %(default)s)")
+	parser.add_argument('--seed', type=int, default=0,
+		help="random seed (default: %(default)s)")
+	args = parser.parse_args()
+
+	if os.path.exists(args.location) and os.listdir(args.location):
+		print("ERROR: Location is not empty: %s" %args.location)
+		sys.exit(1)
+
+	generateDatabase(args.location, args.jobs, args.tasks, args.workers,
+		args.task_size, args.seed)
+	sys.exit(0)
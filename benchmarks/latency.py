@@ -0,0 +1,74 @@
+#!/usr/bin/python
+
+# latency.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2019
+#
+# File system call counting and artificial latency.
+# Wraps the os functions used to access the database so each call can be
+# counted and delayed, e.g. by a millisecond to emulate a database on NFS:
+#   with FileSystemLatency(0.001) as fs:
+#       rq.getJobs()
+#   print(fs.calls)
+
+
+import os
+import time
+
+try:
+	import builtins
+except ImportError:
+	import __builtin__ as builtins  # Python 2
+
+
+# File system calls to wrap. Most others (os.path.exists, glob, shutil.move,
+# etc.) are built on top of these.
+OS_CALLS = [
+	'open', 'stat', 'lstat', 'listdir', 'scandir', 'rename', 'replace',
+	'remove', 'unlink', 'utime', 'mkdir', 'rmdir']
+
+
+class FileSystemLatency(object):
+	""" Context manager to count file system calls and optionally add a
+		delay of 'latency' seconds to each of them. Calls are counted by
+		name in the 'calls' dictionary.
+	"""
+	def __init__(self, latency=0):
+		self.latency = latency
+		self.calls = {}
+		self.originals = {}
+
+
+	def wrap(self, name, function):
+		""" Return a wrapper for the given function.
+		"""
+		def wrapper(*args, **kwargs):
+			self.calls[name] = self.calls.get(name, 0) + 1
+			if self.latency:
+				time.sleep(self.latency)
+			return function(*args, **kwargs)
+		return wrapper
+
+
+	def reset(self):
+		""" Reset the call counters.
+		"""
+		self.calls = {}
+
+
+	def __enter__(self):
+		for name in OS_CALLS:
+			if hasattr(os, name):
+				self.originals[(os, name)] = getattr(os, name)
+				setattr(os, name, self.wrap(name, getattr(os, name)))
+		self.originals[(builtins, 'open')] = builtins.open
+		builtins.open = self.wrap('fopen', builtins.open)
+		return self
+
+
+	def __exit__(self, *args):
+		for (module, name), function in self.originals.items():
+			setattr(module, name, function)
+		self.originals = {}
+		return False
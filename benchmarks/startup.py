@@ -0,0 +1,199 @@
+#!/usr/bin/python
+
+# startup.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2019
+#
+# Render Queue Startup Benchmark
+# Times how long the Render Queue window takes to appear, broken down into
+# phases, by launching it repeatedly in a new process against a synthetic
+# database:
+#   qt         - importing Qt and creating the application
+#   import     - importing the renderqueue module
+#   construct  - creating the main window (loading the UI, icons, stylesheet
+#                and connecting to the database)
+#   firstPaint - time from process start until the window is first painted
+#   populated  - time from process start until the views have been populated
+#   process    - total time measured by the parent, including the Python
+#                interpreter starting up
+# e.g.
+#   python benchmarks/startup.py --repeat 10 --target 500
+# The window is drawn off screen unless QT_QPA_PLATFORM is set. UI files are
+# compiled on demand by the warm-up launch, so the timed launches use the
+# compiled modules. To compare with the time taken to compile them, run
+# compile_ui.py --clean first and look at the first launch with --repeat 1
+# and no warm-up (--cold).
+
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+START_TIME = time.time()
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MARKER = "[startup] "
+PHASES = ['qt', 'import', 'construct', 'firstPaint', 'populated', 'process']
+
+
+def child():
+	""" Launch the Render Queue and print the time taken by each phase as
+		JSON, then quit.
+	"""
+	sys.path.insert(0, ROOT)
+	os.chdir(ROOT)
+	timings = {}
+
+	from Qt import QtCore, QtWidgets
+	app = QtWidgets.QApplication(sys.argv)
+	timings['qt'] = time.time() - START_TIME
+
+	mark = time.time()
+	import renderqueue
+	timings['import'] = time.time() - mark
+
+	mark = time.time()
+	rqApp = renderqueue.RenderQueueApp()
+	timings['construct'] = time.time() - mark
+
+	def finish():
+		if 'firstPaint' in timings and 'populated' in timings:
+			print(MARKER + json.dumps(timings))
+			sys.stdout.flush()
+			app.quit()
+
+	class PaintFilter(QtCore.QObject):
+		def eventFilter(self, obj, event):
+			if event.type() == QtCore.QEvent.Paint and 'firstPaint' not in timings:
+				timings['firstPaint'] = time.time() - START_TIME
+				QtCore.QTimer.singleShot(0, finish)
+			return False
+
+	populateViews = rqApp.populateViews
+	def populated():
+		populateViews()
+		timings['populated'] = time.time() - START_TIME
+		finish()
+	rqApp.populateViews = populated
+
+	paintFilter = PaintFilter()
+	rqApp.installEventFilter(paintFilter)
+	rqApp.show()
+	app.exec_()
+
+
+def runOnce(env, timeout=60):
+	""" Launch the Render Queue in a new process. Returns a dictionary of
+		timings in seconds, or None if it failed.
+	"""
+	start = time.time()
+	process = subprocess.Popen(
+		[sys.executable, os.path.abspath(__file__), '--child'],
+		stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env,
+		universal_newlines=True)
+	try:
+		output, _ = process.communicate(timeout=timeout)
+	except TypeError:  # Python 2.x
+		output, _ = process.communicate()
+	except subprocess.TimeoutExpired:
+		process.kill()
+		output, _ = process.communicate()
+	elapsed = time.time() - start
+
+	for line in output.splitlines():
+		if line.startswith(MARKER):
+			timings = json.loads(line[len(MARKER):])
+			timings['process'] = elapsed
+			return timings
+
+	print("ERROR: Render Queue failed to start:\n%s" %output)
+	return None
+
+
+def median(values):
+	values = sorted(values)
+	mid = len(values) // 2
+	if len(values) % 2:
+		return values[mid]
+	return (values[mid-1] + values[mid]) / 2.0
+
+# ----------------------------------------------------------------------------
+# Run as standalone app
+# ----------------------------------------------------------------------------
+
+if __name__ == "__main__":
+	if '--child' in sys.argv:
+		child()
+		sys.exit(0)
+
+	parser = argparse.ArgumentParser(description="Render Queue Startup Benchmark")
+	parser.add_argument('-d', '--database',
+		help="use an existing database instead of generating one")
+	parser.add_argument('-j', '--jobs', type=int, default=100,
+		help="number of jobs to generate (default: %(default)s)")
+	parser.add_argument('-t', '--tasks', type=int, default=50,
+		help="number of tasks per job (default: %(default)s)")
+	parser.add_argument('-w', '--workers', type=int, default=20,
+		help="number of workers (default: %(default)s)")
+	parser.add_argument('-r', '--repeat', type=int, default=5,
+		help="number of launches to time (default: %(default)s)")
+	parser.add_argument('--target', type=float, default=500,
+		help="exit with an error if the median time to first paint exceeds this many milliseconds (default: %(default)s)")
+	parser.add_argument('-o', '--output',
+		help="write the results to a JSON file")
+	parser.add_argument('--cold', action='store_true',
+		help="skip the warm-up launch")
+	args = parser.parse_args()
+
+	tmpdir = tempfile.mkdtemp(prefix='rq_startup_')
+	try:
+		location = args.database
+		if not location:
+			sys.path.insert(0, ROOT)
+			from generate import generateDatabase
+			location = os.path.join(tmpdir, 'database')
+			print("Generating database with %d jobs..." %args.jobs)
+			generateDatabase(location, args.jobs, args.tasks, args.workers)
+
+		# Point the Render Queue at the database with a temporary home
+		# folder, so the user's own settings are left alone
+		prefsdir = os.path.join(tmpdir, '.renderqueue')
+		os.makedirs(prefsdir)
+		with open(os.path.join(prefsdir, 'userprefs.json'), 'w') as f:
+			json.dump({'user.databaseLocation': os.path.abspath(location)}, f)
+		env = dict(os.environ, HOME=tmpdir)
+		env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+		if not args.cold:
+			runOnce(env)  # Warm up the file system cache and compile the UI
+		runs = []
+		for i in range(args.repeat):
+			timings = runOnce(env)
+			if timings is None:
+				sys.exit(1)
+			runs.append(timings)
+
+	finally:
+		shutil.rmtree(tmpdir, ignore_errors=True)
+
+	summary = {}
+	print("%-12s %9s %9s %9s" %("phase", "min", "median", "max"))
+	for phase in PHASES:
+		values = [run[phase] * 1000 for run in runs]
+		summary[phase] = {'min': min(values), 'median': median(values), 'max': max(values)}
+		print("%-12s %9.1f %9.1f %9.1f" %(phase, min(values), median(values), max(values)))
+
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump({'runs': runs, 'summary': summary, 'params': vars(args)}, f, indent=4, sort_keys=True)
+
+	if summary['firstPaint']['median'] > args.target:
+		print("First paint took longer than the target of %d ms." %args.target)
+		sys.exit(1)
+	sys.exit(0)
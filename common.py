@@ -10,6 +10,17 @@
 
 import logging
 import os
+import threading
+
+try:
+	import queue
+except ImportError:
+	import Queue as queue  # Python 2.x
+
+try:
+	from logging.handlers import QueueHandler, QueueListener
+except ImportError:
+	QueueHandler = None  # Not available in Python 2.x
 
 # Import custom modules
 import oswrapper
@@ -17,20 +28,73 @@ import oswrapper
 
 formatter = logging.Formatter("%(asctime)-15s %(levelname)-8s %(message)s")
 
+# Loggers created by setup_logger(), keyed by name. Each entry is a tuple of
+# (logger, handler, listener)
+loggers = {}
+loggers_lock = threading.Lock()
+
 
-def setup_logger(name, log_file, level=logging.INFO):
-	""" Function to create and setup multiple loggers.
+def setup_logger(name, log_file, level=logging.INFO, queued=None):
+	""" Function to create and setup multiple loggers. 'log_file' may be a
+		path or a file-like object. If a logger with the same name was set
+		up before, it is closed first so handlers are never duplicated.
+		If 'queued' is True, records are written by a background thread so
+		logging never blocks the caller. It defaults to True if the
+		RQ_QUEUED_LOGGING environment variable is set.
+		Call close_logger() when the logger is no longer needed.
 	"""
-	handler = logging.FileHandler(log_file)
+	close_logger(name)
+
+	if hasattr(log_file, 'write'):
+		handler = logging.StreamHandler(log_file)
+	else:
+		handler = logging.FileHandler(log_file)
 	handler.setFormatter(formatter)
 
+	if queued is None:
+		queued = bool(os.environ.get('RQ_QUEUED_LOGGING'))
+	listener = None
 	logger = logging.getLogger(name)
 	logger.setLevel(level)
-	logger.addHandler(handler)
+	if queued and QueueHandler is not None:
+		records = queue.Queue()
+		listener = QueueListener(records, handler)
+		listener.start()
+		logger.addHandler(QueueHandler(records))
+	else:
+		logger.addHandler(handler)
+
+	with loggers_lock:
+		loggers[name] = (logger, handler, listener)
 
 	return logger
 
 
+def close_logger(name):
+	""" Close a logger created by setup_logger(), writing any queued records
+		and closing its log file. Streams passed to setup_logger() are left
+		open.
+	"""
+	with loggers_lock:
+		entry = loggers.pop(name, None)
+	if entry is None:
+		return
+	logger, handler, listener = entry
+
+	if listener is not None:
+		listener.stop()  # Waits for queued records to be written
+	for h in logger.handlers[:]:
+		logger.removeHandler(h)
+	handler.close()
+
+	# Forget the logger, as loggers are otherwise kept for the life of the
+	# process and a new one is created for every task. The logging module's
+	# lock is held, as logging.getLogger() does, so a logger being created
+	# by another thread isn't lost.
+	with logging._lock:
+		logging.Logger.manager.loggerDict.pop(name, None)
+
+
 def settings_file(scene, suffix=""):
 	""" Determine the path to the settings file based on the full path of the
 		scene file. N.B. This function is duplicated in render_submit.py
@@ -0,0 +1,116 @@
+#!/usr/bin/python
+
+# compile_ui.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2019
+#
+# Compile Qt Designer UI files to Python modules.
+# Building a window from a compiled module is much quicker than parsing the
+# UI file at runtime, so windows open faster. Each file is compiled next to
+# the UI file, e.g. renderqueue.ui -> renderqueue_ui.py, using the compiler
+# for the Qt binding in use, and converted to import from Qt.py so the
+# modules work with any binding. TemplateUI.setupUI() compiles UI files on
+# demand: when a window is opened, its UI file is compiled if there is no
+# compiled module or the UI file has been modified since. To compile ahead
+# of time, e.g. when installing to a read-only location:
+#   python compile_ui.py          (compile all UI files in this folder)
+#   python compile_ui.py --clean  (remove compiled modules)
+
+
+import argparse
+import glob
+import importlib
+import io
+import os
+import sys
+import uuid
+
+import Qt
+
+
+# Modules providing compileUi() for each binding
+COMPILERS = {
+	'PySide2': 'pyside2uic',
+	'PyQt5': 'PyQt5.uic',
+	'PySide': 'pysideuic',
+	'PyQt4': 'PyQt4.uic',
+}
+
+
+def getOutputPath(uifile):
+	""" Return the path of the compiled module for a UI file.
+	"""
+	return '%s_ui.py' %os.path.splitext(uifile)[0]
+
+
+def convert(source):
+	""" Convert compiled UI code to import from Qt.py rather than a specific
+		binding.
+	"""
+	lines = []
+	for line in source.splitlines(True):
+		for binding in COMPILERS:  # Qt.py only converts PySide2 code
+			line = line.replace("from %s import" %binding, "from PySide2 import")
+		lines.append(line)
+	return "".join(Qt._convert(lines))
+
+
+def compileFile(uifile):
+	""" Compile a single UI file. Returns True if successful.
+	"""
+	try:
+		compiler = importlib.import_module(COMPILERS[Qt.__binding__])
+	except (KeyError, ImportError):
+		print("ERROR: No UI compiler available for %s" %Qt.__binding__)
+		return False
+
+	buf = io.StringIO() if sys.version_info[0] >= 3 else io.BytesIO()
+	try:
+		compiler.compileUi(uifile, buf)
+	except Exception as e:
+		print("ERROR: Unable to compile %s: %s" %(uifile, e))
+		return False
+
+	pyfile = getOutputPath(uifile)
+	tmpfile = '%s.%d.%s.tmp' %(pyfile, os.getpid(), uuid.uuid4().hex)  # Unique to this call
+	try:
+		with open(tmpfile, 'w') as f:
+			f.write(convert(buf.getvalue()))
+		os.rename(tmpfile, pyfile)  # Other processes never see a partial file
+	except (IOError, OSError) as e:
+		print("ERROR: Unable to write %s: %s" %(pyfile, e))
+		try:
+			os.remove(tmpfile)
+		except OSError:
+			pass
+		return False
+	print("Compiled %s -> %s" %(uifile, pyfile))
+	return True
+
+# ----------------------------------------------------------------------------
+# Run as standalone app
+# ----------------------------------------------------------------------------
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Compile Qt Designer UI files")
+	parser.add_argument('files', nargs='*',
+		help="UI files to compile (default: all in this folder)")
+	parser.add_argument('--clean', action='store_true',
+		help="remove compiled modules instead")
+	args = parser.parse_args()
+
+	uifiles = args.files or sorted(glob.glob(
+		os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.ui')))
+
+	errors = 0
+	for uifile in uifiles:
+		if args.clean:
+			pyfile = getOutputPath(uifile)
+			if os.path.isfile(pyfile):
+				os.remove(pyfile)
+				print("Removed %s" %pyfile)
+		elif not compileFile(uifile):
+			errors += 1
+
+	sys.exit(1 if errors else 0)
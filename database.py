@@ -9,17 +9,40 @@
 # Manages jobs, tasks and workers.
 
 
+import atexit
 import glob
 import json
+import logging
+import math
 import os
 import re
 import time
 import uuid
 
 # Import custom modules
-import common
+import archive
+import events
+import iostats
 import oswrapper
-# import sequence
+import sequence
+import tasklog
+
+
+logger = logging.getLogger(__name__)
+
+# File modification times closer to the present than this are not trusted to
+# show whether a file has changed since it was last read, as some file
+# systems only store them to the nearest second or two
+MTIME_RESOLUTION = 2
+
+# Seconds between reading the file system clock (see RenderQueue.getTime())
+CLOCK_INTERVAL = 5
+
+# Job locks older than this (seconds) are assumed to have been abandoned.
+# Clients wait a little longer than this for a job lock, so an abandoned lock
+# is broken rather than making them give up.
+JOB_LOCK_TIMEOUT = 30
+JOB_LOCK_WAIT = 40
 
 
 class RenderQueue():
@@ -28,31 +51,53 @@ class RenderQueue():
 	def __init__(self, location=None):
 		self.time_format = "%Y/%m/%d %H:%M:%S"
 
-		self.debug = False
-		if self.debug:
-			self.io_reads = 0
-			self.io_writes = 0
-
 		# Set up paths
 		self.db = {}
 		self.db['root'] = location
 		self.db['jobs'] = os.path.join(location, 'jobs')
 		self.db['tasks'] = os.path.join(location, 'tasks')
 		self.db['queued'] = os.path.join(location, 'tasks', 'queued')
+		self.db['waiting'] = os.path.join(location, 'tasks', 'waiting')
 		self.db['completed'] = os.path.join(location, 'tasks', 'completed')
 		self.db['failed'] = os.path.join(location, 'tasks', 'failed')
 		self.db['workers'] = os.path.join(location, 'workers')
 		self.db['logs'] = os.path.join(location, 'logs')
 		self.db['archive'] = os.path.join(location, 'archive')
+		self.db['config'] = os.path.join(location, 'config')
+		self.db['events'] = os.path.join(location, 'logs', 'events')
+
+		# Identify this client when holding locks
+		self.clientID = uuid.uuid4().hex
+
+		# The job each worker last rendered, used for job affinity
+		self.warmJobs = {}  # {workerID: (jobID, timestamp)}
+
+		# Time this client last tried to balance the queue
+		self.lastBalance = 0
+
+		# Offset of the file system clock from the local clock
+		self.clockOffset = 0
+		self.clockChecked = None  # Local time the offset was measured
+
+		# The queue as last read, so getPoolQueues() only reads what changed
+		self.queueIndex = {'mtime': None, 'queued': {}, 'jobs': {}}
+
 		print("Connecting to render queue database at: %s" %location)
 
 		# Check database is valid, if not create folder structure 
 		if not self.validate():
 			self.create()
 
-		# Set up logging
-		logfile = os.path.join(self.db['logs'], 'renderqueue.log')
-		self.queue_logger = common.setup_logger('queue_logger', logfile)
+		# Set up event log and job archive
+		self.events = events.EventLog(self.db['events'])
+		self.archive = archive.JobArchive(self.db['archive'])
+		self.heartbeats = {}  # Time of last heartbeat event, keyed by worker ID
+
+		# Set up I/O instrumentation
+		stats_file = os.environ.get('RQ_IO_STATS')
+		self.io = iostats.IOStats(RenderQueue, enabled=bool(stats_file))
+		if stats_file:
+			atexit.register(self.io.dump, stats_file)
 
 
 	def validate(self):
@@ -74,29 +119,237 @@ class RenderQueue():
 	def read(self, datafile):
 		""" Read values from a JSON file and return as a dictionary.
 		"""
+		start = time.time()
 		try:
 			with open(datafile, 'r') as f:
 				data = json.load(f)
-				if self.debug:
-					self.io_reads += 1
-					print("[Database I/O] Read #%d: %s" %(self.io_reads, datafile))
-			return data
 		except:
-			return {}
+			data = {}
+		if self.io.enabled:
+			self.io.record('read', time.time()-start)
+		return data
 
 
-	def write(self, data, datafile):
+	def write(self, data, datafile, atomic=False):
 		""" Write values from a dictionary to a JSON file.
+			If 'atomic' is True, write to a temporary file and rename it, so
+			other clients never read a partially written file.
 		"""
+		start = time.time()
 		try:
-			with open(datafile, 'w') as f:
+			if atomic:
+				tmpfile = '%s.%s.tmp' %(datafile, uuid.uuid4().hex)
+			else:
+				tmpfile = datafile
+			with open(tmpfile, 'w') as f:
 				json.dump(data, f, indent=4)
-				if self.debug:
-					self.io_writes += 1
-					print("[Database I/O] Write #%d: %s" %(self.io_writes, datafile))
-			return True
+			if atomic:
+				os.rename(tmpfile, datafile)  # Replaces existing file (POSIX only)
+			result = True
 		except:
-			return False
+			result = False
+		if self.io.enabled:
+			self.io.record('write', time.time()-start)
+		return result
+
+
+	def timeIO(self, op, function, *args):
+		""" Call a file system function, recording the time taken if I/O
+			instrumentation is enabled. 'op' is the type of operation.
+		"""
+		if not self.io.enabled:
+			return function(*args)
+		start = time.time()
+		try:
+			return function(*args)
+		finally:
+			self.io.record(op, time.time()-start)
+
+
+	def glob(self, pattern):
+		return self.timeIO('glob', glob.glob, pattern)
+
+
+	def listDir(self, path):
+		return self.timeIO('listdir', os.listdir, path)
+
+
+	def move(self, src, dst):
+		return self.timeIO('move', oswrapper.move, src, dst)
+
+
+	def remove(self, path):
+		return self.timeIO('remove', oswrapper.remove, path)
+
+
+	def rename(self, src, dst):
+		return self.timeIO('rename', os.rename, src, dst)
+
+
+	def isFile(self, path):
+		return self.timeIO('stat', os.path.isfile, path)
+
+
+	def getModTime(self, path):
+		return self.timeIO('stat', os.path.getmtime, path)
+
+
+	def getIOStats(self, reset=False):
+		""" Return the I/O statistics gathered by this client (see
+			iostats.IOStats.getStats()). Instrumentation is enabled if it
+			isn't already, so statistics are gathered from then on.
+		"""
+		stats = self.io.getStats()
+		if reset:
+			self.io.reset()
+		self.io.enabled = True
+		return stats
+
+
+	##########
+	# CONFIG #
+	##########
+
+	def getConfig(self, key, default=None):
+		""" Get a setting from the database config file. Settings stored
+			here apply to all clients connected to this database.
+		"""
+		config = self.read(os.path.join(self.db['config'], 'database.json'))
+		return config.get(key, default)
+
+
+	def setConfig(self, key, value):
+		""" Store a setting in the database config file.
+		"""
+		datafile = os.path.join(self.db['config'], 'database.json')
+		config = self.read(datafile)
+		config[key] = value
+		self.write(config, datafile, atomic=True)
+		self.events.record('config', key=key, value=value)
+
+
+	def acquireLock(self, name, timeout=60, renew=False, wait=0):
+		""" Acquire a named lock shared by all clients connected to this
+			database, by exclusively creating a lock file. Returns False if
+			the lock is held by another client, after trying for up to
+			'wait' seconds. Locks older than 'timeout' seconds are assumed
+			to have been abandoned and are broken.
+			If 'renew' is True the lock is treated as a lease: if this
+			client already holds it, its timestamp is refreshed and True is
+			returned, so the holder keeps the lock for as long as it keeps
+			renewing it.
+			Each lock file holds the ID of the client which created it and a
+			unique token, so a stale lock is only ever broken by one client
+			and never mistaken for a lock created since (see removeLockFile()).
+		"""
+		lockfile = os.path.join(self.db['config'], '%s.lock' %name)
+		deadline = time.time() + wait
+		while not self.tryLock(lockfile, timeout, renew):
+			if time.time() >= deadline:
+				return False
+			time.sleep(0.05)
+		return True
+
+
+	def tryLock(self, lockfile, timeout, renew):
+		""" Make a single attempt to acquire the lock (see acquireLock()).
+		"""
+		for attempt in range(2):
+			try:
+				fd = os.open(lockfile, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+				os.write(fd, ('%s %s' %(self.clientID, uuid.uuid4().hex)).encode('utf-8'))
+				os.close(fd)
+				return True
+			except OSError:
+				try:
+					with open(lockfile) as f:
+						owner = f.read()
+					if renew and owner.split(' ')[0] == self.clientID:
+						os.utime(lockfile, None)
+						return True
+					if self.getTime() - self.getModTime(lockfile) > timeout:
+						if self.removeLockFile(lockfile, owner):
+							continue
+				except (IOError, OSError):
+					continue
+				return False
+		return False
+
+
+	def lockJob(self, jobID, wait=JOB_LOCK_WAIT):
+		""" Acquire the lock on a job, which must be held while modifying the
+			job's data file or its waiting tasks. Waits up to 'wait' seconds
+			if another client holds it. Returns True if successful.
+		"""
+		return self.acquireLock('job_%s' %jobID, timeout=JOB_LOCK_TIMEOUT, wait=wait)
+
+
+	def unlockJob(self, jobID):
+		""" Release the lock on a job.
+		"""
+		self.releaseLock('job_%s' %jobID)
+
+
+	def releaseLock(self, name):
+		""" Release a named lock, if this client holds it. A lock which was
+			broken as stale and taken by another client is left alone.
+		"""
+		lockfile = os.path.join(self.db['config'], '%s.lock' %name)
+		try:
+			with open(lockfile) as f:
+				owner = f.read()
+		except (IOError, OSError):
+			return
+		if owner.split(' ')[0] == self.clientID:
+			self.removeLockFile(lockfile, owner)
+
+
+	def removeLockFile(self, lockfile, owner):
+		""" Remove the lock file if it still holds 'owner', i.e. it's the
+			same lock that was read, not one created since. The file is
+			renamed to a unique name first, so only one client can remove
+			it. If it turns out to be a different lock, it's put back unless
+			another lock has been created in the meantime. Returns True if
+			the lock file was removed.
+		"""
+		taken = '%s.%s.tmp' %(lockfile, uuid.uuid4().hex)
+		try:
+			os.rename(lockfile, taken)
+		except OSError:
+			return False  # Already removed by another client
+		try:
+			with open(taken) as f:
+				if f.read() == owner:
+					return True
+			os.link(taken, lockfile)  # Doesn't replace an existing lock
+		except (IOError, OSError, AttributeError):
+			pass
+		finally:
+			os.remove(taken)
+		return False
+
+
+	def getTime(self):
+		""" Return the current time according to the file system holding the
+			database. Comparing this with file modification times avoids
+			relying on the clocks of client machines being in sync.
+			The file system clock is only read every CLOCK_INTERVAL seconds,
+			by touching a file, and in between the offset last measured is
+			applied to the local clock.
+		"""
+		now = time.time()
+		if self.clockChecked is not None and 0 <= now - self.clockChecked < CLOCK_INTERVAL:
+			return now + self.clockOffset
+
+		clockfile = os.path.join(self.db['config'], 'clock')
+		try:
+			with open(clockfile, 'a'):
+				os.utime(clockfile, None)
+			self.clockOffset = self.getModTime(clockfile) - now
+		except (IOError, OSError):
+			self.clockOffset = 0
+		self.clockChecked = now
+		return now + self.clockOffset
 
 
 	########
@@ -107,10 +360,44 @@ class RenderQueue():
 		""" Create a new render job and associated tasks.
 			Generates a JSON file with the job UUID to hold data for the
 			render job. Also generates a JSON file for each task. These are
-			placed in the 'queued' subfolder ready to be picked up by workers.
+			placed in the 'queued' subfolder ready to be picked up by workers,
+			or in the 'waiting' subfolder if they depend on other jobs which
+			have not finished rendering (see parseDependencies()).
 		"""
 		jobID = uuid.uuid4().hex  # Generate UUID
 		kwargs['jobID'] = jobID
+		dependencies = self.parseDependencies(kwargs.get('dependencies'))
+
+		# Register this job with the jobs it depends on before working out
+		# which frames they have already rendered, so frames completed from
+		# then on release this job's waiting tasks. Holding this job's lock
+		# until its tasks have been written makes those releases wait for
+		# the tasks to exist.
+		for dep in dependencies:
+			self.addDependent(dep['jobID'], jobID)
+		self.lockJob(jobID)
+		try:
+			return self.writeJob(jobID, kwargs, dependencies)
+		finally:
+			self.unlockJob(jobID)
+
+
+	def writeJob(self, jobID, kwargs, dependencies):
+		""" Write the data file and tasks of a new job. Called by newJob()
+			with the job's lock held. Returns the job ID.
+		"""
+		dependencies = self.resolveDependencies(dependencies)
+		kwargs['dependencies'] = [dict((key, dep[key]) for key in 
+			('jobID', 'frames', 'perFrame')) for dep in dependencies]
+
+		# With adaptive task sizing, only single-frame probe tasks are
+		# created at first (see updateAdaptiveTasks())
+		if kwargs.get('adaptiveTaskSize'):
+			probes, pending = self.getProbeTasks(kwargs['tasks'])
+			if pending:
+				kwargs['tasks'] = probes
+				kwargs['probeTasks'] = len(probes)
+				kwargs['pendingFrames'] = sequence.numRange(pending)
 
 		# Write job data file
 		datafile = os.path.join(self.db['jobs'], '%s.json' %jobID)
@@ -118,26 +405,245 @@ class RenderQueue():
 
 		# Write tasks and place in queue
 		tasks = kwargs['tasks']
-		for i in range(len(tasks)):
+		waiting_count = self.writeTasks(jobID, tasks, dependencies)
+
+		self.events.record('submit', jobID=jobID, 
+			jobName=kwargs.get('jobName'), 
+			username=kwargs.get('username'), 
+			priority=kwargs.get('priority'), 
+			tasks=len(tasks), 
+			waiting=waiting_count)
+
+		return jobID
+
+
+	def writeTasks(self, jobID, tasks, dependencies=[], firstTaskNo=0):
+		""" Write a JSON file for each task in the list of frame ranges,
+			numbered from 'firstTaskNo'. Tasks are placed in the 'queued'
+			subfolder, or the 'waiting' subfolder if they are waiting for
+			dependencies. Returns the number of tasks waiting.
+		"""
+		waiting_count = 0
+		for i, frames in enumerate(tasks, firstTaskNo):
 			taskdata = {}
 			taskdata['jobID'] = jobID
 			taskdata['taskNo'] = i
-			taskdata['frames'] = tasks[i]
+			taskdata['frames'] = frames
 			# taskdata['command'] = kwargs['command']
 			# taskdata['flags'] = kwargs['flags']
 
-			datafile = os.path.join(self.db['queued'], 
+			waitingFor = self.getTaskDependencies(dependencies, frames)
+			if waitingFor:
+				taskdata['waitingFor'] = waitingFor
+				queue = self.db['waiting']
+				waiting_count += 1
+			else:
+				queue = self.db['queued']
+
+			datafile = os.path.join(queue, 
 				'%s_%s.json' %(jobID, str(i).zfill(4)))
 			self.write(taskdata, datafile)
 
-		self.queue_logger.info("Created job %s" %jobID)
-		self.queue_logger.info("Created %d task(s) for job %s" %(len(tasks), jobID))
+		return waiting_count
 
-		# Set up job logging
-		# logger_name = '%s_logger' %jobID
-		# logfile = os.path.join(self.db['logs'], '%s.log' %jobID)
-		# print(logger_name, logfile)
-		# self.job_logger = common.setup_logger(logger_name, logfile)
+
+	def addDependent(self, jobID, dependentID):
+		""" Register a job as depending on the specified job, so its waiting
+			tasks are released as soon as the tasks they depend on are
+			completed (see releaseDependents()). Returns False if the job
+			doesn't exist.
+		"""
+		if not self.lockJob(jobID):
+			logger.warning("Unable to lock job %s to add dependent job %s." %(jobID, dependentID))
+			return False
+		try:
+			datafile = self.getJobDatafile(jobID)
+			job = self.read(datafile)
+			if not job:
+				return False
+			if dependentID not in job.get('dependents', []):
+				job.setdefault('dependents', []).append(dependentID)
+				self.write(job, datafile, atomic=True)
+			return True
+		finally:
+			self.unlockJob(jobID)
+
+
+	def getProbeTasks(self, tasks):
+		""" Pick frames spread evenly across the job to be rendered as
+			single-frame probe tasks. The number of probes is set by
+			'adaptiveProbes' in the database config (default 3).
+			Returns a list of probe tasks and a list of the remaining frames.
+		"""
+		frames = []
+		for task in tasks:
+			task_frames = sequence.numList(task, sort=False, quiet=True)
+			if not task_frames:
+				return tasks, []  # Frame range unknown
+			frames += task_frames
+
+		count = int(self.getConfig('adaptiveProbes', 3))
+		if len(frames) <= count:
+			return tasks, []
+		if count > 1:
+			indices = [int(round(i*(len(frames)-1)/float(count-1))) for i in range(count)]
+		else:
+			indices = [0]
+
+		probes = [str(frames[i]) for i in indices]
+		pending = [frame for i, frame in enumerate(frames) if i not in indices]
+		return probes, pending
+
+
+	def updateAdaptiveTasks(self, jobID):
+		""" Once all the probe tasks for a job using adaptive task sizing
+			have finished, split the remaining frames into tasks sized to take
+			roughly 'targetTaskDuration' seconds (default 600) each, based on
+			the median render time of the probes. If no probe rendered
+			successfully, fall back to the task size set on submission.
+			Returns the number of tasks created.
+		"""
+		job = self.getJob(jobID)
+		if not job.get('pendingFrames'):
+			return 0
+
+		durations = []
+		for taskNo in range(job['probeTasks']):
+			taskID = self.getTaskID(jobID, taskNo)
+			task = self.read(os.path.join(self.db['completed'], '%s.json' %taskID))
+			if 'endTime' in task and 'startTime' in task:
+				durations.append(task['endTime'] - task['startTime'])
+			elif not task and not self.isFile(os.path.join(self.db['failed'], '%s.json' %taskID)):
+				return 0  # Probe not finished yet
+
+		# Make sure only one client creates the tasks
+		if not self.lockJob(jobID):
+			return 0
+		try:
+			job = self.getJob(jobID)
+			if not job.get('pendingFrames'):
+				return 0
+
+			if durations:
+				durations.sort()
+				median = durations[len(durations)//2]
+				target = job.get('targetTaskDuration', self.getConfig('targetTaskDuration', 600))
+				taskSize = max(1, int(target / max(median, 1)))
+			else:
+				try:
+					taskSize = max(1, int(job['taskSize']))
+				except (KeyError, TypeError, ValueError):
+					taskSize = 1
+
+			frames = sequence.numList(job['pendingFrames'], quiet=True)
+			tasks = sequence.chunkRange(frames, taskSize)
+			dependencies = self.resolveDependencies(
+				self.parseDependencies(job.get('dependencies')))
+			self.writeTasks(jobID, tasks, dependencies, len(job['tasks']))
+
+			job['tasks'] += tasks
+			job['taskSize'] = taskSize
+			del job['pendingFrames']
+			self.write(job, self.getJobDatafile(jobID), atomic=True)
+			self.events.record('createTasks', jobID=jobID, 
+				firstTaskNo=len(job['tasks'])-len(tasks), 
+				tasks=len(tasks), 
+				taskSize=taskSize)
+			return len(tasks)
+
+		finally:
+			self.unlockJob(jobID)
+
+
+	def splitTask(self, jobID, taskNo, parts=2):
+		""" Split a queued task into the specified number of tasks, as evenly
+			as possible. The original task keeps the first part of the frame
+			range and new tasks are added to the job for the rest. Tasks which
+			have already been dequeued cannot be split, as the render command
+			for the full frame range has already started.
+			Returns the number of tasks created.
+		"""
+		taskID = self.getTaskID(jobID, taskNo)
+		filename = os.path.join(self.db['queued'], '%s.json' %taskID)
+		tmpfile = '%s.split' %filename
+
+		if not self.lockJob(jobID, wait=0):
+			return 0  # Don't hold up dispatching
+		try:
+			# Take the task out of the queue so it can't be dequeued while
+			# it's being split
+			try:
+				self.rename(filename, tmpfile)
+			except OSError:
+				return 0
+
+			task = self.read(tmpfile)
+			frames = sequence.numList(task.get('frames', ""), quiet=True)
+			if not frames or len(frames) < 2 or parts < 2:
+				self.rename(tmpfile, filename)
+				return 0
+
+			size = int(math.ceil(len(frames) / float(min(parts, len(frames)))))
+			tasks = sequence.chunkRange(frames, size)
+
+			job = self.getJob(jobID)
+			firstTaskNo = len(job['tasks'])
+			self.writeTasks(jobID, tasks[1:], firstTaskNo=firstTaskNo)
+			task['frames'] = tasks[0]
+			self.write(task, tmpfile)
+			self.rename(tmpfile, filename)
+
+			job['tasks'][taskNo] = tasks[0]
+			job['tasks'] += tasks[1:]
+			self.write(job, self.getJobDatafile(jobID), atomic=True)
+			self.events.record('split', jobID=jobID, taskNo=taskNo, 
+				firstTaskNo=firstTaskNo, 
+				tasks=len(tasks)-1)
+			return len(tasks) - 1
+
+		finally:
+			self.unlockJob(jobID)
+
+
+	def balanceQueue(self):
+		""" Split queued tasks when there are more idle workers than tasks
+			waiting to be rendered, so workers don't sit idle at the end of
+			a job while another works through a long task. The largest tasks
+			are split first. Only the queued folder is listed unless the
+			queue is nearly empty, so this is cheap to call frequently.
+			Returns the number of tasks created.
+		"""
+		queued = [filename for filename in self.listDir(self.db['queued']) 
+			if filename.endswith('.json')]
+		if not queued or len(queued) >= len(self.listDir(self.db['workers'])):
+			return 0
+
+		spare = self.getIdleWorkerCount() - len(queued)
+		if spare <= 0:
+			return 0
+
+		# Find queued tasks with more than one frame
+		candidates = []
+		for filename in queued:
+			task = self.read(os.path.join(self.db['queued'], filename))
+			frames = sequence.numList(task.get('frames', ""), quiet=True)
+			if frames and len(frames) > 1:
+				job = self.getJob(task['jobID'])
+				if job and job['priority'] > 0:  # Ignore paused jobs
+					candidates.append((len(frames), task))
+		candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+
+		# Share the idle workers between the candidate tasks
+		created = 0
+		for i, (count, task) in enumerate(candidates):
+			if spare <= 0:
+				break
+			parts = min(count, 1 + int(math.ceil(spare / float(len(candidates)-i))))
+			new_tasks = self.splitTask(task['jobID'], task['taskNo'], parts)
+			spare -= new_tasks
+			created += new_tasks
+
+		return created
 
 
 	def deleteJob(self, jobID):
@@ -146,9 +652,11 @@ class RenderQueue():
 			structure and deletes them.
 			TODO: Also kill processes for tasks that are rendering.
 		"""
+		self.releaseDependents(jobID)  # Don't leave dependent jobs waiting
+
 		datafile = os.path.join(self.db['jobs'], '%s.json' %jobID)
-		oswrapper.remove(datafile)
-		self.queue_logger.info("Deleted job %s" %jobID)
+		self.remove(datafile)
+		self.events.record('deleteJob', jobID=jobID)
 
 		# Delete task data files and log files...
 		task_count = self.deleteTasks(jobID)
@@ -159,22 +667,15 @@ class RenderQueue():
 
 	def archiveJob(self, jobID):
 		""" Archive a render job.
-			Moves all files associated with a particular job UUID into a
-			special archive folder. Tasks and logs are not archived.
+			The job data and a summary of its tasks are added to the job
+			archive (see archive.py), then the job's data file, task files
+			and logs are deleted.
 			TODO: Only allow completed jobs to be archived.
 		"""
-		filename = os.path.join(self.db['jobs'], '%s.json' %jobID)
-		dst_dir = self.db['archive']
-
-		if oswrapper.move(filename, dst_dir):
-			self.queue_logger.info("Archived job %s" %jobID)
-
-			# Delete task data files and log files...
-			self.deleteTasks(jobID)
-			self.deleteJobLogs(jobID)
+		if self.archiveJobs([jobID]):
 			return True
 		else:
-			self.queue_logger.warning("Failed to archive job %s" %jobID)
+			logger.warning("Failed to archive job %s" %jobID)
 			return False
 
 
@@ -184,44 +685,355 @@ class RenderQueue():
 		task_count = 0
 
 		path = '%s/*/*/%s_*.json' %(self.db['root'], jobID)
-		for filename in glob.glob(path):
+		for filename in self.glob(path):
 			if 'workers' in filename:
 				# TODO: Deal nicely with tasks that are currently rendering
-				print("Task %s currently rendering." %filename)
+				logger.warning("Task %s currently rendering." %filename)
 			task_count += 1
-			oswrapper.remove(filename)  # add return value for check
+			self.remove(filename)  # add return value for check
 
 		if task_count:
-			self.queue_logger.info("Deleted %d tasks for job %s" %(task_count, jobID))
+			self.events.record('deleteTasks', jobID=jobID, tasks=task_count)
 
 		return task_count
 
 
 	def deleteJobLogs(self, jobID):
-		""" Delete log files associated with a particular job.
+		""" Delete log files associated with a particular job, including
+			rotated and compressed logs.
 		"""
 		log_count = 0
 
-		path = '%s/%s_*.log' %(self.db['logs'], jobID)
-		for logfile in glob.glob(path):
+		path = '%s/%s_*.log*' %(self.db['logs'], jobID)
+		for logfile in self.glob(path):
 			log_count += 1
-			oswrapper.remove(logfile)
+			self.remove(logfile)
 
 		if log_count:
-			self.queue_logger.info("Deleted %d log files for job %s" %(log_count, jobID))
+			self.events.record('deleteLogs', jobID=jobID, logs=log_count)
 
 		return log_count
 
 
 	def requeueJob(self, jobID):
-		""" Requeue a render job and associated tasks.
+		""" Requeue a render job and associated tasks. Tasks which are
+			waiting for dependencies are left waiting. Workers excluded from
+			the job after repeated failures are allowed to render it again.
 		"""
+		self.clearWorkerFailures(jobID)
+
 		#statuses = ['queued', 'working', 'completed', 'failed']
+		requeued = []
 		path = '%s/*/*/%s_*.json' %(self.db['root'], jobID)
-		for filename in glob.glob(path):
-			if 'queued' not in filename:
-				oswrapper.move(filename, self.db['queued'])
-				self.queue_logger.info("Requeued job %s" %jobID)
+		for filename in self.glob(path):
+			if 'queued' not in filename and 'waiting' not in filename:
+				if self.move(filename, self.db['queued']):
+					requeued.append(self.getTaskEvent(filename, reason='job'))
+		self.events.recordMany('requeue', requeued)
+
+
+	def clearWorkerFailures(self, jobID):
+		""" Forget the task failures counted against workers for the job, so
+			workers excluded from it may render it again.
+		"""
+		if not self.lockJob(jobID):
+			logger.warning("Unable to lock job %s to clear worker failures." %jobID)
+			return
+		try:
+			datafile = self.getJobDatafile(jobID)
+			job = self.read(datafile)
+			if job.get('workerFailures') or job.get('blacklist'):
+				job['workerFailures'] = {}
+				job['blacklist'] = []
+				self.write(job, datafile, atomic=True)
+		finally:
+			self.unlockJob(jobID)
+
+
+	def requeueJobs(self, jobIDs):
+		""" Requeue several render jobs at once, scanning the database for
+			their tasks once rather than once per job. Otherwise the same as
+			requeueJob(). Returns the number of tasks requeued.
+		"""
+		for jobID in jobIDs:
+			self.clearWorkerFailures(jobID)
+
+		requeued = []
+		for filename in self.findTasks(jobIDs=jobIDs).values():
+			if not self.isInFolder(filename, 'queued', 'waiting'):
+				if self.move(filename, self.db['queued']):
+					requeued.append(self.getTaskEvent(filename, reason='job'))
+		self.events.recordMany('requeue', requeued)
+
+		return len(requeued)
+
+
+	def deleteJobs(self, jobIDs):
+		""" Delete several render jobs and their tasks and log files at once,
+			scanning the database once rather than once per job. Returns a
+			list of the IDs of the jobs deleted.
+		"""
+		deleted = []
+		for jobID in jobIDs:
+			self.releaseDependents(jobID)  # Don't leave dependent jobs waiting
+			if self.remove(self.getJobDatafile(jobID))[0]:
+				deleted.append(jobID)
+
+		if deleted:
+			self.events.recordMany('deleteJob', 
+				[{'jobID': jobID} for jobID in deleted])
+			self.purgeJobs(deleted)
+
+		return deleted
+
+
+	def archiveJobs(self, jobIDs):
+		""" Archive several render jobs at once, scanning the database once
+			rather than once per job. The jobs are added to the job archive
+			in a single write, along with a summary of their tasks (see
+			archive.py). Logs are not archived.
+			Returns a list of the IDs of the jobs archived.
+		"""
+		jobs = []
+		for jobID in jobIDs:
+			job = self.getJob(jobID)
+			if job:
+				jobs.append(job)
+		if not jobs:
+			return []
+
+		# Summarise tasks
+		tasks = dict((job['jobID'], []) for job in jobs)
+		found = self.findTasks(jobIDs=list(tasks.keys()))
+		for taskID, filename in sorted(found.items()):
+			folder = os.path.dirname(filename)
+			if os.path.dirname(folder) == self.db['workers']:
+				status = 'rendering'
+			else:
+				status = os.path.basename(folder)
+			task = self.read(filename)
+			if task.get('jobID') in tasks:
+				tasks[task['jobID']].append(archive.getTaskSummary(task, status))
+
+		# Add to archive, waiting briefly if another client is archiving
+		for attempt in range(10):
+			if self.acquireLock('archive'):
+				break
+			time.sleep(0.5)
+		else:
+			logger.warning("Job archive is locked by another client")
+			return []
+		try:
+			if not self.archive.append([
+				{'job': job, 'tasks': tasks[job['jobID']]} for job in jobs]):
+				return []
+		finally:
+			self.releaseLock('archive')
+
+		archived = []
+		for job in jobs:
+			self.releaseDependents(job['jobID'])  # Don't leave dependent jobs waiting
+			if self.remove(self.getJobDatafile(job['jobID']))[0]:
+				archived.append(job['jobID'])
+
+		if archived:
+			self.events.recordMany('archiveJob', 
+				[{'jobID': jobID} for jobID in archived])
+			self.purgeJobs(archived)
+
+		return archived
+
+
+	def findArchivedJobs(self, **criteria):
+		""" Return index entries for archived jobs matching the given
+			criteria (see archive.JobArchive.find()).
+		"""
+		return self.archive.find(**criteria)
+
+
+	def getArchivedJob(self, jobID):
+		""" Return an archived job and the summary of its tasks, or None if
+			the job is not in the archive.
+		"""
+		return self.archive.getJob(jobID)
+
+
+	def purgeJobs(self, jobIDs):
+		""" Delete the task data files and log files belonging to the
+			specified jobs, reading each folder once. Returns the number of
+			task and log files deleted.
+		"""
+		task_count = 0
+		for filename in self.findTasks(jobIDs=jobIDs).values():
+			if os.path.dirname(os.path.dirname(filename)) == self.db['workers']:
+				# TODO: Deal nicely with tasks that are currently rendering
+				logger.warning("Task %s currently rendering." %filename)
+			if self.remove(filename)[0]:
+				task_count += 1
+
+		log_count = 0
+		jobIDs = set(jobIDs)
+		for name in self.listDir(self.db['logs']):
+			if tasklog.isTaskLog(name, jobIDs):
+				if self.remove(os.path.join(self.db['logs'], name))[0]:
+					log_count += 1
+
+		return task_count, log_count
+
+
+	def parseDependencies(self, dependencies):
+		""" Return a list of dependencies in a standard form. Dependencies may
+			be given as a list of dictionaries, or a string of comma-separated
+			items of the form 'jobID', 'jobID:frames' or 'jobID:perframe',
+			e.g. "da60928a4a0746cebf56e5c3283e513b:1001-1050"
+			'jobID' - wait for the whole job to complete.
+			'jobID:frames' - wait for the specified frames of the job.
+			'jobID:perframe' - each task waits only for the same frames of
+			the job (frame-level dependency).
+		"""
+		if not dependencies:
+			return []
+
+		if isinstance(dependencies, dict):
+			dependencies = [dependencies]
+		elif not isinstance(dependencies, list):
+			items = re.split(r',\s*(?=[0-9a-f]{32})', str(dependencies).strip())
+			dependencies = []
+			for item in items:
+				jobID, _, frames = item.partition(':')
+				if frames.strip().lower() == 'perframe':
+					dependencies.append({'jobID': jobID, 'perFrame': True})
+				else:
+					dependencies.append({'jobID': jobID, 'frames': frames.strip()})
+
+		parsed = []
+		for dep in dependencies:
+			if not isinstance(dep, dict):
+				dep = {'jobID': dep}
+			parsed.append({
+				'jobID': str(dep['jobID']).strip(), 
+				'frames': dep.get('frames') or None, 
+				'perFrame': bool(dep.get('perFrame', False))})
+		return parsed
+
+
+	def resolveDependencies(self, dependencies):
+		""" Look up the jobs depended on and work out which of the frames
+			required have already been rendered. Dependencies on jobs which no
+			longer exist are dropped. This only happens once, when a job is
+			submitted. After that, waiting tasks are updated incrementally as
+			tasks they depend on are completed (see releaseDependents()).
+		"""
+		resolved = []
+		for dep in dependencies:
+			job = self.getJob(dep['jobID'])
+			if not job:
+				logger.warning("Dependency on job %s ignored as the job does not exist." %dep['jobID'])
+				continue
+
+			dep['jobFrames'] = sequence.numList(job.get('frames', ""), quiet=True)
+			dep['completedFrames'] = []
+			dep['completedTasks'] = 0
+			path = '%s/%s_*.json' %(self.db['completed'], dep['jobID'])
+			for filename in self.glob(path):
+				task = self.read(filename)
+				dep['completedFrames'] += sequence.numList(task.get('frames', ""), quiet=True) or []
+				dep['completedTasks'] += 1
+
+			# Jobs with an unknown frame range are rendered as a single task
+			if dep['jobFrames'] is None and dep['completedTasks']:
+				continue
+
+			resolved.append(dep)
+		return resolved
+
+
+	def getTaskDependencies(self, dependencies, frames):
+		""" Return a dictionary of the frames the task with the given frame
+			range is waiting for, keyed by job ID. Frames are stored as a
+			range string, or "Unknown" to wait for the whole job.
+		"""
+		waitingFor = {}
+		for dep in dependencies:
+			if dep['perFrame']:
+				needed = sequence.numList(frames, quiet=True)
+			elif dep['frames']:
+				needed = sequence.numList(dep['frames'], quiet=True)
+			else:
+				needed = dep['jobFrames']
+
+			if needed is None or dep['jobFrames'] is None:
+				waitingFor[dep['jobID']] = "Unknown"
+				continue
+
+			needed = set(needed).intersection(dep['jobFrames'])
+			needed.difference_update(dep['completedFrames'])
+			if needed:
+				waitingFor[dep['jobID']] = sequence.numRange(needed)
+
+		return waitingFor
+
+
+	def releaseDependents(self, jobID, frames=None):
+		""" Update tasks waiting for the specified frames of a job to be
+			rendered. Tasks with no remaining dependencies are moved from the
+			'waiting' folder to the 'queued' folder, ready to be picked up by
+			workers. If 'frames' is None, all dependencies on the job are
+			removed, e.g. when the job is deleted.
+			Only the waiting tasks of jobs registered as dependents of the job
+			are read, so the cost is proportional to the number of tasks
+			actually affected.
+		"""
+		job = self.getJob(jobID) or {}
+		released = []
+
+		for dependentID in job.get('dependents', []):
+			released += self.releaseWaitingTasks(dependentID, jobID, frames)
+
+		self.events.recordMany('release', released)
+		return len(released)
+
+
+	def releaseWaitingTasks(self, jobID, dependencyID, frames=None):
+		""" Update the waiting tasks of a job now that the specified frames
+			of a job it depends on have been rendered (see
+			releaseDependents()). The job's lock is held while its waiting
+			tasks are updated, so that concurrent releases from different
+			dependencies don't overwrite each other. Returns a list of
+			release events for the tasks moved to the queue.
+		"""
+		if not self.lockJob(jobID):
+			logger.warning("Unable to lock job %s to release waiting tasks." %jobID)
+			return []
+
+		released = []
+		try:
+			path = '%s/%s_*.json' %(self.db['waiting'], jobID)
+			for filename in self.glob(path):
+				task = self.read(filename)
+				waitingFor = task.get('waitingFor', {})
+				if dependencyID not in waitingFor:
+					continue
+
+				if frames is None or waitingFor[dependencyID] == "Unknown":
+					remaining = []
+				else:
+					remaining = set(sequence.numList(waitingFor[dependencyID], quiet=True) or [])
+					remaining.difference_update(frames)
+				if remaining:
+					waitingFor[dependencyID] = sequence.numRange(remaining)
+				else:
+					del waitingFor[dependencyID]
+
+				self.write(task, filename, atomic=True)
+				if not waitingFor and self.move(filename, self.db['queued']):
+					released.append({'jobID': task['jobID'], 
+						'taskNo': task['taskNo'], 
+						'dependency': dependencyID})
+		finally:
+			self.unlockJob(jobID)
+
+		return released
 
 
 	def getJobs(self):
@@ -229,7 +1041,7 @@ class RenderQueue():
 		"""
 		jobs = []
 		path = '%s/jobs/*.json' %self.db['root']
-		for filename in glob.glob(path):
+		for filename in self.glob(path):
 			jobs.append(self.read(filename))
 		return jobs
 
@@ -262,17 +1074,44 @@ class RenderQueue():
 	def setPriority(self, jobID, priority):
 		""" Set the priority of a render job.
 		"""
-		filename = os.path.join(self.db['jobs'], '%s.json' %jobID)
-		job = self.read(filename)
-		if 0 <= priority <= 100:
+		if self.writePriority(jobID, priority):
+			self.events.record('priority', jobID=jobID, priority=priority)
+
+
+	def setPriorities(self, priorities):
+		""" Set the priority of several render jobs at once. 'priorities' is
+			a dictionary of priority values keyed by job ID.
+		"""
+		changed = []
+		for jobID, priority in priorities.items():
+			if self.writePriority(jobID, priority):
+				changed.append({'jobID': jobID, 'priority': priority})
+
+		self.events.recordMany('priority', changed)
+
+
+	def writePriority(self, jobID, priority):
+		""" Write the priority of a render job to its data file, with the
+			job's lock held. Returns True if the priority was changed.
+		"""
+		if not 0 <= priority <= 100:
+			return False
+		if not self.lockJob(jobID):
+			logger.warning("Unable to lock job %s to set its priority." %jobID)
+			return False
+		try:
+			filename = self.getJobDatafile(jobID)
+			job = self.read(filename)
 			# Only write file if priority has changed
-			if job['priority'] != priority:
-				job['priority'] = priority
-				self.write(job, filename)
-				self.queue_logger.info("Set priority of job %s to %d" %(jobID, priority))
-		# elif priority == 0:
-		# 	job['priorityold'] = job['priority']
-		# 	job['priority'] = priority
+			if not job or job['priority'] == priority:
+				return False
+			job['priority'] = priority
+			# elif priority == 0:
+			# 	job['priorityold'] = job['priority']
+			# 	job['priority'] = priority
+			return self.write(job, filename, atomic=True)
+		finally:
+			self.unlockJob(jobID)
 
 
 	def getTasks(self, jobID):
@@ -281,7 +1120,7 @@ class RenderQueue():
 		tasks = []
 		#statuses = ['queued', 'working', 'completed', 'failed']
 		path = '%s/*/*/%s_*.json' %(self.db['root'], jobID)
-		for filename in glob.glob(path):
+		for filename in self.glob(path):
 			taskdata = self.read(filename)
 
 			if 'workers' in filename:
@@ -291,6 +1130,8 @@ class RenderQueue():
 				taskdata['status'] = 'Rendering on %s' %worker['name']
 			elif 'queued' in filename:
 				taskdata['status'] = 'Queued'
+			elif 'waiting' in filename:
+				taskdata['status'] = 'Waiting'
 			elif 'completed' in filename:
 				taskdata['status'] = 'Done'
 			elif 'failed' in filename:
@@ -308,34 +1149,330 @@ class RenderQueue():
 		"""
 		tasks = []
 		path = '%s/%s_*.json' %(self.db['queued'], jobID)
-		for filename in glob.glob(path):
+		for filename in self.glob(path):
 			taskdata = self.read(filename)
 			tasks.append(taskdata)
 		return tasks
 
 
-	def getTaskToRender(self):
+	def getPoolQueues(self):
+		""" Return a dictionary of job queues keyed by pool, with None as the
+			key for jobs not assigned to a pool. Each queue is a list of
+			dispatchable jobs (not paused and with tasks queued), sorted by
+			priority, then submit time (FIFO). The job's queued task numbers
+			are stored under 'queuedTasks'.
+			Queued tasks are found from their file names alone, so only jobs
+			with tasks waiting to be rendered are read. The queue is updated
+			incrementally: the queued folder is only listed again when it has
+			been modified, and a job is only read again when its data file has
+			been modified, so a call normally costs a stat per queued job.
+		"""
+		from operator import itemgetter
+
+		index = self.queueIndex
+		now = self.getTime()  # Compared with file modification times
+
+		# Map job IDs to queued task numbers
+		try:
+			mtime = self.getModTime(self.db['queued'])
+		except OSError:
+			mtime = None
+		if mtime is None or mtime != index['mtime'] or now - mtime < MTIME_RESOLUTION:
+			queued = {}
+			for filename in self.listDir(self.db['queued']):
+				try:
+					jobID, taskNo = os.path.splitext(filename)[0].rsplit('_', 1)
+					queued.setdefault(jobID, []).append(int(taskNo))
+				except ValueError:
+					pass
+			for taskNos in queued.values():
+				taskNos.sort()
+			index['queued'] = queued
+			index['mtime'] = mtime
+
+		# Read jobs which are new to the queue or have been modified
+		jobs = {}
+		for jobID in index['queued']:
+			try:
+				mtime = self.getModTime(self.getJobDatafile(jobID))
+			except OSError:
+				continue  # Job deleted
+			cached = index['jobs'].get(jobID)
+			if cached is None or cached[0] != mtime or now - mtime < MTIME_RESOLUTION:
+				cached = (mtime, self.getJob(jobID))
+			jobs[jobID] = cached
+		index['jobs'] = jobs  # Forget jobs which are no longer queued
+
+		# Sort jobs into per-pool queues
+		queues = {}
+		for jobID, (_, job) in jobs.items():
+			if job and job['priority'] > 0:  # Ignore paused jobs
+				job = dict(job, queuedTasks=list(index['queued'][jobID]))
+				queues.setdefault(self.getJobPool(job), []).append(job)
+
+		for queue in queues.values():
+			queue.sort(key=itemgetter('submitTime'))
+			queue.sort(key=itemgetter('priority'), reverse=True)
+
+		return queues
+
+
+	def getJobPool(self, job):
+		""" Return the pool the job is assigned to, or None if the job may be
+			rendered by any worker.
+		"""
+		pool = job.get('pool')
+		if pool in [None, "", "None"]:
+			return None
+		return pool
+
+
+	def getWorkerPools(self, worker):
+		""" Return a list of the pools the worker belongs to. The 'pool'
+			value may contain several pools separated by commas.
+		"""
+		pools = worker.get('pool')
+		if not pools or pools == "None":
+			return []
+		return [pool for pool in re.split(r',\s*', pools) if pool]
+
+
+	def workerCanRender(self, worker, job):
+		""" Check whether the worker is able to render the job, by matching
+			the job type and requirements against the worker's declared
+			capabilities, e.g.
+			"capabilities": {
+				"applications": {"Maya": ["2018"], "Nuke": ["10.0v3"]},
+				"ram": 64,
+				"gpu": false
+			}
+			Workers which don't declare capabilities can render anything.
+			Pools are not checked here, see getTaskToRender().
+		"""
+		capabilities = worker.get('capabilities')
+		if not capabilities:
+			return True
+
+		# Application and version
+		applications = capabilities.get('applications')
+		if applications is not None and job['jobType'] != "Generic":
+			versions = applications.get(job['jobType'])
+			if versions is None:
+				return False
+			version = str(job.get('version', ""))
+			if versions and version:
+				if not any(str(v).startswith(version) for v in versions):
+					return False
+
+		# Memory (GB)
+		ram = capabilities.get('ram')
+		if ram is not None and job.get('minRam', 0) > ram:
+			return False
+
+		# GPU
+		if job.get('requiresGpu') and capabilities.get('gpu') is False:
+			return False
+
+		return True
+
+
+	def getTaskToRender(self, workerID=None):
 		""" Find a task to render by finding the highest priority job with
 			tasks queued and return its first queued task.
+			If 'workerID' is given, only consider jobs which are either not
+			assigned to a pool or assigned to one of the worker's pools, which
+			the worker is capable of rendering, and which the worker has not
+			been excluded from after repeated failures.
+			Tasks waiting to be retried after failing are skipped until their
+			retry delay has passed.
 		"""
-		from operator import itemgetter
+		if workerID is None:
+			worker = {}
+		else:
+			worker = self.getWorker(workerID)
 
-		# Get jobs and sort by priority, then submit time (FIFO)
-		jobs = self.getJobs()
-		if jobs:
-			jobs.sort(key=itemgetter('submitTime'))
-			for job in sorted(jobs, key=itemgetter('priority'), reverse=True):
-				if job['priority'] > 0:  # Ignore paused jobs
+		# Gather jobs from the pool queues relevant to this worker
+		queues = self.getPoolQueues()
+		if workerID is None:
+			pools = queues.keys()
+		else:
+			pools = [None] + self.getWorkerPools(worker)
 
-					# Get queued tasks, sort by ID, return first result
-					tasks = self.getQueuedTasks(job['jobID'])
-					if tasks:
-						return sorted(tasks, key=itemgetter('taskNo'))[0]
+		jobs = []
+		for pool in pools:
+			jobs += queues.get(pool, [])
+
+		now = time.time()
+		for job in self.preferWarmJob(workerID, self.sortJobs(jobs)):
+			if workerID in job.get('blacklist', []):
+				continue
+			if self.workerCanRender(worker, job):
+				# Return first queued task that is ready to render
+				for taskNo in job['queuedTasks']:
+					taskID = self.getTaskID(job['jobID'], taskNo)
+					task = self.read(os.path.join(self.db['queued'], '%s.json' %taskID))
+					if task and task.get('notBefore', 0) <= now:
+						return task
 
 		# No suitable tasks found
 		return None
 
 
+	def sortJobs(self, jobs):
+		""" Sort jobs into dispatch order according to the scheduling policy
+			set in the database config:
+			'priority' (default) - highest priority first, then oldest first.
+			'fairshare' - jobs belonging to the user with the least recent
+			render time (divided by the user's weight) first, then jobs with
+			the least recent render time relative to their priority, then
+			oldest first.
+		"""
+		policy = self.getConfig('schedulingPolicy', 'priority')
+
+		if policy == 'fairshare':
+			usage = self.getUsage()
+			weights = self.getConfig('fairShareWeights', {})
+
+			def fairShareKey(job):
+				user_usage = usage['users'].get(job.get('username'), 0)
+				job_usage = usage['jobs'].get(job['jobID'], 0)
+				user_weight = float(weights.get(job.get('username'), 1))
+				return (user_usage / user_weight, 
+				        job_usage / job['priority'], 
+				        job['submitTime'])
+
+			return sorted(jobs, key=fairShareKey)
+
+		else:
+			return sorted(jobs, key=lambda job: (-job['priority'], job['submitTime']))
+
+
+	def preferWarmJob(self, workerID, jobs):
+		""" Move the job the worker last rendered ahead of other jobs of the
+			same or lower priority, so consecutive tasks from a job tend to go
+			to the same worker, which already has the scene and textures
+			cached. Affinity expires 'affinityTimeout' seconds (default 300)
+			after the worker finished its last task from the job. Set the
+			timeout to 0 to disable.
+			Warm jobs are tracked in memory as tasks are completed, so no
+			extra reads are needed.
+		"""
+		try:
+			jobID, timestamp = self.warmJobs[workerID]
+		except KeyError:
+			return jobs
+
+		if time.time() - timestamp > self.getConfig('affinityTimeout', 300):
+			del self.warmJobs[workerID]
+			return jobs
+
+		for i, job in enumerate(jobs):
+			if job['jobID'] == jobID:
+				warm_job = jobs.pop(i)
+				break
+		else:
+			return jobs
+
+		for i, job in enumerate(jobs):
+			if job['priority'] <= warm_job['priority']:
+				jobs.insert(i, warm_job)
+				break
+		else:
+			jobs.append(warm_job)
+		return jobs
+
+
+	def getUsage(self):
+		""" Return the accumulated render time (in seconds) for each user
+			and job, decayed to the current time.
+			Usage halves every 'fairShareHalfLife' seconds (default 1 day),
+			so past usage gradually stops counting against a user.
+		"""
+		half_life = float(self.getConfig('fairShareHalfLife', 86400))
+		ledger = self.read(os.path.join(self.db['config'], 'usage.json'))
+		now = time.time()
+
+		usage = {}
+		for category in ['users', 'jobs']:
+			usage[category] = {}
+			for key, (value, timestamp) in ledger.get(category, {}).items():
+				usage[category][key] = value * 0.5**((now-timestamp)/half_life)
+
+		return usage
+
+
+	def recordUsage(self, task, timeout=5):
+		""" Add the render time of a finished task to the usage ledger.
+			The ledger holds a running decayed total for each user and job,
+			so it is updated incrementally as each task finishes instead of
+			aggregating the task history whenever a task is dispatched.
+			The ledger is locked while it's updated, so concurrent updates
+			from different clients aren't lost. If the lock can't be
+			acquired within 'timeout' seconds the update is skipped.
+		"""
+		try:
+			seconds = task['endTime'] - task['startTime']
+		except KeyError:
+			return
+
+		job = self.getJob(task['jobID'])
+		half_life = float(self.getConfig('fairShareHalfLife', 86400))
+		datafile = os.path.join(self.db['config'], 'usage.json')
+
+		if not self.acquireLock('usage', timeout=10, wait=timeout):
+			logger.warning("Unable to lock usage ledger, render time of %s not recorded." %task['jobID'])
+			return
+		try:
+			ledger = self.read(datafile)
+			now = time.time()
+
+			for category, name in [('users', job.get('username')), ('jobs', task['jobID'])]:
+				if name is None:
+					continue
+				entries = ledger.setdefault(category, {})
+				value, timestamp = entries.get(name, (0, now))
+				entries[name] = (value * 0.5**((now-timestamp)/half_life) + seconds, now)
+
+				# Discard negligible entries to keep the ledger small
+				for key, (value, timestamp) in list(entries.items()):
+					if value * 0.5**((now-timestamp)/half_life) < 1:
+						del entries[key]
+
+			self.write(ledger, datafile, atomic=True)
+
+		finally:
+			self.releaseLock('usage')
+
+
+	def claimTask(self, workerID):
+		""" Find a task to render and dequeue it for the specified worker.
+			Only tasks which match the worker's pool(s) and capabilities are
+			considered. Returns the task data, or None if there is nothing to
+			render. If another worker dequeues the task first, try the next
+			candidate.
+			Unless 'workStealing' is disabled in the database config, queued
+			tasks are split first if there are more idle workers than tasks.
+			The queue is balanced at most once every 'balanceInterval'
+			seconds (default 10) by a single client, elected with a lease
+			in the same way as the reaper.
+		"""
+		if self.getConfig('workStealing', True):
+			interval = self.getConfig('balanceInterval', 10)
+			if time.time() - self.lastBalance >= interval:
+				self.lastBalance = time.time()
+				if self.acquireLock('balance', timeout=interval*3, renew=True):
+					self.balanceQueue()
+
+		for attempt in range(3):
+			task = self.getTaskToRender(workerID)
+			if task is None:
+				return None
+			if self.dequeueTask(task['jobID'], task['taskNo'], workerID):
+				return task
+
+		return None
+
+
 	#########
 	# TASKS #
 	#########
@@ -355,6 +1492,53 @@ class RenderQueue():
 		return os.path.join(self.db['logs'], logfile)
 
 
+	def tailTaskLog(self, jobID, taskNo, offset=None, size=tasklog.TAIL_SIZE):
+		""" Return the end of the specified task's log without reading the
+			whole file. If 'offset' is given, only the lines written since
+			then are returned. Returns a dictionary with the text under 'text'
+			and the offset to continue reading from under 'offset', which is
+			None once the task has finished writing to the log, or None if
+			the task has no log.
+		"""
+		logfile = self.getTaskLog(jobID, taskNo)
+		if offset is None:
+			result = tasklog.tail(logfile, size)
+			if result is None:
+				return None
+			text, offset = result
+		else:
+			text, offset = tasklog.follow(logfile, offset, size)
+		return {'text': text, 'offset': offset}
+
+
+	def findTasks(self, taskIDs=None, jobIDs=None):
+		""" Return a dictionary of task data file paths keyed by task ID, for
+			the specified tasks and/or all the tasks of the specified jobs.
+			Each task folder and worker folder is listed just once, so this
+			is much quicker than looking for many tasks individually.
+		"""
+		taskIDs = set(taskIDs or [])
+		jobIDs = set(jobIDs or [])
+		found = {}
+
+		dirs = [self.db[status] for status in ['queued', 'waiting', 'completed', 'failed']]
+		dirs += [os.path.join(self.db['workers'], workerID) 
+			for workerID in self.listDir(self.db['workers'])]
+		for directory in dirs:
+			try:
+				names = self.listDir(directory)
+			except OSError:
+				continue
+			for name in names:
+				taskID, ext = os.path.splitext(name)
+				if ext != '.json' or '_' not in taskID:
+					continue
+				if taskID in taskIDs or taskID.rsplit('_', 1)[0] in jobIDs:
+					found[taskID] = os.path.join(directory, name)
+
+		return found
+
+
 	# def updateTaskStatus(self, jobID, taskID, progress):
 	# 	""" Update task progress.
 	# 	"""
@@ -378,79 +1562,352 @@ class RenderQueue():
 		filename = os.path.join(self.db['queued'], '%s.json' %taskID)
 		dst_dir = os.path.join(self.db['workers'], workerID)
 
-		if oswrapper.move(filename, dst_dir):
+		if self.move(filename, dst_dir):
 			dst_filename = os.path.join(dst_dir, '%s.json' %taskID)
 			task = self.read(dst_filename)
 			task['startTime'] = time.time()
+			task['workerID'] = workerID
 			task.pop('endTime', None)
+			task.pop('notBefore', None)
 			self.write(task, dst_filename)
-			self.queue_logger.info("Worker %s dequeued task %s" %(workerID, taskID))
+			self.events.record('dequeue', jobID=jobID, taskNo=taskNo, 
+				workerID=workerID, 
+				frames=task.get('frames'))
 			return True
 		else:
-			self.queue_logger.warning("Worker %s failed to dequeue task %s" %(workerID, taskID))
+			logger.warning("Worker %s failed to dequeue task %s" %(workerID, taskID))
 			return False
 
 
-	def completeTask(self, jobID, taskNo, workerID=None, taskTime=0):
+	def completeTask(self, jobID, taskNo, workerID=None, taskTime=0, resources=None):
 		""" Mark the specified task as 'Done'.
+			'resources' is a dictionary of resources used by the render
+			process, which is stored with the task.
+			If 'workerID' is given, the task is only completed if the worker
+			still holds it, e.g. not if it was requeued by the reaper while
+			the worker was unresponsive.
 		"""
 		taskID = self.getTaskID(jobID, taskNo)
 
 		path = '%s/*/*/%s.json' %(self.db['root'], taskID)
-		for filename in glob.glob(path):
+		for filename in self.glob(path):
 			if 'completed' not in filename:
-				# task = self.read(filename)
-				# if 'endTime' not in task:
-				# 	task['endTime'] = time.time()
-				# self.write(task, filename)
-
-				if oswrapper.move(filename, self.db['completed']):
-					self.queue_logger.info("Worker %s completed task %s" %(workerID, taskID))
+				if not self.isHeldBy(filename, workerID):
+					logger.warning("Task %s is no longer held by worker %s, not completing it." %(taskID, workerID))
+					return False
+				task = self.read(filename)
+
+				if self.move(filename, self.db['completed']):
+					if workerID is not None:
+						self.warmJobs[workerID] = (jobID, time.time())
+
+					# Record end time for tasks that were rendering
+					rendered = 'startTime' in task and 'endTime' not in task
+					if rendered:
+						task['endTime'] = time.time()
+						self.recordAttempt(task, "Done", resources)
+						self.write(task, os.path.join(self.db['completed'], '%s.json' %taskID))
+						self.recordUsage(task)
+					self.events.record('complete', 
+						**self.getTaskEvent(task=task, rendered=rendered, workerID=workerID))
+
+					# Release tasks waiting for these frames
+					self.releaseDependents(jobID, 
+						sequence.numList(task.get('frames', ""), quiet=True))
+					self.updateAdaptiveTasks(jobID)
 					return True
 				else:
 					return False
 
 
-	def failTask(self, jobID, taskNo, workerID=None, taskTime=0):
+	def isInFolder(self, filename, *folders):
+		""" Return True if the task data file 'filename' is in any of the
+			specified task folders, e.g. 'queued'.
+		"""
+		folder = os.path.normpath(os.path.dirname(filename))
+		return folder in [os.path.normpath(self.db[name]) for name in folders]
+
+
+	def isHeldBy(self, filename, workerID):
+		""" Return True if the task data file 'filename' is in the folder of
+			the specified worker, i.e. the worker is rendering it, or if
+			'workerID' is None.
+		"""
+		if workerID is None:
+			return True
+		workerdir = os.path.join(self.db['workers'], workerID)
+		return os.path.normpath(os.path.dirname(filename)) == os.path.normpath(workerdir)
+
+
+	def getHolder(self, filename):
+		""" Return the ID of the worker holding the task data file
+			'filename', i.e. rendering it, or None.
+		"""
+		folder = os.path.normpath(os.path.dirname(filename))
+		if os.path.dirname(folder) == os.path.normpath(self.db['workers']):
+			return os.path.basename(folder)
+		return None
+
+
+	def failTask(self, jobID, taskNo, workerID=None, taskTime=0, resources=None):
 		""" Mark the specified task as 'Failed'.
+			If the task failed while rendering on a worker, it is requeued
+			automatically until it has failed more than 'maxRetries' times.
+			Each retry is delayed by 'retryDelay' seconds, doubling with each
+			failure. Workers which fail 'maxWorkerFailures' tasks from the
+			same job are excluded from rendering that job. These values are
+			read from the job, falling back to the database config.
+			'resources' is a dictionary of resources used by the render
+			process, which is stored with the task.
+			If 'workerID' is given, the task is only failed if the worker
+			still holds it.
 		"""
 		taskID = self.getTaskID(jobID, taskNo)
 
 		path = '%s/*/*/%s.json' %(self.db['root'], taskID)
-		for filename in glob.glob(path):
+		for filename in self.glob(path):
 			if 'failed' not in filename:
-				# task = self.read(filename)
-				# if 'endTime' not in task:
-				# 	task['endTime'] = time.time()
-				# self.write(task, filename)
-
-				if oswrapper.move(filename, self.db['failed']):
-					self.queue_logger.info("Worker %s failed task %s" %(workerID, taskID))
+				if not self.isHeldBy(filename, workerID):
+					logger.warning("Task %s is no longer held by worker %s, not failing it." %(taskID, workerID))
+					return False
+				task = self.read(filename)
+				retry = False
+
+				# Record end time for tasks that were rendering
+				rendered = 'startTime' in task and 'endTime' not in task
+				if rendered:
+					task['endTime'] = time.time()
+					self.recordAttempt(task, "Failed", resources)
+					self.recordUsage(task)
+
+					if workerID is not None:
+						job = self.recordWorkerFailure(jobID, workerID)
+						failures = [attempt for attempt in task['attempts'] 
+							if attempt['result'] == "Failed"]
+						max_retries = job.get('maxRetries', self.getConfig('maxRetries', 2))
+						if len(failures) <= max_retries:
+							retry = True
+							delay = job.get('retryDelay', self.getConfig('retryDelay', 30))
+							task['notBefore'] = time.time() + delay * 2**(len(failures)-1)
+
+				if retry:
+					# Update the task before moving it back to the queue, so
+					# it can't be picked up before the retry delay is set
+					self.write(task, filename)
+					if self.move(filename, self.db['queued']):
+						self.events.record('fail', 
+							**self.getTaskEvent(task=task, rendered=rendered, 
+								workerID=workerID, retry=True, notBefore=task['notBefore']))
+						return True
+					else:
+						return False
+
+				if self.move(filename, self.db['failed']):
+					self.events.record('fail', 
+						**self.getTaskEvent(task=task, rendered=rendered, 
+							workerID=workerID, retry=False))
+					if 'attempts' in task:
+						self.write(task, os.path.join(self.db['failed'], '%s.json' %taskID))
+					self.updateAdaptiveTasks(jobID)
 					return True
 				else:
 					return False
 
 
+	def recordAttempt(self, task, result, resources=None):
+		""" Add the current render attempt to the task's history. Resources
+			used by the render process are also stored with the task, so the
+			most recent values are always at the top level.
+		"""
+		attempt = {
+			'workerID': task.pop('workerID', None), 
+			'startTime': task.get('startTime'), 
+			'endTime': task.get('endTime'), 
+			'result': result, 
+		}
+		if resources:
+			attempt['resources'] = resources
+			task['resources'] = resources
+		task.setdefault('attempts', []).append(attempt)
+
+
+	def getTaskEvent(self, filename=None, task=None, rendered=False, **fields):
+		""" Return a dictionary describing a task for the event log, from
+			the task data or the task's data file. If the task has just
+			finished rendering, the render time and resources are included.
+		"""
+		if task is None:
+			jobID, taskNo = os.path.splitext(os.path.basename(filename))[0].rsplit('_', 1)
+			fields.update(jobID=jobID, taskNo=int(taskNo))
+			return fields
+
+		fields['jobID'] = task['jobID']
+		fields['taskNo'] = task['taskNo']
+		fields['frames'] = task.get('frames')
+		if rendered:
+			fields['duration'] = round(task['endTime'] - task['startTime'], 2)
+			if task.get('resources'):
+				fields['resources'] = task['resources']
+		return fields
+
+
+	def recordWorkerFailure(self, jobID, workerID):
+		""" Count a task failure against the worker for the specified job.
+			Once the worker has failed 'maxWorkerFailures' tasks, add it to
+			the job's blacklist so it no longer picks up tasks from the job.
+			Returns the job data.
+		"""
+		if not self.lockJob(jobID):
+			logger.warning("Unable to lock job %s to record failure of worker %s." %(jobID, workerID))
+			return self.getJob(jobID) or {}
+		try:
+			return self.writeWorkerFailure(jobID, workerID)
+		finally:
+			self.unlockJob(jobID)
+
+
+	def writeWorkerFailure(self, jobID, workerID):
+		""" Count the failure in the job's data file. Called by
+			recordWorkerFailure() with the job's lock held.
+		"""
+		datafile = self.getJobDatafile(jobID)
+		job = self.read(datafile)
+		if not job:
+			return {}
+
+		failures = job.setdefault('workerFailures', {})
+		failures[workerID] = failures.get(workerID, 0) + 1
+
+		max_failures = job.get('maxWorkerFailures', self.getConfig('maxWorkerFailures', 3))
+		blacklist = job.setdefault('blacklist', [])
+		if failures[workerID] >= max_failures and workerID not in blacklist:
+			blacklist.append(workerID)
+			self.events.record('blacklist', jobID=jobID, workerID=workerID, 
+				failures=failures[workerID])
+
+		self.write(job, datafile, atomic=True)
+		return job
+
+
 	def requeueTask(self, jobID, taskNo):
-		""" Requeue the specified task, mark it as 'Queued'.
+		""" Requeue the specified task, mark it as 'Queued'. Tasks which are
+			waiting for dependencies are left waiting.
 		"""
 		taskID = self.getTaskID(jobID, taskNo)
 
 		path = '%s/*/*/%s.json' %(self.db['root'], taskID)
-		for filename in glob.glob(path):
-			if 'queued' not in filename:
+		for filename in self.glob(path):
+			if self.isInFolder(filename, 'waiting'):
+				return False
+			if not self.isInFolder(filename, 'queued'):
 				# task = self.read(filename)
 				# task.pop('startTime', None)
 				# task.pop('endTime', None)
 				# self.write(task, filename)
 
-				if oswrapper.move(filename, self.db['queued']):
-					self.queue_logger.info("Requeued task %s" %taskID)
+				if self.move(filename, self.db['queued']):
+					self.events.record('requeue', jobID=jobID, taskNo=taskNo, 
+						reason='manual')
 					return True
 				else:
 					return False
 
 
+	def requeueTasks(self, tasks):
+		""" Requeue several tasks at once. 'tasks' is a list of (jobID,
+			taskNo) pairs. Tasks which are waiting for dependencies are left
+			waiting, as in requeueJobs(). Returns the number of tasks
+			requeued.
+		"""
+		taskIDs = [self.getTaskID(jobID, taskNo) for jobID, taskNo in tasks]
+		requeued = []
+		for taskID, filename in sorted(self.findTasks(taskIDs=taskIDs).items()):
+			if not self.isInFolder(filename, 'queued', 'waiting'):
+				if self.move(filename, self.db['queued']):
+					requeued.append(self.getTaskEvent(filename, reason='manual'))
+		self.events.recordMany('requeue', requeued)
+
+		return len(requeued)
+
+
+	def completeTasks(self, tasks):
+		""" Mark several tasks as 'Done' at once. 'tasks' is a list of
+			(jobID, taskNo) pairs. Dependent jobs are released once per job
+			rather than once per task. Returns the number of tasks completed.
+		"""
+		taskIDs = [self.getTaskID(jobID, taskNo) for jobID, taskNo in tasks]
+		completed = []
+		frames = {}  # Frames completed, keyed by job ID
+
+		for taskID, filename in sorted(self.findTasks(taskIDs=taskIDs).items()):
+			if os.path.dirname(filename) == self.db['completed']:
+				continue
+			task = self.read(filename)
+			workerID = self.getHolder(filename)
+			if not self.move(filename, self.db['completed']):
+				continue
+
+			# Record end time for tasks that were rendering
+			rendered = 'startTime' in task and 'endTime' not in task
+			if rendered:
+				task['endTime'] = time.time()
+				self.recordAttempt(task, "Done")
+				self.write(task, os.path.join(self.db['completed'], '%s.json' %taskID))
+				self.recordUsage(task)
+			completed.append(self.getTaskEvent(task=task, rendered=rendered, 
+				workerID=workerID))
+
+			jobID = taskID.rsplit('_', 1)[0]
+			task_frames = sequence.numList(task.get('frames', ""), quiet=True)
+			if task_frames is None:
+				frames[jobID] = None  # Unknown frame range, release whole job
+			elif frames.setdefault(jobID, []) is not None:
+				frames[jobID] += task_frames
+
+		self.events.recordMany('complete', completed)
+
+		# Release tasks waiting for these frames
+		for jobID in frames:
+			self.releaseDependents(jobID, frames[jobID])
+			self.updateAdaptiveTasks(jobID)
+
+		return len(completed)
+
+
+	def failTasks(self, tasks):
+		""" Mark several tasks as 'Failed' at once. 'tasks' is a list of
+			(jobID, taskNo) pairs. Unlike failTask(), the tasks are not
+			retried. Returns the number of tasks failed.
+		"""
+		taskIDs = [self.getTaskID(jobID, taskNo) for jobID, taskNo in tasks]
+		failed = []
+
+		for taskID, filename in sorted(self.findTasks(taskIDs=taskIDs).items()):
+			if os.path.dirname(filename) == self.db['failed']:
+				continue
+			task = self.read(filename)
+			workerID = self.getHolder(filename)
+			if not self.move(filename, self.db['failed']):
+				continue
+
+			# Record end time for tasks that were rendering
+			rendered = 'startTime' in task and 'endTime' not in task
+			if rendered:
+				task['endTime'] = time.time()
+				self.recordAttempt(task, "Failed")
+				self.write(task, os.path.join(self.db['failed'], '%s.json' %taskID))
+				self.recordUsage(task)
+			failed.append(self.getTaskEvent(task=task, rendered=rendered, 
+				workerID=workerID, retry=False))
+
+		self.events.recordMany('fail', failed)
+
+		for jobID in set(event['jobID'] for event in failed):
+			self.updateAdaptiveTasks(jobID)
+
+		return len(failed)
+
+
 	# def combineTasks(self, jobID, taskIDs):
 	# 	""" Combine the specified tasks.
 	# 	"""
@@ -503,7 +1960,7 @@ class RenderQueue():
 	###########
 
 	def newWorker(self, **kwargs):
-		""" Create a new worker.
+		""" Create a new worker. Returns the worker ID.
 		"""
 		workerID = uuid.uuid4().hex  # Generate UUID
 		kwargs['id'] = workerID
@@ -538,8 +1995,8 @@ class RenderQueue():
 		oswrapper.createDir(workerdir)
 		datafile = os.path.join(workerdir, 'workerinfo.json')
 		self.write(kwargs, datafile)
-		self.queue_logger.info("Created worker %s (%s)" 
-			%(kwargs['name'], workerID))
+		self.events.record('newWorker', workerID=workerID, name=kwargs['name'])
+		return workerID
 
 
 	def getWorkers(self, onlineOnly=False):
@@ -547,15 +2004,17 @@ class RenderQueue():
 			associated with it and add it to the dictionary.
 		"""
 		workers = []
+		now = self.getTime()
+		timeout = self.getConfig('heartbeatTimeout', 60)
 
 		# Read data from each worker entry
 		path = '%s/*/workerinfo.json' %self.db['workers']
-		for filename in glob.glob(path):
+		for filename in self.glob(path):
 			status = "Idle"
 
 			# Check if the worker has a task
 			workertaskpath = '%s/*_*.json' %os.path.dirname(filename)
-			for datafile in glob.glob(workertaskpath):
+			for datafile in self.glob(workertaskpath):
 				task = self.read(datafile)
 				job = self.getJob(task['jobID'])
 				if job:
@@ -566,14 +2025,9 @@ class RenderQueue():
 			if not worker['enable']:
 				status = "Disabled"
 
-			# Check when remote worker was last online
-			if worker['online']:
-				timeSinceLastOnline = time.time() - worker['online']
-				# Mark as offline if not seen for 60 seconds
-				# DISABLED as system clocks not synced
-				# if timeSinceLastOnline > 60:
-				# 	status = "Offline"
-			else:
+			# Check when worker was last online, mark as offline if it hasn't
+			# checked in within the heartbeat timeout
+			if not worker['online'] or now - self.getModTime(filename) > timeout:
 				status = "Offline"
 
 			worker['status'] = status
@@ -595,13 +2049,92 @@ class RenderQueue():
 
 		# Read data from each worker entry
 		path = '%s/*/workerinfo.json' %self.db['workers']
-		for filename in glob.glob(path):
+		for filename in self.glob(path):
 			worker = self.read(filename)
 			workerNames.append(worker['name'])
 
 		return workerNames
 
 
+	def getIdleWorkerCount(self):
+		""" Return the number of enabled, online workers which are not
+			currently rendering a task.
+		"""
+		count = 0
+		now = self.getTime()
+		timeout = self.getConfig('heartbeatTimeout', 60)
+		for workerID in self.listDir(self.db['workers']):
+			worker = self.getWorker(workerID)
+			if worker.get('enable') and worker.get('online') \
+			and self.getHeartbeatAge(workerID, now) <= timeout:
+				path = '%s/*_*.json' %os.path.join(self.db['workers'], workerID)
+				if not self.glob(path):
+					count += 1
+		return count
+
+
+	def getHeartbeatAge(self, workerID, now=None):
+		""" Return the number of seconds since the specified worker last
+			checked in. The worker's data file is rewritten each time it
+			checks in, so its modification time is used as the heartbeat.
+		"""
+		if now is None:
+			now = self.getTime()
+		try:
+			return now - self.getModTime(self.getWorkerDatafile(workerID))
+		except OSError:
+			return float('inf')
+
+
+	def reapOrphanedTasks(self, timeout=None):
+		""" Requeue tasks held by workers which have stopped checking in,
+			e.g. because the machine crashed mid-render. Workers are
+			considered dead if their heartbeat is older than 'timeout'
+			seconds (default: the 'heartbeatTimeout' config setting).
+			Only one client reaps at a time. The reaper lock is held as a
+			lease which the holder renews each time it runs, and is taken
+			over by another client if the holder stops renewing it.
+			Returns a list of the IDs of requeued tasks, or None if another
+			client holds the lease.
+		"""
+		if timeout is None:
+			timeout = self.getConfig('heartbeatTimeout', 60)
+		if not self.acquireLock('reaper', timeout=timeout, renew=True):
+			return None
+
+		requeued = []
+		now = self.getTime()
+		for workerID in self.listDir(self.db['workers']):
+			if self.getHeartbeatAge(workerID, now) <= timeout:
+				continue
+
+			path = '%s/*_*.json' %os.path.join(self.db['workers'], workerID)
+			for filename in self.glob(path):
+				# Take the task away from the worker before updating it, so
+				# a late completion or failure from the worker is refused
+				# rather than overwritten. The task isn't dequeued again
+				# until the attempt has been recorded.
+				queuedfile = os.path.join(self.db['queued'], os.path.basename(filename))
+				tmpfile = '%s.reap' %queuedfile
+				try:
+					self.rename(filename, tmpfile)
+				except OSError:
+					continue
+				task = self.read(tmpfile)
+				if not task:
+					self.rename(tmpfile, filename)
+					continue
+				task['endTime'] = time.time()
+				self.recordAttempt(task, "Orphaned")
+				self.write(task, tmpfile)
+				self.rename(tmpfile, queuedfile)
+				requeued.append(self.getTaskEvent(task=task, rendered=True, 
+					workerID=workerID, reason='orphaned'))
+		self.events.recordMany('requeue', requeued)
+
+		return [self.getTaskID(event['jobID'], event['taskNo']) for event in requeued]
+
+
 	def getWorkerDatafile(self, workerID):
 		""" Return the path to the specified worker's JSON data file.
 		"""
@@ -619,11 +2152,11 @@ class RenderQueue():
 		"""
 		path = os.path.join(self.db['workers'], workerID)
 
-		if oswrapper.remove(path)[0]:
-			self.queue_logger.info("Deleted worker %s" %workerID)
+		if self.remove(path)[0]:
+			self.events.record('deleteWorker', workerID=workerID)
 			return True
 		else:
-			self.queue_logger.warning("Failed to delete worker %s" %workerID)
+			logger.warning("Failed to delete worker %s" %workerID)
 			return False
 
 
@@ -635,8 +2168,7 @@ class RenderQueue():
 		if worker['enable'] == False:
 			worker['enable'] = True
 			self.write(worker, datafile)
-			self.queue_logger.info("Enabled worker %s (%s)" 
-				%(worker['name'], workerID))
+			self.events.record('enableWorker', workerID=workerID)
 
 
 	def disableWorker(self, workerID):
@@ -647,8 +2179,7 @@ class RenderQueue():
 		if worker['enable'] == True:
 			worker['enable'] = False
 			self.write(worker, datafile)
-			self.queue_logger.info("Disabled worker %s (%s)" 
-				%(worker['name'], workerID))
+			self.events.record('disableWorker', workerID=workerID)
 
 
 	def checkinWorker(self, workerID, hostname):
@@ -658,8 +2189,25 @@ class RenderQueue():
 		worker = self.read(datafile)
 		worker['online'] = time.time() #time.strftime(self.time_format)
 		self.write(worker, datafile)
-		# self.queue_logger.info("Worker %s (%s) checked in from host %s" 
-		# 	%(worker['name'], workerID, hostname))
+
+		# Record a heartbeat event at most every 'heartbeatEventInterval'
+		# seconds, as workers check in far more often than that
+		now = time.time()
+		interval = self.getConfig('heartbeatEventInterval', 60)
+		if now - self.heartbeats.get(workerID, 0) >= interval:
+			self.heartbeats[workerID] = now
+			self.events.record('heartbeat', workerID=workerID, hostname=hostname)
+
+
+	def heartbeatWorker(self, workerID):
+		""" Refresh the worker's heartbeat by touching its data file, without
+			reading or rewriting it, so it's cheap to call frequently and safe
+			to call from the render thread while the worker checks in.
+		"""
+		try:
+			self.timeIO('utime', os.utime, self.getWorkerDatafile(workerID), None)
+		except OSError:
+			pass
 
 
 	def checkoutWorker(self, workerID, hostname):
@@ -669,8 +2217,8 @@ class RenderQueue():
 		worker = self.read(datafile)
 		worker['online'] = False
 		self.write(worker, datafile)
-		# self.queue_logger.info("Worker %s (%s) checked out from host %s" 
-		# 	%(worker['name'], workerID, hostname))
+		self.heartbeats.pop(workerID, None)
+		self.events.record('checkout', workerID=workerID, hostname=hostname)
 
 
 	# def getWorkerStatus(self, workerID):
@@ -0,0 +1,147 @@
+#!/usr/bin/python
+
+# events.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2019
+#
+# Render Queue Event Log
+# An append-only record of everything that happens to jobs, tasks and
+# workers, stored as newline-delimited JSON, e.g.
+#   {"event": "dequeue", "host": "node01", "jobID": "...", "taskNo": 3,
+#    "time": 1546300800.0, "workerID": "..."}
+# Each host appends to its own shard (<hostname>.jsonl), so clients never
+# contend for the same file over a network file system. readEvents() merges
+# the shards back into a single stream ordered by time.
+#
+# Events:
+#   submit, createTasks, split - jobs and tasks created
+#   dequeue, complete, fail, requeue, release - task status changes
+#   deleteJob, archiveJob, deleteTasks, deleteLogs, priority, config
+#   newWorker, deleteWorker, enableWorker, disableWorker, blacklist,
+#   heartbeat, checkout - worker status changes
+
+
+import glob
+import heapq
+import json
+import os
+import socket
+import time
+
+
+class EventLog(object):
+	""" Class to append events to this host's shard of the event log.
+	"""
+	def __init__(self, location, host=None):
+		self.location = location
+		self.host = host or socket.gethostname()
+		self.path = os.path.join(location, '%s.jsonl' %self.host)
+
+
+	def record(self, event, **fields):
+		""" Append a single event.
+		"""
+		self.recordMany(event, [fields])
+
+
+	def recordMany(self, event, items):
+		""" Append an event for each dictionary of fields in 'items' with a
+			single write.
+		"""
+		now = time.time()
+		lines = []
+		for fields in items:
+			entry = dict(fields, event=event, host=self.host, time=now)
+			lines.append(json.dumps(entry, sort_keys=True) + "\n")
+		if not lines:
+			return
+
+		# Lines are written with a single append so concurrent writers on
+		# this host can't interleave partial lines
+		try:
+			fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+			try:
+				os.write(fd, "".join(lines).encode('utf-8'))
+			finally:
+				os.close(fd)
+		except OSError as e:
+			print("Warning: Unable to write to event log: %s" %e)
+
+
+def readShard(path, index=0, events=None):
+	""" Read the events in a single shard. Yields tuples of (time, index,
+		line number, event) so shards can be merged without comparing the
+		events themselves. Lines which can't be parsed, e.g. a line being
+		written at the time, are skipped.
+		If a list of event names is given, other lines are skipped without
+		being parsed, which is much quicker than filtering afterwards.
+	"""
+	token = '"event": "'
+	decode = json.JSONDecoder().decode
+	with open(path) as f:
+		for lineno, line in enumerate(f):
+			if events:
+				i = line.find(token) + len(token)
+				if line[i:line.find('"', i)] not in events:
+					continue
+			try:
+				entry = decode(line)
+				yield entry['time'], index, lineno, entry
+			except (ValueError, KeyError, TypeError):
+				continue
+
+
+def tailShard(path, offset=0):
+	""" Read the events appended to a shard since 'offset' bytes into the
+		file. Returns a list of events and the offset to continue reading
+		from next time. A partly written line at the end of the file is left
+		to be read next time. If the file has been truncated, it is read
+		from the beginning.
+	"""
+	entries = []
+	try:
+		if os.path.getsize(path) < offset:
+			offset = 0
+		with open(path, 'rb') as f:
+			f.seek(offset)
+			data = f.read()
+	except (IOError, OSError):
+		return entries, offset
+
+	end = data.rfind(b"\n") + 1
+	for line in data[:end].splitlines():
+		try:
+			entries.append(json.loads(line.decode('utf-8')))
+		except (ValueError, UnicodeDecodeError):
+			continue
+	return entries, offset + end
+
+
+def readEvents(location, start=None, end=None, events=None, hosts=None):
+	""" Read the event log at 'location', merging the shards from all hosts
+		and yielding events in time order. Shards are streamed rather than
+		read into memory. Optionally filter by time range, a list of event
+		names and a list of hosts.
+		Events are only approximately in order, as concurrent writers on a
+		host may append them slightly out of order, so the whole log is
+		read even if an end time is given.
+	"""
+	if events:
+		events = set(events)
+
+	shards = []
+	for i, path in enumerate(sorted(glob.glob(os.path.join(location, '*.jsonl')))):
+		host = os.path.splitext(os.path.basename(path))[0]
+		if hosts and host not in hosts:
+			continue
+		shards.append(readShard(path, i, events))
+
+	for timestamp, index, lineno, entry in heapq.merge(*shards):
+		if start is not None and timestamp < start:
+			continue
+		if end is not None and timestamp >= end:
+			continue
+		if events and entry.get('event') not in events:
+			continue
+		yield entry
@@ -0,0 +1,526 @@
+#!/usr/bin/python
+
+# exporter.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2019
+#
+# Render Queue Metrics Exporter
+# Serves the state of the render farm in the Prometheus text format, e.g.
+#   python exporter.py /path/to/database --port 9731
+#   curl http://localhost:9731/metrics
+# The database is scanned once on startup. After that the state is kept up
+# to date by reading new entries from the event log, so each scrape only
+# reads what has been appended since the last one, however large the
+# database is.
+
+
+import argparse
+import glob
+import os
+import sys
+import threading
+import time
+
+try:
+	from http.server import BaseHTTPRequestHandler, HTTPServer
+	from socketserver import ThreadingMixIn
+except ImportError:
+	from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer  # Python 2.x
+	from SocketServer import ThreadingMixIn
+
+# Import custom modules
+import database
+import events
+
+
+# ----------------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------------
+
+DEFAULT_PORT = 9731
+
+TASK_STATES = ['waiting', 'queued', 'rendering', 'completed', 'failed']
+
+WORKER_STATES = ['idle', 'rendering', 'disabled', 'offline']
+
+# Histogram bucket upper bounds, in seconds
+DISPATCH_BUCKETS = [1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200, 14400, 43200, 86400]
+DURATION_BUCKETS = [10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 14400, 28800, 86400]
+
+
+class Histogram(object):
+	""" Class to hold a Prometheus-style histogram.
+	"""
+	def __init__(self, buckets):
+		self.buckets = buckets
+		self.counts = [0] * (len(buckets)+1)
+		self.sum = 0.0
+		self.count = 0
+
+
+	def observe(self, value):
+		""" Add a value to the histogram.
+		"""
+		for i, bound in enumerate(self.buckets):
+			if value <= bound:
+				break
+		else:
+			i = len(self.buckets)
+		self.counts[i] += 1
+		self.sum += value
+		self.count += 1
+
+
+	def getLines(self, name, labels=""):
+		""" Return the histogram in the Prometheus text format.
+		"""
+		prefix = labels + "," if labels else ""
+		suffix = "{%s}" %labels if labels else ""
+		lines = []
+		running = 0
+		for bound, n in zip([str(b) for b in self.buckets] + ['+Inf'], self.counts):
+			running += n
+			lines.append('%s_bucket{%sle="%s"} %d' %(name, prefix, bound, running))
+		lines.append('%s_sum%s %f' %(name, suffix, self.sum))
+		lines.append('%s_count%s %d' %(name, suffix, self.count))
+		return lines
+
+
+# ----------------------------------------------------------------------------
+# Begin farm state class
+# ----------------------------------------------------------------------------
+
+class FarmState(object):
+	""" Class to hold the state of the render farm in memory: the state of
+		every task, queue depth by priority and pool, and the status of each
+		worker. Counters are updated as each event is applied, so producing
+		the metrics doesn't depend on the size of the database.
+	"""
+	def __init__(self, location):
+		self.rq = database.RenderQueue(location)
+		self.lock = threading.Lock()
+
+		self.offsets = {}  # Bytes read from each event log shard
+		self.jobs = {}  # {jobID: {'priority', 'pool', 'dependencies'}}
+		self.tasks = {}  # {jobID: {taskNo: [state, workerID, queued time]}}
+		self.taskCounts = dict((state, 0) for state in TASK_STATES)
+		self.queueDepth = {}  # Queued tasks keyed by (priority, pool)
+		self.workers = {}  # {workerID: {'enabled', 'online', 'lastSeen', 'task'}}
+		self.eventCounts = {}
+		self.dispatchLatency = Histogram(DISPATCH_BUCKETS)
+		self.taskDuration = {
+			'complete': Histogram(DURATION_BUCKETS),
+			'fail': Histogram(DURATION_BUCKETS)}
+		self.updateTime = 0
+
+		self.heartbeatTimeout = self.rq.getConfig('heartbeatTimeout', 60)
+		self.heartbeatInterval = self.rq.getConfig('heartbeatEventInterval', 60)
+
+		self.scan()
+
+
+	def scan(self):
+		""" Build the initial state by scanning the database. The end of each
+			event log shard is noted first, so no events are missed. Any
+			events recorded during the scan are applied again afterwards,
+			which is harmless as events set the state of tasks rather than
+			adjusting counts.
+		"""
+		for path in glob.glob(os.path.join(self.rq.db['events'], '*.jsonl')):
+			self.offsets[path] = os.path.getsize(path)
+
+		for filename in glob.glob(os.path.join(self.rq.db['jobs'], '*.json')):
+			job = self.rq.read(filename)
+			if 'jobID' in job:
+				self.addJob(job)
+
+		for state, folder in [
+			('queued', 'queued'), ('waiting', 'waiting'),
+			('completed', 'completed'), ('failed', 'failed')]:
+			for name in os.listdir(self.rq.db[folder]):
+				self.setTaskState(name, state)
+
+		for workerID in os.listdir(self.rq.db['workers']):
+			self.addWorker(workerID)
+			for name in os.listdir(os.path.join(self.rq.db['workers'], workerID)):
+				if name != 'workerinfo.json':
+					self.setTaskState(name, 'rendering', workerID)
+
+
+	def parseTaskID(self, name):
+		""" Return the job ID and task number from a task file name, or None
+			if it isn't a task.
+		"""
+		taskID, ext = os.path.splitext(name)
+		try:
+			jobID, taskNo = taskID.rsplit('_', 1)
+			if ext == '.json':
+				return jobID, int(taskNo)
+		except ValueError:
+			pass
+		return None
+
+
+	def addJob(self, job):
+		""" Add a job to the state.
+		"""
+		pool = job.get('pool')
+		if pool in [None, "None"]:
+			pool = ""
+		self.jobs[job['jobID']] = {
+			'priority': job.get('priority'),
+			'pool': pool,
+			'dependencies': job.get('dependencies'),
+		}
+
+
+	def addWorker(self, workerID):
+		""" Add a worker to the state from its data file.
+		"""
+		datafile = self.rq.getWorkerDatafile(workerID)
+		worker = self.rq.read(datafile)
+		if not worker:
+			return
+		try:
+			lastSeen = os.path.getmtime(datafile)
+		except OSError:
+			lastSeen = 0
+		self.workers[workerID] = {
+			'enabled': worker.get('enable', False),
+			'online': bool(worker.get('online')),
+			'lastSeen': lastSeen,
+			'task': None,
+		}
+
+
+	def setTaskState(self, name, state, workerID=None, timestamp=None, jobID=None, taskNo=None):
+		""" Set the state of a task, given its file name or job ID and task
+			number, updating the counters.
+		"""
+		if jobID is None:
+			parsed = self.parseTaskID(name)
+			if parsed is None:
+				return
+			jobID, taskNo = parsed
+
+		tasks = self.tasks.setdefault(jobID, {})
+		task = tasks.get(taskNo)
+		if task is None:
+			task = tasks[taskNo] = [None, None, None]
+		else:
+			self.countTask(jobID, task, -1)
+			self.releaseWorker(task)
+
+		task[0] = state
+		task[1] = workerID
+		task[2] = timestamp if state == 'queued' else None
+		self.countTask(jobID, task, 1)
+		if workerID in self.workers:
+			self.workers[workerID]['task'] = (jobID, taskNo)
+
+
+	def removeJob(self, jobID):
+		""" Remove a job and all its tasks from the state.
+		"""
+		for task in self.tasks.pop(jobID, {}).values():
+			self.countTask(jobID, task, -1)
+			self.releaseWorker(task)
+		self.jobs.pop(jobID, None)
+
+
+	def countTask(self, jobID, task, n):
+		""" Add 'n' to the counters for the task's state.
+		"""
+		self.taskCounts[task[0]] += n
+		if task[0] == 'queued':
+			key = self.getQueueKey(jobID)
+			self.queueDepth[key] = self.queueDepth.get(key, 0) + n
+
+
+	def getQueueKey(self, jobID):
+		""" Return the key the job's queued tasks are counted under.
+		"""
+		job = self.jobs.get(jobID, {})
+		return job.get('priority'), job.get('pool', "")
+
+
+	def releaseWorker(self, task):
+		""" Clear the current task of the worker rendering the task.
+		"""
+		worker = self.workers.get(task[1])
+		if worker is not None:
+			worker['task'] = None
+
+
+	def getTask(self, event):
+		""" Return the task an event refers to, or None if it's unknown.
+		"""
+		return self.tasks.get(event.get('jobID'), {}).get(event.get('taskNo'))
+
+
+	def update(self):
+		""" Apply events appended to the event log since the last update.
+		"""
+		start = time.time()
+		new_events = []
+		for path in glob.glob(os.path.join(self.rq.db['events'], '*.jsonl')):
+			entries, self.offsets[path] = events.tailShard(path, self.offsets.get(path, 0))
+			new_events += entries
+		new_events.sort(key=lambda event: event.get('time', 0))
+
+		for event in new_events:
+			try:
+				self.apply(event)
+			except (KeyError, TypeError, ValueError) as e:
+				print("Warning: Unable to apply event %s: %s" %(event.get('event'), e))
+		self.updateTime = time.time() - start
+
+
+	def apply(self, event):
+		""" Update the state with a single event.
+		"""
+		name = event['event']
+		timestamp = event['time']
+		jobID = event.get('jobID')
+		self.eventCounts[name] = self.eventCounts.get(name, 0) + 1
+
+		if name == 'submit':
+			job = self.rq.getJob(jobID) or {'jobID': jobID, 'priority': event.get('priority')}
+			self.addJob(job)
+			self.addTasks(jobID, 0, event.get('tasks', 0), timestamp, event.get('waiting'))
+
+		elif name == 'createTasks':
+			self.addTasks(jobID, event['firstTaskNo'], event['tasks'], timestamp)
+
+		elif name == 'split':
+			self.addTasks(jobID, event['firstTaskNo'], event['tasks'], timestamp, waiting=0)
+
+		elif name == 'dequeue':
+			task = self.getTask(event)
+			if task is not None and task[0] == 'queued' and task[2] is not None:
+				self.dispatchLatency.observe(max(0, timestamp - task[2]))
+			self.setTaskState(None, 'rendering', event.get('workerID'),
+				jobID=jobID, taskNo=event['taskNo'])
+
+		elif name == 'complete':
+			self.setTaskState(None, 'completed', jobID=jobID, taskNo=event['taskNo'])
+			if event.get('duration') is not None:
+				self.taskDuration['complete'].observe(event['duration'])
+
+		elif name == 'fail':
+			if event.get('retry'):
+				self.setTaskState(None, 'queued', timestamp=max(timestamp, event.get('notBefore', 0)),
+					jobID=jobID, taskNo=event['taskNo'])
+			else:
+				self.setTaskState(None, 'failed', jobID=jobID, taskNo=event['taskNo'])
+			if event.get('duration') is not None:
+				self.taskDuration['fail'].observe(event['duration'])
+
+		elif name == 'requeue' or name == 'release':
+			self.setTaskState(None, 'queued', timestamp=timestamp,
+				jobID=jobID, taskNo=event['taskNo'])
+
+		elif name in ['deleteJob', 'archiveJob', 'deleteTasks']:
+			self.removeJob(jobID)
+
+		elif name == 'priority':
+			# Move the job's queued tasks to the new priority
+			queued = [task for task in self.tasks.get(jobID, {}).values() if task[0] == 'queued']
+			for task in queued:
+				self.countTask(jobID, task, -1)
+			self.jobs.setdefault(jobID, {})['priority'] = event['priority']
+			for task in queued:
+				self.countTask(jobID, task, 1)
+
+		elif name == 'config':
+			if event.get('key') == 'heartbeatTimeout':
+				self.heartbeatTimeout = event['value']
+			elif event.get('key') == 'heartbeatEventInterval':
+				self.heartbeatInterval = event['value']
+
+		elif name == 'newWorker':
+			self.addWorker(event['workerID'])
+
+		elif name == 'deleteWorker':
+			self.workers.pop(event['workerID'], None)
+
+		elif name in ['enableWorker', 'disableWorker', 'heartbeat', 'checkout']:
+			worker = self.workers.get(event['workerID'])
+			if worker is None:
+				self.addWorker(event['workerID'])
+				worker = self.workers.get(event['workerID'])
+			if worker is None:
+				return
+			if name == 'heartbeat':
+				worker['online'] = True
+				worker['lastSeen'] = timestamp
+			elif name == 'checkout':
+				worker['online'] = False
+			else:
+				worker['enabled'] = (name == 'enableWorker')
+
+
+	def addTasks(self, jobID, first, count, timestamp, waiting=None):
+		""" Add new tasks to the state. The tasks are queued unless they are
+			waiting for dependencies, in which case the waiting folder is
+			checked to see which are waiting.
+		"""
+		if waiting is None:
+			waiting = count if self.jobs.get(jobID, {}).get('dependencies') else 0
+		waitingTasks = set()
+		if waiting:
+			path = os.path.join(self.rq.db['waiting'], '%s_*.json' %jobID)
+			for filename in glob.glob(path):
+				waitingTasks.add(self.parseTaskID(os.path.basename(filename))[1])
+
+		for taskNo in range(first, first+count):
+			if taskNo in waitingTasks:
+				self.setTaskState(None, 'waiting', jobID=jobID, taskNo=taskNo)
+			else:
+				self.setTaskState(None, 'queued', timestamp=timestamp, jobID=jobID, taskNo=taskNo)
+
+
+	def getWorkerStatus(self, worker, now):
+		""" Return the status of a worker, as shown in the UI.
+		"""
+		# Heartbeat events are only recorded every 'heartbeatEventInterval'
+		# seconds, so allow for that on top of the heartbeat timeout
+		timeout = self.heartbeatTimeout + self.heartbeatInterval
+		if not worker['online'] or now - worker['lastSeen'] > timeout:
+			return 'offline'
+		if not worker['enabled']:
+			return 'disabled'
+		if worker['task']:
+			return 'rendering'
+		return 'idle'
+
+
+	def getMetrics(self):
+		""" Update the state and return the metrics in the Prometheus text
+			format.
+		"""
+		with self.lock:
+			self.update()
+			now = time.time()
+
+			lines = [
+				"# HELP renderqueue_tasks Tasks in each state.",
+				"# TYPE renderqueue_tasks gauge"]
+			for state in TASK_STATES:
+				lines.append('renderqueue_tasks{state="%s"} %d' %(state, self.taskCounts[state]))
+
+			lines += [
+				"# HELP renderqueue_queue_depth Tasks queued for rendering, by job priority and pool.",
+				"# TYPE renderqueue_queue_depth gauge"]
+			for (priority, pool), count in sorted(self.queueDepth.items(), key=str):
+				if count:
+					lines.append('renderqueue_queue_depth{priority="%s",pool="%s"} %d' %(
+						priority, pool, count))
+
+			lines += [
+				"# HELP renderqueue_jobs Jobs in the database.",
+				"# TYPE renderqueue_jobs gauge",
+				"renderqueue_jobs %d" %len(self.jobs)]
+
+			worker_counts = dict((status, 0) for status in WORKER_STATES)
+			for worker in self.workers.values():
+				worker_counts[self.getWorkerStatus(worker, now)] += 1
+			lines += [
+				"# HELP renderqueue_workers Workers with each status.",
+				"# TYPE renderqueue_workers gauge"]
+			for status in WORKER_STATES:
+				lines.append('renderqueue_workers{status="%s"} %d' %(status, worker_counts[status]))
+
+			lines += [
+				"# HELP renderqueue_dispatch_latency_seconds Time tasks spent queued before being dequeued.",
+				"# TYPE renderqueue_dispatch_latency_seconds histogram"]
+			lines += self.dispatchLatency.getLines('renderqueue_dispatch_latency_seconds')
+
+			lines += [
+				"# HELP renderqueue_task_duration_seconds Render time of finished tasks.",
+				"# TYPE renderqueue_task_duration_seconds histogram"]
+			for result in sorted(self.taskDuration):
+				lines += self.taskDuration[result].getLines(
+					'renderqueue_task_duration_seconds', 'result="%s"' %result)
+
+			lines += [
+				"# HELP renderqueue_events_total Events read from the event log.",
+				"# TYPE renderqueue_events_total counter"]
+			for name in sorted(self.eventCounts):
+				lines.append('renderqueue_events_total{event="%s"} %d' %(name, self.eventCounts[name]))
+
+			lines += [
+				"# HELP renderqueue_exporter_update_seconds Time taken to apply new events on the last scrape.",
+				"# TYPE renderqueue_exporter_update_seconds gauge",
+				"renderqueue_exporter_update_seconds %f" %self.updateTime]
+
+		return "\n".join(lines) + "\n"
+
+# ----------------------------------------------------------------------------
+# End farm state class
+# ============================================================================
+# Begin server classes
+# ----------------------------------------------------------------------------
+
+class MetricsHandler(BaseHTTPRequestHandler):
+	""" Serve the metrics at /metrics.
+	"""
+	def do_GET(self):
+		if self.path.split('?')[0] not in ['/', '/metrics']:
+			self.send_error(404)
+			return
+
+		body = self.server.state.getMetrics().encode('utf-8')
+		self.send_response(200)
+		self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+
+	def log_message(self, format, *args):
+		pass  # Don't log every scrape
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+	allow_reuse_address = True
+	daemon_threads = True
+
+# ----------------------------------------------------------------------------
+# End server classes
+# ============================================================================
+# Run as standalone app
+# ----------------------------------------------------------------------------
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Render Queue Metrics Exporter")
+	parser.add_argument('database',
+		help="path to the render queue database")
+	parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT,
+		help="port to serve metrics on (default: %(default)s)")
+	parser.add_argument('-b', '--bind', default='',
+		help="address to bind to (default: all interfaces)")
+	parser.add_argument('-o', '--output',
+		help="write the metrics to a file once and exit instead of serving them, e.g. for the node_exporter textfile collector")
+	args = parser.parse_args()
+
+	state = FarmState(args.database)
+
+	if args.output:
+		tmpfile = '%s.%d.tmp' %(args.output, os.getpid())
+		with open(tmpfile, 'w') as f:
+			f.write(state.getMetrics())
+		os.rename(tmpfile, args.output)  # Replaces existing file (POSIX only)
+		sys.exit(0)
+
+	server = ThreadingHTTPServer((args.bind, args.port), MetricsHandler)
+	server.state = state
+	print("Serving render queue metrics on port %d" %args.port)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+	sys.exit(0)
@@ -0,0 +1,156 @@
+#!/usr/bin/python
+
+# iostats.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2019
+#
+# Database I/O Instrumentation
+# Counts file system operations made by the database and records their
+# latency, broken down by the RenderQueue method they were made on behalf
+# of, e.g. the number of reads done by getTasks(). Statistics can be
+# retrieved as a dictionary, or written to a JSON file or a Prometheus text
+# file (for the node_exporter textfile collector).
+# Instrumentation is disabled by default, or enabled by setting the
+# RQ_IO_STATS environment variable to the path of a file to write the
+# statistics to on exit (.json or .prom).
+
+
+import inspect
+import json
+import os
+import sys
+import threading
+
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]
+
+
+class IOStats(object):
+	""" Class to hold counters and latency histograms for database I/O,
+		keyed by method and operation.
+		Operations are attributed to the outermost method of the 'owner'
+		class on the call stack, i.e. the method called by the UI or worker,
+		rather than internal helpers such as read().
+	"""
+	def __init__(self, owner, enabled=False):
+		self.enabled = enabled
+		self.lock = threading.Lock()
+		self.codes = set()
+		for cls in inspect.getmro(owner):
+			for attr in vars(cls).values():
+				code = getattr(attr, '__code__', None)
+				if code is not None:
+					self.codes.add(code)
+		self.reset()
+
+
+	def reset(self):
+		""" Clear all statistics.
+		"""
+		with self.lock:
+			self.stats = {}  # {(method, op): [count, total seconds, buckets]}
+
+
+	def getMethod(self):
+		""" Return the name of the outermost method of the owner class on the
+			call stack.
+		"""
+		method = None
+		frame = sys._getframe(2)
+		while frame is not None:
+			if frame.f_code in self.codes:
+				method = frame.f_code.co_name
+			frame = frame.f_back
+		return method or "unknown"
+
+
+	def record(self, op, seconds, method=None):
+		""" Record an operation which took 'seconds' to complete.
+		"""
+		if method is None:
+			method = self.getMethod()
+		with self.lock:
+			try:
+				entry = self.stats[(method, op)]
+			except KeyError:
+				entry = self.stats[(method, op)] = [0, 0.0, [0] * (len(BUCKETS)+1)]
+			entry[0] += 1
+			entry[1] += seconds
+			for i, bound in enumerate(BUCKETS):
+				if seconds <= bound:
+					break
+			else:
+				i = len(BUCKETS)
+			entry[2][i] += 1
+
+
+	def getStats(self):
+		""" Return the statistics as a dictionary of the form
+			{method: {op: {'count': n, 'seconds': t, 'buckets': {le: n}}}}
+			where bucket counts are cumulative, as in Prometheus.
+		"""
+		stats = {}
+		with self.lock:
+			items = [(key, list(entry)) for key, entry in self.stats.items()]
+		for (method, op), (count, seconds, buckets) in items:
+			cumulative = {}
+			running = 0
+			for bound, n in zip([str(b) for b in BUCKETS] + ['+Inf'], buckets):
+				running += n
+				cumulative[bound] = running
+			stats.setdefault(method, {})[op] = {
+				'count': count,
+				'seconds': seconds,
+				'buckets': cumulative,
+			}
+		return stats
+
+
+	def toPrometheus(self):
+		""" Return the statistics in the Prometheus text exposition format.
+		"""
+		lines = [
+			"# HELP renderqueue_db_io_operations_total Database file system operations.",
+			"# TYPE renderqueue_db_io_operations_total counter"]
+		stats = self.getStats()
+		for method in sorted(stats):
+			for op in sorted(stats[method]):
+				lines.append('renderqueue_db_io_operations_total{method="%s",op="%s"} %d' %(
+					method, op, stats[method][op]['count']))
+
+		lines += [
+			"# HELP renderqueue_db_io_seconds Latency of database file system operations.",
+			"# TYPE renderqueue_db_io_seconds histogram"]
+		for method in sorted(stats):
+			for op in sorted(stats[method]):
+				entry = stats[method][op]
+				labels = 'method="%s",op="%s"' %(method, op)
+				for bound in [str(b) for b in BUCKETS] + ['+Inf']:
+					lines.append('renderqueue_db_io_seconds_bucket{%s,le="%s"} %d' %(
+						labels, bound, entry['buckets'][bound]))
+				lines.append('renderqueue_db_io_seconds_sum{%s} %f' %(labels, entry['seconds']))
+				lines.append('renderqueue_db_io_seconds_count{%s} %d' %(labels, entry['count']))
+
+		return "\n".join(lines) + "\n"
+
+
+	def dump(self, path):
+		""" Write the statistics to a file. The format is Prometheus text if
+			the file extension is '.prom', otherwise JSON. The file is
+			replaced atomically so collectors never read a partial file.
+		"""
+		if os.path.splitext(path)[1] == '.prom':
+			text = self.toPrometheus()
+		else:
+			text = json.dumps(self.getStats(), indent=4, sort_keys=True)
+		tmpfile = '%s.%d.tmp' %(path, os.getpid())
+		try:
+			with open(tmpfile, 'w') as f:
+				f.write(text)
+			os.rename(tmpfile, path)  # Replaces existing file (POSIX only)
+			return True
+		except (IOError, OSError) as e:
+			print("Warning: Unable to write I/O statistics: %s" %e)
+			return False
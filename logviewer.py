@@ -0,0 +1,128 @@
+#!/usr/bin/python
+
+# logviewer.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2019
+#
+# Task log viewer dialog.
+# Shows the end of a task's log and follows new output while the task is
+# rendering. Only the end of the log is read, so large logs open instantly.
+# If workers buffer logs on local disk, the output of a rendering task is
+# fetched from the worker, falling back to the shared log.
+
+
+import os
+from Qt import QtCore, QtGui, QtWidgets
+
+# Import custom modules
+import tasklog
+
+
+class LogViewerDialog(QtWidgets.QDialog):
+	""" Main dialog class.
+	"""
+	def __init__(self, rq, jobID, taskNo, interval=1000, maxLines=20000, parent=None):
+		super(LogViewerDialog, self).__init__(parent)
+		self.rq = rq
+		self.jobID = jobID
+		self.taskNo = taskNo
+		self.offset = None
+		self.host = self.getWorkerHost()
+		self.port = rq.getConfig('taskLogPort', tasklog.DEFAULT_PORT)
+
+		# Setup window and UI widgets
+		self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+		self.setWindowTitle("Task Log: %s" %rq.getTaskID(jobID, taskNo))
+		self.resize(800, 480)
+
+		self.log_textEdit = QtWidgets.QPlainTextEdit(self)
+		self.log_textEdit.setReadOnly(True)
+		self.log_textEdit.setLineWrapMode(QtWidgets.QPlainTextEdit.NoWrap)
+		self.log_textEdit.setMaximumBlockCount(maxLines)  # Limit memory used
+		font = QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont)
+		self.log_textEdit.setFont(font)
+
+		self.status_label = QtWidgets.QLabel(self)
+
+		layout = QtWidgets.QVBoxLayout(self)
+		layout.addWidget(self.log_textEdit)
+		layout.addWidget(self.status_label)
+
+		# Poll for new output
+		self.timer = QtCore.QTimer(self)
+		self.timer.setInterval(interval)
+		self.timer.timeout.connect(self.follow)
+
+		self.load()
+
+
+	def getWorkerHost(self):
+		""" Return the address of the worker rendering the task, if workers
+			buffer logs locally, otherwise None.
+		"""
+		if not self.rq.getConfig('taskLogLocal', False):
+			return None
+		taskID = self.rq.getTaskID(self.jobID, self.taskNo)
+		datafile = self.rq.findTasks(taskIDs=[taskID]).get(taskID)
+		if datafile is None:
+			return None
+		workerdir = os.path.dirname(datafile)
+		if os.path.dirname(workerdir) != self.rq.db['workers']:
+			return None  # Not rendering
+		worker = self.rq.getWorker(os.path.basename(workerdir))
+		return worker.get('ip_address') if worker else None
+
+
+	def getLog(self, offset=None):
+		""" Return the end of the log or the lines written since 'offset',
+			from the worker if possible, otherwise from the shared log. Both
+			logs share the same offsets.
+		"""
+		if self.host:
+			result = tasklog.fetchLog(self.host, 
+				self.rq.getTaskID(self.jobID, self.taskNo), offset, port=self.port)
+			if result is not None and result['offset'] is not None:
+				return result
+			self.host = None  # Task finished or worker unreachable
+		return self.rq.tailTaskLog(self.jobID, self.taskNo, offset=offset)
+
+
+	def load(self):
+		""" Load the end of the log and start following it if the task is
+			still writing to it.
+		"""
+		result = self.getLog()
+		if result is None:
+			self.status_label.setText("No log found.")
+			return
+
+		self.log_textEdit.setPlainText(result['text'])
+		self.log_textEdit.moveCursor(QtGui.QTextCursor.End)
+		self.offset = result['offset']
+		if self.offset is None:
+			self.status_label.setText("Log closed.")
+		else:
+			self.status_label.setText("Following log...")
+			self.timer.start()
+
+
+	def follow(self):
+		""" Append any new lines to the log view, scrolling to show them if
+			the view was already scrolled to the end.
+		"""
+		result = self.getLog(self.offset)
+		if result is None or result['offset'] is None:
+			self.timer.stop()
+			self.status_label.setText("Log closed.")
+			return
+
+		self.offset = result['offset']
+		if result['text']:
+			scrollbar = self.log_textEdit.verticalScrollBar()
+			at_end = scrollbar.value() == scrollbar.maximum()
+			cursor = QtGui.QTextCursor(self.log_textEdit.document())
+			cursor.movePosition(QtGui.QTextCursor.End)
+			cursor.insertText(result['text'])
+			if at_end:
+				scrollbar.setValue(scrollbar.maximum())
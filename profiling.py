@@ -0,0 +1,187 @@
+#!/usr/bin/python
+
+# profiling.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2019
+#
+# UI Refresh Profiler
+# Times the phases of each refresh cycle of the Render Queue window, i.e.
+# loading data from the database, deriving values from it, updating the
+# widgets and painting, so the cause of a sluggish UI can be pinned down.
+# Profiling is disabled by default. It is enabled with environment
+# variables:
+#   RQ_PROFILE=1                  time each phase of every refresh cycle and
+#                                 print a summary when the window is closed
+#   RQ_PROFILE_TRACE=<path>       record a cProfile trace of refresh cycles
+#                                 and write it to <path> (a pstats file, which
+#                                 can be viewed with snakeviz or converted to
+#                                 a flame graph with flameprof)
+#   RQ_PROFILE_CYCLES=<n>         number of cycles to trace (default 10)
+#   RQ_PROFILE_WINDOW=<n>         number of samples kept for each phase
+#                                 (default 100)
+
+
+import collections
+import cProfile
+import functools
+import os
+import time
+
+
+PHASES = ['load', 'derive', 'widgets', 'paint']
+
+
+def refreshCycle(method):
+	""" Decorator to time a method as a refresh cycle, using the profiler
+		held by the object the method belongs to.
+	"""
+	@functools.wraps(method)
+	def wrapper(self, *args, **kwargs):
+		self.profiler.begin(method.__name__)
+		try:
+			return method(self, *args, **kwargs)
+		finally:
+			self.profiler.end()
+	return wrapper
+
+
+class RefreshProfiler(object):
+	""" Class to time refresh cycles and the phases within them.
+		A cycle is started with begin() and finished with end(). In between,
+		lap() attributes the time since the previous lap (or the start of
+		the cycle) to the given phase, so phases which are interleaved, e.g.
+		in a loop over jobs, are added up rather than needing to be
+		separated. The last 'window' samples of each are kept.
+		Cycles may be nested; time spent in a nested cycle is counted in the
+		total of the outer cycle but not in any of its phases.
+	"""
+	def __init__(self, enabled=False, window=100):
+		self.enabled = enabled
+		self.window = window
+		self.samples = {}  # Rolling window of samples, keyed by (cycle, phase)
+		self.stack = []  # Cycles in progress: [name, start, mark, {phase: t}]
+
+		self.trace = None
+		self.tracePath = None
+		self.traceCycles = 0
+
+
+	@classmethod
+	def fromEnvironment(cls):
+		""" Create a profiler configured by the environment variables
+			described above.
+		"""
+		profiler = cls(
+			enabled=os.environ.get('RQ_PROFILE', '0') not in ['', '0'],
+			window=int(os.environ.get('RQ_PROFILE_WINDOW', 100)))
+		path = os.environ.get('RQ_PROFILE_TRACE')
+		if path:
+			profiler.startTrace(path, int(os.environ.get('RQ_PROFILE_CYCLES', 10)))
+		return profiler
+
+
+	def startTrace(self, path, cycles=10):
+		""" Record a cProfile trace of the next 'cycles' refresh cycles and
+			write it to 'path'. Phase timing is enabled at the same time.
+		"""
+		self.enabled = True
+		self.trace = cProfile.Profile()
+		self.tracePath = path
+		self.traceCycles = cycles
+
+
+	def begin(self, name):
+		""" Begin a refresh cycle.
+		"""
+		if not self.enabled:
+			return
+		if not self.stack and self.trace is not None:
+			self.trace.enable()
+		now = time.time()
+		self.stack.append([name, now, now, {}])
+
+
+	def lap(self, phase):
+		""" Attribute the time since the last lap to the given phase of the
+			current cycle.
+		"""
+		if not self.enabled or not self.stack:
+			return
+		cycle = self.stack[-1]
+		now = time.time()
+		cycle[3][phase] = cycle[3].get(phase, 0) + now - cycle[2]
+		cycle[2] = now
+
+
+	def end(self):
+		""" End the current refresh cycle and store its timings.
+		"""
+		if not self.enabled or not self.stack:
+			return
+		name, start, mark, phases = self.stack.pop()
+		now = time.time()
+		self.addSample(name, 'total', now - start)
+		for phase, seconds in phases.items():
+			self.addSample(name, phase, seconds)
+
+		if self.stack:
+			self.stack[-1][2] = now  # Exclude from the outer cycle's phases
+		elif self.trace is not None:
+			self.trace.disable()
+			self.traceCycles -= 1
+			if self.traceCycles <= 0:
+				self.dumpTrace()
+
+
+	def addSample(self, cycle, phase, seconds):
+		""" Add a sample to the rolling window for the cycle and phase.
+		"""
+		key = (cycle, phase)
+		if key not in self.samples:
+			self.samples[key] = collections.deque(maxlen=self.window)
+		self.samples[key].append(seconds)
+
+
+	def dumpTrace(self):
+		""" Write the cProfile trace and stop tracing.
+		"""
+		try:
+			self.trace.dump_stats(self.tracePath)
+			print("Profile trace written to: %s" %self.tracePath)
+		except (IOError, OSError) as e:
+			print("Warning: Unable to write profile trace: %s" %e)
+		self.trace = None
+
+
+	def getSummary(self):
+		""" Return statistics (in seconds) for the samples in the rolling
+			window as a dictionary of the form
+			{cycle: {phase: {'count', 'mean', 'median', 'max'}}}
+		"""
+		summary = {}
+		for (cycle, phase), samples in self.samples.items():
+			values = sorted(samples)
+			summary.setdefault(cycle, {})[phase] = {
+				'count': len(values),
+				'mean': sum(values) / len(values),
+				'median': values[len(values)//2],
+				'max': values[-1],
+			}
+		return summary
+
+
+	def report(self):
+		""" Return a summary of the timings as a table, in milliseconds.
+		"""
+		lines = ["%-18s %-8s %6s %9s %9s %9s" %(
+			"cycle", "phase", "count", "mean", "median", "max")]
+		summary = self.getSummary()
+		for cycle in sorted(summary):
+			for phase in PHASES + ['total']:
+				if phase in summary[cycle]:
+					stats = summary[cycle][phase]
+					lines.append("%-18s %-8s %6d %9.1f %9.1f %9.1f" %(
+						cycle, phase, stats['count'], stats['mean']*1000,
+						stats['median']*1000, stats['max']*1000))
+		return "\n".join(lines)
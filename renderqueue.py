@@ -22,15 +22,18 @@ import sys
 import time
 
 from Qt import QtCore, QtGui, QtWidgets
-import icons_rc
 import ui_template as UI
 
 # Import custom modules
-import about
+# Modules only needed for dialogs, or in some configurations, are imported
+# when first used to speed up startup: about, browser, logviewer, rqserver,
+# settings, submit
 import database
 import oswrapper
 #import outputparser
+import profiling
 import sequence
+import tasklog
 #import verbose
 import worker
 
@@ -79,6 +82,10 @@ class RenderQueueApp(QtWidgets.QMainWindow, UI.TemplateUI):
 		self.ip_address = socket.gethostbyname(self.localhost)
 		self.selection = []
 		self.expandedJobs = {}
+		self.logServer = None  # Serves logs buffered on local disk
+
+		# Set up profiling of the refresh cycle (see profiling.py)
+		self.profiler = profiling.RefreshProfiler.fromEnvironment()
 
 		self.setupUI(
 			window_object=WINDOW_OBJECT,
@@ -138,13 +145,12 @@ class RenderQueueApp(QtWidgets.QMainWindow, UI.TemplateUI):
 			# self.prefs.setValue('user', 'databaseLocation', databaseLocation)
 			# self.prefs.write()
 
-		self.rq = database.RenderQueue(databaseLocation)
+		self.rq = self.connectDatabase(databaseLocation)
 
 		# Temporarily disable some actions until properly implemented
 		#self.ui.actionResetView.setEnabled(False)
 		self.ui.actionResubmit.setEnabled(False)
 		self.ui.actionRemote.setEnabled(False)
-		self.ui.actionSplit.setEnabled(False)
 
 		# --------------------------------------------------------------------
 		# Connect signals & slots
@@ -246,7 +252,7 @@ class RenderQueueApp(QtWidgets.QMainWindow, UI.TemplateUI):
 
 		#self.ui.actionCombine.triggered.connect(self.combineTasks)  # not yet implemented
 
-		#self.ui.actionSplit_task.triggered.connect(self.splitTasks)  # not yet implemented
+		self.ui.actionSplit.triggered.connect(self.splitTasks)
 
 		# Worker menu & toolbar
 		self.ui.actionNewWorker.triggered.connect(self.newWorker)
@@ -317,6 +323,24 @@ class RenderQueueApp(QtWidgets.QMainWindow, UI.TemplateUI):
 		self.updateSelection()
 
 
+	def connectDatabase(self, location):
+		""" Return an interface to the render queue database. If a server
+			address is set in the user prefs, connect to the render queue
+			server, otherwise access the database directly on the
+			filesystem.
+		"""
+		address = self.prefs.getValue('user', 'databaseServer')
+		if address:
+			import rqserver
+			try:
+				return rqserver.RenderQueueClient(address)
+			except (socket.error, ValueError, rqserver.RenderQueueServerError) as e:
+				print("ERROR: Could not connect to render queue server at %s: %s" %(address, e))
+				print("Falling back to direct filesystem access.")
+
+		return database.RenderQueue(location)
+
+
 	def launchRenderSubmit(self, **kwargs):
 		""" Launch Render Submitter window.
 		"""
@@ -483,6 +507,7 @@ class RenderQueueApp(QtWidgets.QMainWindow, UI.TemplateUI):
 	def about(self):
 		""" Show about dialog.
 		"""
+		import about
 		info_ls = []
 		sep = " | "
 		for key, value in self.getInfo().items():
@@ -607,7 +632,7 @@ Developers: %s
 			self.prefs.getValue('user', 'databaseLocation'), 
 			'L:', '/Volumes/Library', '/mnt/Library')
 
-		self.rq = database.RenderQueue(databaseLocation)
+		self.rq = self.connectDatabase(databaseLocation)
 
 		# Set custom colours
 		self.colActive    = QtGui.QColor(self.prefs.getValue('user', 'colorActive',   "#00ffbb"))
@@ -628,6 +653,7 @@ Developers: %s
 		self.updateWorkerView()
 
 
+	@profiling.refreshCycle
 	def updateQueueView(self):
 		""" Update the render queue tree view widget with entries for render
 			jobs and tasks.
@@ -642,6 +668,7 @@ Developers: %s
 
 		# Populate tree widget with render jobs
 		jobs = self.rq.getJobs()
+		self.profiler.lap('load')
 		if not jobs:
 			return
 		for job in jobs:
@@ -662,12 +689,14 @@ Developers: %s
 			jobItem.setText(header['Priority'], str(job['priority']))
 			jobItem.setText(header['User'], job['username'])
 			jobItem.setText(header['Submitted'], job['submitTime'])
+			self.profiler.lap('widgets')
 
 			# Initialise counters and timers
 			jobTotalTimeSeconds = 0
 			inProgressTaskCount = 0
 			completedTaskCount = 0
 			failedTaskCount = 0
+			waitingTaskCount = 0
 			inProgressTaskFrameCount = 0
 			completedTaskFrameCount = 0
 			failedTaskFrameCount = 0
@@ -676,8 +705,11 @@ Developers: %s
 			else:
 				totalFrameCount = len(sequence.numList(job['frames']))
 
+			self.profiler.lap('derive')
+
 			# Populate render tasks
 			tasks = self.rq.getTasks(job['jobID'])
+			self.profiler.lap('load')
 			for task in tasks:
 
 				# Get values from XML
@@ -698,6 +730,8 @@ Developers: %s
 				except KeyError:
 					taskWorker = "None"
 
+				self.profiler.lap('derive')
+
 				# Get the render task item or create it if it doesn't exist
 				taskItem = self.getQueueItem(widget, jobItem, taskID)
 
@@ -706,8 +740,11 @@ Developers: %s
 				taskItem.setText(header['ID'], taskID)
 				taskItem.setText(header['Frames'], task['frames'])
 				taskItem.setText(header['Status'], taskStatus)
+				self.profiler.lap('widgets')
 
 				# Calculate progress
+				if taskStatus == "Waiting":
+					waitingTaskCount += 1
 				if task['frames'] == 'Unknown':
 					if taskStatus.startswith("Rendering"):
 						inProgressTaskCount += 1
@@ -729,6 +766,7 @@ Developers: %s
 					if taskStatus == "Failed":
 						failedTaskCount += 1
 						failedTaskFrameCount += taskFrameCount
+				self.profiler.lap('derive')
 
 				# Colour the status text
 				for col in range(widget.columnCount()):
@@ -746,6 +784,8 @@ Developers: %s
 					elif taskStatus == "Failed": # and taskWorker == self.localhost:
 						taskItem.setForeground(header['Status'], QtGui.QBrush(self.colError))
 						# taskItem.setIcon(header['Status'], self.errorIcon)
+					elif taskStatus == "Waiting":
+						taskItem.setForeground(header['Status'], QtGui.QBrush(self.colInactive))
 					else:
 						taskItem.setForeground(header['Status'], QtGui.QBrush(self.colNormal))
 
@@ -759,10 +799,12 @@ Developers: %s
 
 				taskItem.setText(header['Clock'], totalTime)
 				taskItem.setText(header['Worker'], taskWorker)
+				self.profiler.lap('widgets')
 			# End task setup
 
 			# Always sort tasks by ID (ignore column sort order)
 			jobItem.sortChildren(header['ID'], QtCore.Qt.AscendingOrder)
+			self.profiler.lap('widgets')
 
 			# Calculate job progress and update status
 			colBg = self.colBlack
@@ -772,7 +814,10 @@ Developers: %s
 			# Not started or no tasks finished...
 			if completedTaskFrameCount == 0:
 				if inProgressTaskFrameCount == 0:
-					jobStatus = "Queued"
+					if waitingTaskCount == len(tasks):
+						jobStatus = "Waiting for dependencies"
+					else:
+						jobStatus = "Queued"
 				else:
 					if inProgressTaskCount == 1:
 						jobStatus = "[0%] Rendering on 1 worker"
@@ -801,6 +846,8 @@ Developers: %s
 				# else:
 				# 	colBg = self.colError
 
+			self.profiler.lap('derive')
+
 			self.drawJobProgressIndicator(
 				header['Status'], 
 				jobItem, 
@@ -809,6 +856,7 @@ Developers: %s
 				inProgressTaskFrameCount, 
 				totalFrameCount, 
 				colProgress)
+			self.profiler.lap('paint')
 
 			# self.rq.setStatus(job['jobID'], jobStatus)  # Write to XML if status has changed
 			jobItem.setText(header['Status'], jobStatus)
@@ -832,11 +880,14 @@ Developers: %s
 				jobItem.setExpanded(self.expandedJobs[job['jobID']])
 			except:
 				pass
+			self.profiler.lap('widgets')
 
 		# Re-enable signals
 		widget.blockSignals(False)
+		self.paintNow(widget)
 
 
+	@profiling.refreshCycle
 	def updateWorkerView(self):
 		""" Update the information in the worker view.
 		"""
@@ -848,6 +899,7 @@ Developers: %s
 
 		# Populate tree widget with workers
 		workers = self.rq.getWorkers() #onlineOnly=True)
+		self.profiler.lap('load')
 		if not workers:
 			return
 		for worker in workers:
@@ -863,10 +915,6 @@ Developers: %s
 			# Check if workers are local or remote
 			if worker['ip_address'] == self.ip_address:
 				workerItem.setText(header['Type'], 'Local')
-
-				# Check-in worker if it's local
-				# Note this introduces a JSON write so not optimal
-				self.rq.checkinWorker(worker['id'], self.localhost)
 			else:
 				workerItem.setText(header['Type'], 'Remote')
 
@@ -893,13 +941,26 @@ Developers: %s
 			#workerItem.setText(header['Clock'], worker['runningTime'])
 			workerItem.setText(header['Pool'], worker['pool'])
 			workerItem.setText(header['Comment'], worker['comment'])
+			self.profiler.lap('widgets')
 
 		# Re-enable signals
 		widget.blockSignals(False)
+		self.paintNow(widget)
 
 		#self.checkinLocalWorkers()
 
 
+	def paintNow(self, widget):
+		""" When profiling, repaint the widget immediately so the time spent
+			painting can be measured. Otherwise painting is left to Qt's
+			event loop as usual.
+		"""
+		if self.profiler.enabled:
+			self.profiler.lap('widgets')
+			widget.viewport().repaint()
+			self.profiler.lap('paint')
+
+
 	def getQueueItem(self, widget, parent, itemID=None):
 		""" Return the tree widget item identified by 'itemID' belonging to
 			'parent'.
@@ -1121,15 +1182,16 @@ Developers: %s
 			be stopped immediately.
 		"""
 		header = self.queue_header
+		jobIDs = []
 
 		try:
 			for item in self.ui.queue_treeWidget.selectedItems():
 				# If item has no parent then it must be a top level item, and
 				# therefore also a job
 				if not item.parent():
-					jobID = item.text(header['ID'])
-					self.rq.requeueJob(jobID)
+					jobIDs.append(item.text(header['ID']))
 
+			self.rq.requeueJobs(jobIDs)
 			self.changePriority(0, absolute=True)  # Pause job(s)
 
 			#self.updateQueueView()
@@ -1143,20 +1205,19 @@ Developers: %s
 			view.
 		"""
 		header = self.queue_header
+		items = {}
 
 		try:
 			for item in self.ui.queue_treeWidget.selectedItems():
 				# If item has no parent then it must be a top level item, and
 				# therefore also a job
 				if not item.parent():
-					jobID = item.text(header['ID'])
+					items[item.text(header['ID'])] = item
 
-					# Remove item from view
-					if self.rq.deleteJob(jobID):
-						self.ui.queue_treeWidget.takeTopLevelItem(self.ui.queue_treeWidget.indexOfTopLevelItem(item))
-						#verbose.message("Job ID %s deleted." %jobID)
-					#else:
-					#	verbose.warning("Job ID %s cannot be deleted while in progress." %jobID)
+			# Remove items from view
+			for jobID in self.rq.deleteJobs(list(items.keys())):
+				item = items[jobID]
+				self.ui.queue_treeWidget.takeTopLevelItem(self.ui.queue_treeWidget.indexOfTopLevelItem(item))
 
 			#self.updateQueueView()
 
@@ -1168,17 +1229,19 @@ Developers: %s
 		""" Archives selected render job(s).
 		"""
 		header = self.queue_header
+		items = {}
 
 		try:
 			for item in self.ui.queue_treeWidget.selectedItems():
 				# If item has no parent then it must be a top level item, and
 				# therefore also a job
 				if not item.parent():
-					jobID = item.text(header['ID'])
+					items[item.text(header['ID'])] = item
 
-					# Remove item from view
-					if self.rq.archiveJob(jobID):
-						self.ui.queue_treeWidget.takeTopLevelItem(self.ui.queue_treeWidget.indexOfTopLevelItem(item))
+			# Remove items from view
+			for jobID in self.rq.archiveJobs(list(items.keys())):
+				item = items[jobID]
+				self.ui.queue_treeWidget.takeTopLevelItem(self.ui.queue_treeWidget.indexOfTopLevelItem(item))
 
 			#self.updateQueueView()
 
@@ -1299,8 +1362,8 @@ Developers: %s
 					else:
 						item.setText(header['Priority'], str(newPriority))
 
-					if absolute:
-						self.updatePriority()
+			if absolute:
+				self.updatePriority()
 
 		except ValueError:
 			pass
@@ -1313,6 +1376,7 @@ Developers: %s
 			released, or when we want to set the priority directly.
 		"""
 		header = self.queue_header
+		priorities = {}
 
 		try:
 			for item in self.ui.queue_treeWidget.selectedItems():
@@ -1320,9 +1384,9 @@ Developers: %s
 				# therefore also a job
 				if not item.parent():
 					jobID = item.text(header['ID'])
-					priority = int(item.text(header['Priority']))
-					self.rq.setPriority(jobID, priority)
+					priorities[jobID] = int(item.text(header['Priority']))
 
+			self.rq.setPriorities(priorities)
 			self.updateQueueView()
 
 		except ValueError:
@@ -1364,6 +1428,7 @@ Developers: %s
 	def viewTaskLog(self):
 		""" View the log for the selected task(s).
 		"""
+		import logviewer
 		header = self.queue_header
 
 		try:
@@ -1373,7 +1438,8 @@ Developers: %s
 				if item.parent():
 					jobID = item.parent().text(header['ID'])
 					taskID = int(item.text(header['ID']))
-					os.system('xdg-open %s' %self.rq.getTaskLog(jobID, taskID))
+					viewer = logviewer.LogViewerDialog(self.rq, jobID, taskID, parent=self)
+					viewer.show()
 
 		except ValueError:
 			pass
@@ -1413,13 +1479,12 @@ Developers: %s
 						header['ID']), int(item.text(header['ID']))
 					jobTaskIDs.append(jobTaskID)
 
-			for jobTaskID in jobTaskIDs:
-				if status == "Queued":
-					self.rq.requeueTask(jobTaskID[0], jobTaskID[1])
-				elif status == "Completed":
-					self.rq.completeTask(jobTaskID[0], jobTaskID[1], taskTime=0)
-				elif status == "Failed":
-					self.rq.failTask(jobTaskID[0], jobTaskID[1], taskTime=0)
+			if status == "Queued":
+				self.rq.requeueTasks(jobTaskIDs)
+			elif status == "Completed":
+				self.rq.completeTasks(jobTaskIDs)
+			elif status == "Failed":
+				self.rq.failTasks(jobTaskIDs)
 
 			self.updateQueueView()
 			self.updateWorkerView()
@@ -1531,6 +1596,28 @@ Developers: %s
 	# 		pass
 
 
+	def splitTasks(self):
+		""" Split each of the selected tasks in two. Only queued tasks can be
+			split.
+		"""
+		header = self.queue_header
+
+		try:
+			for item in self.ui.queue_treeWidget.selectedItems():
+				# If item has parent then it must be a subitem, and therefore
+				# also a task
+				if item.parent():
+					jobID = item.parent().text(header['ID'])
+					taskNo = int(item.text(header['ID']))
+					if not self.rq.splitTask(jobID, taskNo, 2):
+						print("Warning: Task %d could not be split. Only queued tasks with more than one frame can be split." %taskNo)
+
+			self.updateQueueView()
+
+		except ValueError:
+			pass
+
+
 	def combineTasks(self):
 		""" Combine the selected tasks into a new task. Only works for tasks
 			belonging to the same job, all of which are queued and have a
@@ -1586,10 +1673,41 @@ Developers: %s
 		worker_args['pool'] = "None"
 		worker_args['comment'] = ""
 
+		# Declare capabilities for matching tasks to workers. Applications
+		# and GPU can be declared by editing the worker.
+		worker_args['capabilities'] = {}
+		try:  # Total physical memory in GB (not available on Windows)
+			ram = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+			worker_args['capabilities']['ram'] = int(round(ram / 1024.0**3))
+		except (AttributeError, ValueError, OSError):
+			pass
+
 		self.rq.newWorker(**worker_args)
 		self.updateWorkerView()
 
 
+	def startLogServer(self):
+		""" Start serving the logs of tasks rendering on this worker, if not
+			already started, so viewers can see the latest output before it
+			is copied to the shared log folder. The server listens on the
+			worker's IP address, which viewers connect to, unless the
+			'taskLogBind' database config value is set.
+		"""
+		if self.logServer is not None:
+			return
+		try:
+			if not os.path.isdir(tasklog.LOCAL_DIR):
+				os.makedirs(tasklog.LOCAL_DIR)
+			self.logServer = tasklog.LogServer(tasklog.LOCAL_DIR, 
+				self.rq.getConfig('taskLogPort', tasklog.DEFAULT_PORT), 
+				self.rq.getConfig('taskLogBind', self.ip_address))
+			self.logServer.start()
+		except (socket.error, OSError) as e:
+			print("Warning: Unable to start log server: %s" %e)
+			self.logServer = False  # Don't try again
+
+
+	@profiling.refreshCycle
 	def dequeue(self):
 		""" Dequeue a render task from the queue and start rendering.
 		"""
@@ -1602,13 +1720,6 @@ Developers: %s
 		# self.startTimeSec = time.time()  # Used to measure the time spent rendering
 		# startTime = time.strftime(self.time_format)
 
-		# Look for a suitable task to render
-		task = self.rq.getTaskToRender()
-		if task is None:
-			# verbose.message("[%s] No jobs to render." %self.localhost)
-			# print("No suitable tasks to render.")
-			return False
-
 		# # Get workers - from JSON
 		# workers = self.rq.getWorkers()
 		# if not workers:
@@ -1627,12 +1738,26 @@ Developers: %s
 			workerType = workerItem.text(header['Type'])
 			workerStatus = workerItem.text(header['Status'])
 			if workerType == "Local":  # Local workers only
+				# Check in the worker - this is the worker's heartbeat while
+				# idle, rendering threads send their own
+				self.profiler.lap('widgets')
+				self.rq.checkinWorker(workerID, self.localhost)
+				self.profiler.lap('load')
+
 				if workerStatus == "Idle":  # Worker is ready
-					# ---SNIP---
-					self.rq.dequeueTask(task['jobID'], task['taskNo'], workerID)
+					# Look for a suitable task to render and dequeue it
+					self.profiler.lap('widgets')
+					task = self.rq.claimTask(workerID)
+					self.profiler.lap('load')
+					if task is None:
+						# verbose.message("[%s] No jobs to render." %self.localhost)
+						# print("No suitable tasks to render.")
+						worker.closeSession(workerID)  # Free resources held by idle session
+						return False
 
 					job = self.rq.getJob(task['jobID'])
 					node = self.rq.getWorker(workerID)
+					self.profiler.lap('load')
 					# result = worker.renderTask(job, task, node)
 
 					# if result:
@@ -1643,9 +1768,22 @@ Developers: %s
 					# Initialise worker thread, connect signals & slots, start processing
 					logfile = os.path.join(self.rq.db['logs'], '%s_%s.log' %(task['jobID'], str(task['taskNo']).zfill(4)))
 					#print(logfile)
+					log_local_dir = None
+					if self.rq.getConfig('taskLogLocal', False):
+						log_local_dir = tasklog.LOCAL_DIR
+						self.startLogServer()
 					self.workerThread = worker.WorkerThread(
 						job, task, node, logfile, 
-						ignore_errors=True)
+						ignore_errors=True, 
+						timeout=self.rq.getConfig('taskTimeout', 0), 
+						stall_timeout=self.rq.getConfig('stallTimeout', 0), 
+						log_max_size=int(self.rq.getConfig('taskLogMaxSize', tasklog.MAX_SIZE) * 1024 * 1024), 
+						log_backups=self.rq.getConfig('taskLogBackups', tasklog.BACKUPS), 
+						log_compress=self.rq.getConfig('taskLogCompress', True), 
+						log_local_dir=log_local_dir, 
+						log_upload_interval=self.rq.getConfig('taskLogUploadInterval', tasklog.UPLOAD_INTERVAL), 
+						heartbeat=lambda workerID=workerID: self.rq.heartbeatWorker(workerID), 
+						heartbeat_interval=max(1, self.rq.getConfig('heartbeatTimeout', 60) / 4.0))
 					# self.workerThread.printError.connect(verbose.error)
 					# self.workerThread.printMessage.connect(verbose.message)
 					# self.workerThread.printProgress.connect(verbose.progress)
@@ -1653,6 +1791,7 @@ Developers: %s
 					# self.workerThread.taskCompleted.connect(self.taskCompleted)
 					self.workerThread.taskCompleted.connect(self.rq.completeTask)
 					self.workerThread.taskFailed.connect(self.rq.failTask)
+					self.workerThread.taskCancelled.connect(self.rq.requeueTask)
 					self.workerThread.finished.connect(self.renderFinished)
 					self.workerThread.start()
 
@@ -1670,13 +1809,19 @@ Developers: %s
 
 
 	def cancelRender(self):
-		""" Stop the render operation.
+		""" Stop the render operation. The render process is killed, the
+			task is returned to the queue and the worker is disabled so it
+			doesn't immediately pick up another task.
 		"""
+		thread = getattr(self, 'workerThread', None)
+		if thread is None or not thread.isRunning():
+			print("No render in progress.")
+			return
+
 		print("Aborting render.")
-		# self.workerThread.terminate()  # Enclose in try/except?
-		# self.workerThread.quit()  # Enclose in try/except?
-		# self.workerThread.wait()  # Enclose in try/except?
-		self.workerThread.stop()
+		self.rq.disableWorker(thread.worker['id'])
+		thread.stop()
+		self.updateWorkerView()
 
 		# self.ui.taskList_treeWidget.resizeColumnToContents(self.getHeaderIndex("Status"))
 
@@ -1748,6 +1893,10 @@ Developers: %s
 		self.timerDequeue.timeout.connect(self.dequeue)
 		self.timerDequeue.start(5000)  # Should only happen when worker is enabled
 
+		self.timerReap = QtCore.QTimer(self)
+		self.timerReap.timeout.connect(self.rq.reapOrphanedTasks)
+		self.timerReap.start(30000)  # Requeue tasks from dead workers
+
 		# self.timerUpdateTimer = QtCore.QTimer(self)
 		# self.timerUpdateTimer.timeout.connect(self.updateTimers)
 		# self.timerUpdateTimer.start(1000)
@@ -1760,6 +1909,14 @@ Developers: %s
 		# self.timerCheckin.timeout.connect(self.checkinLocalWorkers)
 		# self.timerCheckin.start(15000)
 
+		# Populate the views once the window has been drawn, so it appears
+		# without waiting for the database
+		QtCore.QTimer.singleShot(0, self.populateViews)
+
+
+	def populateViews(self):
+		""" Populate the render queue and worker views for the first time.
+		"""
 		self.updateQueueView()
 		self.updateWorkerView()
 		#self.updateWorkerView()  # bodge - run twice to update online workers
@@ -1794,21 +1951,31 @@ Developers: %s
 			if not self.promptDialog(dialog_msg, dialog_title):
 				return
 
-		# Kill the rendering process
-		#self.killRenderProcess()
-
-		# Requeue the task that's currently rendering
-		#self.rq.requeueTask(jobTaskID[0], jobTaskID[1])
+		# Kill the rendering process - the task that's currently rendering
+		# is requeued when the worker thread finishes
+		try:
+			self.workerThread.stop()
+			self.workerThread.wait()
+		except AttributeError:
+			pass
 
 		# Stop timers
 		self.timerUpdateView.stop()
 		self.timerDequeue.stop()
+		self.timerReap.stop()
 		# self.timerUpdateTimer.stop()
 		# self.timerCheckin.stop()
 
 		# Mark local worker(s) as offline
 		self.checkoutLocalWorkers()
 
+		# Quit applications kept open by render sessions
+		worker.closeAllSessions()
+
+		# Print refresh cycle timings
+		if self.profiler.samples:
+			print(self.profiler.report())
+
 		# Store window geometry and state of certain widgets
 		self.storeWindow()
 		self.settings.setValue("splitterSizes", self.ui.splitter.saveState())
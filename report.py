@@ -0,0 +1,364 @@
+#!/usr/bin/python
+
+# report.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2019
+#
+# Render Queue Report
+# Command-line tool to produce farm usage statistics from the event log,
+# e.g. node-hours used by each user last week, or the average time tasks
+# spend waiting in the queue at each priority.
+#   python report.py /path/to/database --since 7d --group user
+#   python report.py /path/to/database --since 2019-01-01 --format csv
+# Events are streamed and aggregated as they are read, so memory use
+# depends on the number of jobs and tasks in flight, not on the length of
+# the history.
+
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+
+# Import custom modules
+import events
+import sequence
+
+
+GROUPS = ['job', 'user', 'worker', 'priority', 'hour']
+
+# Events needed to work out render statistics and queue wait times
+REPORT_EVENTS = [
+	'submit', 'createTasks', 'split', 'release', 'requeue', 'dequeue',
+	'complete', 'fail', 'priority', 'deleteJob', 'archiveJob']
+
+COLUMNS = [
+	'group', 'key', 'jobName', 'username', 'tasks', 'failed', 'frames',
+	'nodeHours', 'meanRenderTime', 'meanQueueWait', 'maxQueueWait']
+
+
+def parseTime(value):
+	""" Convert a date/time string to a timestamp. Accepts 'YYYY-MM-DD',
+		'YYYY-MM-DD HH:MM', or a time relative to now such as '12h', '7d' or
+		'4w'.
+	"""
+	match = re.match(r'^(\d+(?:\.\d+)?)([hdw])$', value.strip())
+	if match:
+		seconds = {'h': 3600, 'd': 86400, 'w': 604800}[match.group(2)]
+		return time.time() - float(match.group(1)) * seconds
+
+	for fmt in ["%Y-%m-%d %H:%M", "%Y-%m-%d"]:
+		try:
+			return time.mktime(time.strptime(value.strip(), fmt))
+		except ValueError:
+			pass
+	raise argparse.ArgumentTypeError("invalid date/time: '%s'" %value)
+
+
+# ----------------------------------------------------------------------------
+# Begin report class
+# ----------------------------------------------------------------------------
+
+# Indices of the counters held for each row of the report
+TASKS, FAILED, FRAMES, RENDER_TIME, WAIT_COUNT, WAIT_TIME, MAX_WAIT = range(7)
+
+
+# Frame counts of ranges which aren't simple, keyed by frame range string
+frameCounts = {}
+FRAME_COUNTS_MAX = 10000
+
+
+def countFrames(frames):
+	""" Return the number of frames in a frame range string. Simple ranges
+		are counted without expanding them, and others are cached as the
+		same ranges tend to be rendered many times.
+	"""
+	try:
+		first, last = frames.split('-')
+		return int(last) - int(first) + 1
+	except ValueError:
+		pass
+	try:
+		return frameCounts[frames]
+	except KeyError:
+		count = len(sequence.numList(frames, quiet=True) or [])
+		if len(frameCounts) < FRAME_COUNTS_MAX:
+			frameCounts[frames] = count
+		return count
+
+
+def combine(rows):
+	""" Return the sum of a list of rows of counters.
+	"""
+	total = [0, 0, 0, 0.0, 0, 0.0, 0.0]
+	for row in rows:
+		for i in range(MAX_WAIT):
+			total[i] += row[i]
+		total[MAX_WAIT] = max(total[MAX_WAIT], row[MAX_WAIT])
+	return total
+
+
+class Report(object):
+	""" Class to aggregate events into statistics per job, user, worker,
+		priority and hour. As events are read, counters are only updated
+		for each job (at its current priority), each worker and each hour.
+		The user and priority totals are worked out from the job totals
+		afterwards, which keeps the work done per event to a minimum.
+	"""
+	def __init__(self, groups=GROUPS):
+		self.groups = groups
+		self.jobRows = {}  # Keyed by (jobID, priority)
+		self.workerRows = {}  # Keyed by worker ID
+		self.hourRows = {}  # Keyed by hours since the epoch
+		self.jobs = {}  # Job details from submit events, keyed by job ID
+		self.queued = {}  # Time each task was queued, {jobID: {taskNo: time}}
+		self.start = None
+		self.end = None
+
+
+	def getRow(self, table, key):
+		""" Return the counters for the given key, creating them if
+			necessary.
+		"""
+		try:
+			return table[key]
+		except KeyError:
+			table[key] = row = [0, 0, 0, 0.0, 0, 0.0, 0.0]
+			return row
+
+
+	def getRows(self, event, timestamp=None):
+		""" Return the counters for the job and worker the event belongs to,
+			and the hour containing 'timestamp' if given.
+		"""
+		jobID = event.get('jobID')
+		priority = self.jobs.get(jobID, {}).get('priority')
+		rows = [
+			self.getRow(self.jobRows, (jobID, priority)), 
+			self.getRow(self.workerRows, event.get('workerID'))]
+		if timestamp is not None:
+			rows.append(self.getRow(self.hourRows, int(timestamp // 3600)))
+		return rows
+
+
+	def queueTasks(self, jobID, first, count, timestamp):
+		""" Record the time tasks were added to the queue.
+		"""
+		tasks = self.queued.setdefault(jobID, {})
+		for taskNo in range(first, first+count):
+			tasks[taskNo] = timestamp
+
+
+	def add(self, event):
+		""" Add a single event to the statistics.
+		"""
+		name = event['event']
+		timestamp = event['time']
+
+		if name == 'dequeue':
+			queued = self.queued.get(event['jobID'], {}).pop(event['taskNo'], None)
+			if queued is not None:
+				wait = max(0, timestamp - queued)
+				for row in self.getRows(event, timestamp):
+					row[WAIT_COUNT] += 1
+					row[WAIT_TIME] += wait
+					if wait > row[MAX_WAIT]:
+						row[MAX_WAIT] = wait
+
+		elif name == 'complete' or name == 'fail':
+			if name == 'fail' and event.get('retry'):
+				queued = max(timestamp, event.get('notBefore', timestamp))
+				self.queued.setdefault(event['jobID'], {})[event['taskNo']] = queued
+
+			duration = event.get('duration')
+			if duration is None:
+				return  # Not rendered, e.g. marked as complete manually
+
+			rows = self.getRows(event, timestamp)
+			for row in rows:
+				row[TASKS] += 1
+				if name == 'fail':
+					row[FAILED] += 1
+				else:
+					row[FRAMES] += countFrames(event.get('frames') or "")
+
+			# Split the render time between the hours the render spanned
+			for row in rows[:2]:
+				row[RENDER_TIME] += duration
+			start = timestamp - duration
+			while start < timestamp:
+				end = min(timestamp, (start // 3600 + 1) * 3600)
+				self.getRow(self.hourRows, int(start // 3600))[RENDER_TIME] += end - start
+				start = end
+
+		elif name == 'submit':
+			self.jobs[event['jobID']] = {
+				'jobName': event.get('jobName'),
+				'username': event.get('username'),
+				'priority': event.get('priority'),
+			}
+			# Tasks waiting for dependencies are queued when released
+			self.queueTasks(event['jobID'], 0, event.get('tasks', 0), timestamp)
+
+		elif name == 'priority':
+			self.jobs.setdefault(event['jobID'], {})['priority'] = event['priority']
+
+		elif name == 'createTasks' or name == 'split':
+			self.queueTasks(event['jobID'], event['firstTaskNo'], event['tasks'], timestamp)
+
+		elif name == 'release' or name == 'requeue':
+			self.queued.setdefault(event['jobID'], {})[event['taskNo']] = timestamp
+
+		elif name == 'deleteJob' or name == 'archiveJob':
+			self.queued.pop(event['jobID'], None)
+
+
+	def read(self, location, start=None, end=None):
+		""" Read and aggregate events from the event log at 'location'.
+			Tasks queued before the start of the report period are still
+			read, so that queue wait times can be calculated, but only
+			events inside the period are counted.
+		"""
+		for event in events.readEvents(location, end=end, events=REPORT_EVENTS):
+			if start is not None and event['time'] < start:
+				self.addContext(event)
+			else:
+				if self.start is None:
+					self.start = event['time']
+				self.end = event['time']
+				self.add(event)
+
+
+	def addContext(self, event):
+		""" Process an event from before the start of the report period.
+			Only job details and queue times are recorded.
+		"""
+		name = event['event']
+		if name == 'dequeue':
+			self.queued.get(event['jobID'], {}).pop(event['taskNo'], None)
+		elif name == 'fail' or name == 'complete':
+			if name == 'fail' and event.get('retry'):
+				self.queued.setdefault(event['jobID'], {})[event['taskNo']] = \
+					max(event['time'], event.get('notBefore', event['time']))
+		else:
+			self.add(event)
+
+
+	def getTables(self):
+		""" Roll the counters up into a table for each group. Returns a
+			dictionary of {key: counters} dictionaries, keyed by group.
+		"""
+		tables = dict((group, {}) for group in GROUPS)
+		for (jobID, priority), row in self.jobRows.items():
+			username = self.jobs.get(jobID, {}).get('username')
+			for group, key in [('job', jobID), ('user', username), ('priority', priority)]:
+				tables[group].setdefault(key, []).append(row)
+		for workerID, row in self.workerRows.items():
+			tables['worker'][workerID] = [row]
+		for hour, row in self.hourRows.items():
+			key = time.strftime("%Y-%m-%d %H:00", time.localtime(hour * 3600))
+			tables['hour'][key] = [row]
+
+		for group in tables:
+			for key in tables[group]:
+				tables[group][key] = combine(tables[group][key])
+		return tables
+
+
+	def getResults(self):
+		""" Return the statistics as a dictionary of lists of rows, keyed by
+			group.
+		"""
+		tables = self.getTables()
+		results = {}
+		for group in self.groups:
+			rows = []
+			for key, counters in sorted(tables[group].items(), key=lambda item: str(item[0])):
+				row = {
+					'key': key,
+					'tasks': counters[TASKS],
+					'failed': counters[FAILED],
+					'frames': counters[FRAMES],
+					'nodeHours': round(counters[RENDER_TIME] / 3600.0, 3),
+					'meanRenderTime': None,
+					'meanQueueWait': None,
+					'maxQueueWait': round(counters[MAX_WAIT], 1),
+				}
+				if counters[TASKS] and group != 'hour':
+					row['meanRenderTime'] = round(counters[RENDER_TIME] / counters[TASKS], 1)
+				if counters[WAIT_COUNT]:
+					row['meanQueueWait'] = round(counters[WAIT_TIME] / counters[WAIT_COUNT], 1)
+				if group == 'job':
+					job = self.jobs.get(key, {})
+					row['jobName'] = job.get('jobName')
+					row['username'] = job.get('username')
+				rows.append(row)
+			results[group] = rows
+		return results
+
+# ----------------------------------------------------------------------------
+# End report class
+# ============================================================================
+# Output
+# ----------------------------------------------------------------------------
+
+def writeJSON(report, f):
+	""" Write the report as JSON.
+	"""
+	data = {
+		'start': report.start,
+		'end': report.end,
+		'groups': report.getResults(),
+	}
+	json.dump(data, f, indent=4, sort_keys=True)
+	f.write("\n")
+
+
+def writeCSV(report, f):
+	""" Write the report as CSV, with a row for each key in each group.
+	"""
+	writer = csv.DictWriter(f, COLUMNS, extrasaction='ignore')
+	writer.writeheader()
+	for group, rows in sorted(report.getResults().items()):
+		for row in rows:
+			writer.writerow(dict(row, group=group))
+
+# ----------------------------------------------------------------------------
+# Run as standalone app
+# ----------------------------------------------------------------------------
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Render Queue Report")
+	parser.add_argument('database',
+		help="path to the render queue database")
+	parser.add_argument('-s', '--since', type=parseTime,
+		help="start of report period: 'YYYY-MM-DD [HH:MM]' or relative, e.g. '7d'")
+	parser.add_argument('-u', '--until', type=parseTime,
+		help="end of report period (default: now)")
+	parser.add_argument('-g', '--group', action='append', choices=GROUPS,
+		help="group statistics by job, user, worker, priority or hour; may be repeated (default: all)")
+	parser.add_argument('-f', '--format', choices=['json', 'csv'], default='json',
+		help="output format (default: %(default)s)")
+	parser.add_argument('-o', '--output',
+		help="file to write the report to (default: stdout)")
+	args = parser.parse_args()
+
+	location = os.path.join(args.database, 'logs', 'events')
+	if not os.path.isdir(location):
+		print("ERROR: No event log found at: %s" %location)
+		sys.exit(1)
+
+	report = Report(args.group or GROUPS)
+	report.read(location, args.since, args.until)
+
+	write = writeCSV if args.format == 'csv' else writeJSON
+	if args.output:
+		with open(args.output, 'w') as f:
+			write(report, f)
+	else:
+		write(report, sys.stdout)
+	sys.exit(0)
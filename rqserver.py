@@ -0,0 +1,364 @@
+#!/usr/bin/python
+
+# rqserver.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2019
+#
+# Render Queue Server
+# An optional central dispatch process which owns the render queue database
+# and serves requests from clients over a simple socket protocol. Each
+# request and response is a single line of JSON, e.g.
+#   -> {"method": "claimTask", "args": ["<workerID>"], "kwargs": {}}
+#   <- {"result": {"jobID": "...", "taskNo": 0, "frames": "1-10"}}
+# RenderQueueClient provides the same interface as database.RenderQueue so
+# clients can switch between direct filesystem access and server mode.
+# The server does not authenticate clients: any process which can connect can
+# modify the render queue. By default it only listens on the loopback
+# interface. Only listen on other interfaces on a trusted network.
+
+
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+try:
+	import socketserver
+except ImportError:
+	import SocketServer as socketserver  # Python 2.x
+
+# Import custom modules
+import database
+
+
+# ----------------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------------
+
+DEFAULT_PORT = 42077
+LOOPBACK_HOSTS = ['localhost', '127.0.0.1', '::1']
+
+# Methods which only query the database, and the parts of the database each
+# depends on. Results are held in memory until a method which modifies one of
+# those parts is called. An empty list means the result never changes, and
+# None means the result is never cached, e.g. because it depends on the time.
+READ_METHODS = {
+	'getConfig': ['config'],
+	'getTime': None,
+	'getJobs': ['jobs'],
+	'getJob': ['jobs'],
+	'getJobDatafile': [],
+	'getPriority': ['jobs'],
+	'getTasks': ['tasks', 'workers'],
+	'getQueuedTasks': ['tasks'],
+	'getPoolQueues': ['config', 'jobs', 'tasks'],
+	'getTaskToRender': ['config', 'jobs', 'tasks', 'workers', 'usage'],
+	'getUsage': ['config', 'usage'],
+	'getTaskID': [],
+	'getTaskLog': [],
+	'tailTaskLog': None,
+	'findTasks': ['tasks'],
+	'getWorkers': ['config', 'jobs', 'tasks', 'workers', 'heartbeats'],
+	'getWorkerNames': ['workers'],
+	'getIdleWorkerCount': ['config', 'tasks', 'workers', 'heartbeats'],
+	'getHeartbeatAge': None,
+	'getWorkerDatafile': [],
+	'getWorker': ['workers', 'heartbeats'],
+	'getIOStats': None,
+	'findArchivedJobs': ['archive'],
+	'getArchivedJob': ['archive'],
+	}
+
+# Methods which modify the database, and the parts of the database each
+# modifies. None means anything may have changed.
+WRITE_METHODS = {
+	'setConfig': None,
+	'newJob': ['jobs', 'tasks'],
+	'deleteJob': ['jobs', 'tasks', 'workers', 'logs'],
+	'archiveJob': ['jobs', 'tasks', 'workers', 'logs', 'archive'],
+	'deleteTasks': ['tasks', 'workers'],
+	'deleteJobLogs': ['logs'],
+	'requeueJob': ['jobs', 'tasks', 'workers'],
+	'requeueJobs': ['jobs', 'tasks', 'workers'],
+	'deleteJobs': ['jobs', 'tasks', 'workers', 'logs'],
+	'archiveJobs': ['jobs', 'tasks', 'workers', 'logs', 'archive'],
+	'purgeJobs': ['jobs', 'tasks', 'workers', 'logs', 'archive'],
+	'releaseDependents': ['tasks'],
+	'setPriority': ['jobs'],
+	'setPriorities': ['jobs'],
+	'updateAdaptiveTasks': ['jobs', 'tasks'],
+	'claimTask': ['jobs', 'tasks', 'workers'],
+	'dequeueTask': ['tasks', 'workers'],
+	'completeTask': ['jobs', 'tasks', 'workers', 'usage'],
+	'failTask': ['jobs', 'tasks', 'workers', 'usage'],
+	'recordWorkerFailure': ['jobs'],
+	'requeueTask': ['jobs', 'tasks', 'workers'],
+	'requeueTasks': ['jobs', 'tasks', 'workers'],
+	'completeTasks': ['jobs', 'tasks', 'workers', 'usage'],
+	'failTasks': ['jobs', 'tasks', 'workers', 'usage'],
+	'splitTask': ['jobs', 'tasks'],
+	'balanceQueue': ['jobs', 'tasks'],
+	'newWorker': ['workers'],
+	'deleteWorker': ['workers'],
+	'enableWorker': ['workers'],
+	'disableWorker': ['workers'],
+	'checkinWorker': ['heartbeats'],
+	'heartbeatWorker': ['heartbeats'],
+	'checkoutWorker': ['workers', 'heartbeats'],
+	'reapOrphanedTasks': ['jobs', 'tasks', 'workers'],
+	}
+
+
+class RenderQueueServerError(Exception):
+	""" Raised by the client when the server fails to carry out a request.
+	"""
+	pass
+
+
+def parseAddress(address):
+	""" Parse a server address string. Returns a tuple containing the socket
+		family and the address in the form expected by the socket module.
+		Accepts 'host:port', 'port' (localhost) or a path to a UNIX socket.
+		An empty host also means localhost.
+	"""
+	address = str(address)
+	if ':' in address and not os.path.isabs(address):
+		host, port = address.rsplit(':', 1)
+		return socket.AF_INET, (host or 'localhost', int(port))
+	elif address.isdigit():
+		return socket.AF_INET, ('localhost', int(address))
+	else:
+		return socket.AF_UNIX, address
+
+
+# ----------------------------------------------------------------------------
+# Begin server classes
+# ----------------------------------------------------------------------------
+
+class RequestHandler(socketserver.StreamRequestHandler):
+	""" Handle requests from a single client connection. The connection is
+		kept open so a client can make many calls without reconnecting.
+	"""
+	def handle(self):
+		while True:
+			line = self.rfile.readline()
+			if not line:
+				break  # Client disconnected
+
+			try:
+				request = json.loads(line.decode('utf-8'))
+				result = self.server.dispatcher.dispatch(
+					request['method'],
+					request.get('args', []),
+					request.get('kwargs', {}))
+				response = {'result': result}
+			except Exception as e:
+				response = {'error': "%s: %s" %(type(e).__name__, e)}
+
+			self.wfile.write((json.dumps(response) + "\n").encode('utf-8'))
+			self.wfile.flush()
+
+
+class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+	allow_reuse_address = True
+	daemon_threads = True
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+	class ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+		daemon_threads = True
+
+
+class RenderQueueServer(object):
+	""" Class to own the render queue database and dispatch requests from
+		clients. All calls are serialised with a lock, so claiming a task is
+		atomic across all clients connected to the server.
+		Query results are cached, and each write only invalidates the cached
+		results which depend on the parts of the database it modifies, so
+		e.g. worker heartbeats don't discard the cached job list.
+	"""
+	def __init__(self, location, address=DEFAULT_PORT, cache_ttl=5):
+		self.rq = database.RenderQueue(location)
+		self.lock = threading.RLock()
+		self.cache = {}
+		self.cache_ttl = cache_ttl  # Expire cached results in case other clients write to the database directly
+
+		family, self.address = parseAddress(address)
+		if family == socket.AF_UNIX:
+			if os.path.exists(self.address):
+				os.remove(self.address)  # Remove stale socket
+			self.server = ThreadingUnixServer(self.address, RequestHandler)
+		else:
+			if self.address[0] not in LOOPBACK_HOSTS:
+				print("Warning: Listening on %s, which is not a loopback address. "
+					"Clients are not authenticated, so any client which can "
+					"connect can modify the render queue." %(self.address, ))
+			self.server = ThreadingTCPServer(self.address, RequestHandler)
+		self.server.dispatcher = self
+
+
+	def dispatch(self, method, args=[], kwargs={}):
+		""" Call the specified database method and return the result.
+			Results of read-only methods are served from memory where
+			possible.
+		"""
+		if method == 'getPaths':
+			return self.rq.db
+
+		if method in READ_METHODS:
+			depends = READ_METHODS[method]
+			if depends is None:
+				return getattr(self.rq, method)(*args, **kwargs)
+
+			key = json.dumps([method, args, kwargs], sort_keys=True)
+			with self.lock:
+				try:
+					timestamp, _, result = self.cache[key]
+					if time.time() - timestamp < self.cache_ttl:
+						return result
+				except KeyError:
+					pass
+				result = getattr(self.rq, method)(*args, **kwargs)
+				self.cache[key] = (time.time(), set(depends), result)
+				return result
+
+		elif method in WRITE_METHODS:
+			with self.lock:
+				result = getattr(self.rq, method)(*args, **kwargs)
+				self.invalidate(WRITE_METHODS[method])
+				return result
+
+		else:
+			raise AttributeError("Method '%s' is not available." %method)
+
+
+	def invalidate(self, modified=None):
+		""" Discard cached results which depend on any of the 'modified'
+			parts of the database, or all cached results if None. Must be
+			called with the lock held.
+		"""
+		if modified is None:
+			self.cache.clear()
+			return
+		modified = set(modified)
+		for key, (_, depends, _) in list(self.cache.items()):
+			if depends & modified:
+				del self.cache[key]
+
+
+	def serve_forever(self):
+		""" Start serving requests. Blocks until interrupted.
+		"""
+		print("Render queue server listening on %s" %(self.address, ))
+		try:
+			self.server.serve_forever()
+		except KeyboardInterrupt:
+			pass
+		finally:
+			self.server.server_close()
+
+# ----------------------------------------------------------------------------
+# End server classes
+# ============================================================================
+# Begin client class
+# ----------------------------------------------------------------------------
+
+class RenderQueueClient(object):
+	""" Client class providing the same interface as database.RenderQueue,
+		forwarding all calls to a render queue server.
+	"""
+	def __init__(self, address=DEFAULT_PORT, timeout=30):
+		self.family, self.address = parseAddress(address)
+		self.timeout = timeout
+		self.lock = threading.Lock()
+		self.sock = None
+		self.connect()
+
+		# Get database paths, needed for locating task logs etc.
+		self.db = self.call('getPaths')
+		print("Connected to render queue server at: %s" %(self.address, ))
+
+
+	def __getattr__(self, name):
+		""" Return a function to call the named method on the server.
+		"""
+		if name in READ_METHODS or name in WRITE_METHODS:
+			return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+		raise AttributeError(name)
+
+
+	def connect(self):
+		""" Open a connection to the server.
+		"""
+		self.close()
+		self.sock = socket.socket(self.family, socket.SOCK_STREAM)
+		self.sock.settimeout(self.timeout)
+		self.sock.connect(self.address)
+		self.rfile = self.sock.makefile('rb')
+
+
+	def close(self):
+		""" Close the connection to the server.
+		"""
+		if self.sock is not None:
+			try:
+				self.rfile.close()
+				self.sock.close()
+			except socket.error:
+				pass
+			self.sock = None
+
+
+	def call(self, method, *args, **kwargs):
+		""" Send a request to the server and return the result. If the
+			connection has dropped, reconnect and try once more, but only for
+			queries: a request which modifies the database may already have
+			been carried out, e.g. claiming a task, so it's not safe to repeat.
+			Raises RenderQueueServerError if the server reports an error.
+		"""
+		request = json.dumps({'method': method, 'args': args, 'kwargs': kwargs})
+		retries = 1 if method in READ_METHODS or method == 'getPaths' else 0
+		with self.lock:
+			for attempt in range(retries + 1):
+				try:
+					if self.sock is None:
+						self.connect()
+					self.sock.sendall((request + "\n").encode('utf-8'))
+					line = self.rfile.readline()
+					if not line:
+						raise socket.error("Connection closed by server")
+					break
+				except socket.error:
+					self.close()
+					if attempt == retries:
+						raise
+
+		response = json.loads(line.decode('utf-8'))
+		if 'error' in response:
+			raise RenderQueueServerError(response['error'])
+		return response['result']
+
+# ----------------------------------------------------------------------------
+# End client class
+# ============================================================================
+# Run as standalone server
+# ----------------------------------------------------------------------------
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Render Queue Server")
+	parser.add_argument('database',
+		help="path to the render queue database")
+	parser.add_argument('-a', '--address', default=str(DEFAULT_PORT),
+		help="address to listen on: 'host:port', 'port' (localhost) or UNIX socket path (default: %(default)s). "
+		"There is no authentication, so only listen on other interfaces on a trusted network")
+	parser.add_argument('-c', '--cache-ttl', type=float, default=5,
+		help="seconds to keep query results in memory (default: %(default)s)")
+	args = parser.parse_args()
+
+	server = RenderQueueServer(args.database, args.address, args.cache_ttl)
+	server.serve_forever()
+	sys.exit(0)
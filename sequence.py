@@ -151,6 +151,20 @@ def chunks(l, n):
 		yield l[i:i+n]
 
 
+def chunkRange(num_int_list, chunk_size):
+	""" Split a list of integers into chunks of up to 'chunk_size' values,
+		without spanning gaps in the sequence, and return a list of formatted
+		strings describing the range of each chunk.
+		e.g. [1, 2, 3, 4, 5, 20, 24], 2
+		returns ["1-2", "3-4", "5", "20", "24"]
+	"""
+	chunk_list = []
+	for seq in seqRange(num_int_list, gen_range=True):
+		for chunk in chunks(seq, chunk_size):
+			chunk_list.append(numRange(chunk))
+	return chunk_list
+
+
 def getBases(path, delimiter="."):
 	""" Find file sequence bases in path.
 		Returns a list of bases (the first part of the filename, stripped of
@@ -0,0 +1,178 @@
+#!/usr/bin/python
+
+# session.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2019
+#
+# Render Session - a small command loop to be run inside an application's
+# Python interpreter (mayapy, hython, nuke -t) by a worker in session mode.
+# The scene is loaded once, then tasks are read from stdin as lines of JSON
+# and rendered one after another, so the cost of starting the application
+# and loading the scene is paid once per job rather than once per task.
+#   -> {"frames": "1001-1010"}
+#   <- [RenderQueue] {"taskResult": 0}
+# Messages to the worker are prefixed with a marker so they can be told
+# apart from the application's own output, which is written to the task log.
+# The 'dummy' application simulates a slow-loading scene for testing, e.g.
+#   python session.py --app dummy --load-time 10 --frame-time 1
+
+
+import argparse
+import json
+import sys
+import time
+import traceback
+
+# Import custom modules
+import sequence
+
+
+MARKER = "[RenderQueue] "
+
+
+def send(**kwargs):
+	""" Send a message to the worker.
+	"""
+	sys.stdout.write(MARKER + json.dumps(kwargs) + "\n")
+	sys.stdout.flush()
+
+
+# ----------------------------------------------------------------------------
+# Application-specific scene loading and rendering
+# Each function loads the scene and returns a function to render a list of
+# frames (or None to render the frame range set in the scene).
+# ----------------------------------------------------------------------------
+
+def loadMaya(args):
+	import maya.standalone
+	maya.standalone.initialize(name='python')
+	from maya import cmds, mel
+
+	if args.project:
+		mel.eval('setProject "%s"' %args.project)
+	cmds.file(args.scene, open=True, force=True)
+	if args.renderer:
+		cmds.setAttr('defaultRenderGlobals.currentRenderer', args.renderer, type='string')
+	if args.layer:
+		cmds.editRenderLayerGlobals(currentRenderLayer=args.layer)
+
+	def render(frames):
+		if frames:
+			cmds.setAttr('defaultRenderGlobals.animation', 1)
+			cmds.setAttr('defaultRenderGlobals.startFrame', min(frames))
+			cmds.setAttr('defaultRenderGlobals.endFrame', max(frames))
+		mel.eval('mayaBatchRenderProcedure(0, "", "", "", "")')
+
+	return render
+
+
+def loadHoudini(args):
+	import hou
+
+	hou.hipFile.load(args.scene, suppress_save_prompt=True, ignore_load_warnings=True)
+	driver = hou.node(args.driver)
+
+	def render(frames):
+		if frames:
+			for first, last in sequence.seqRange(frames):
+				driver.render(frame_range=(first, last), verbose=True)
+		else:
+			driver.render(verbose=True)
+
+	return render
+
+
+def loadNuke(args):
+	import nuke
+
+	nuke.scriptOpen(args.scene)
+	if args.write:
+		nodes = [nuke.toNode(name) for name in args.write.split(',')]
+	else:
+		nodes = nuke.allNodes('Write')
+
+	def render(frames):
+		if frames:
+			ranges = [(first, last, 1) for first, last in sequence.seqRange(frames)]
+		else:
+			root = nuke.root()
+			ranges = [(root['first_frame'].value(), root['last_frame'].value(), 1)]
+		nuke.executeMultiple(nodes, ranges)
+
+	return render
+
+
+def loadDummy(args):
+	print("Loading scene...")
+	time.sleep(args.load_time)
+
+	def render(frames):
+		for frame in frames or [1]:
+			print("Rendering frame %d" %frame)
+			sys.stdout.flush()
+			time.sleep(args.frame_time)
+
+	return render
+
+
+APPS = {
+	'maya': loadMaya,
+	'houdini': loadHoudini,
+	'nuke': loadNuke,
+	'dummy': loadDummy,
+}
+
+
+# ----------------------------------------------------------------------------
+# Command loop
+# ----------------------------------------------------------------------------
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Render Queue Session")
+	parser.add_argument('--app', choices=sorted(APPS.keys()), required=True)
+	parser.add_argument('--scene', default="")
+	parser.add_argument('--project', default="")  # Maya
+	parser.add_argument('--renderer', default="")  # Maya
+	parser.add_argument('--layer', default="")  # Maya
+	parser.add_argument('--driver', default="")  # Houdini
+	parser.add_argument('--write', default="")  # Nuke
+	parser.add_argument('--load-time', type=float, default=5)  # Dummy
+	parser.add_argument('--frame-time', type=float, default=1)  # Dummy
+	args = parser.parse_args(argv)
+
+	# Load the scene
+	start = time.time()
+	try:
+		render = APPS[args.app](args)
+	except Exception:
+		traceback.print_exc()
+		send(ready=False)
+		return 1
+	sys.stdout.flush()
+	send(ready=True, loadTime=time.time()-start)
+
+	# Render tasks until told to quit
+	while True:
+		line = sys.stdin.readline()
+		if not line:
+			break  # Worker has gone away
+		request = json.loads(line)
+		if request.get('quit'):
+			break
+
+		frames = sequence.numList(request.get('frames', ""), quiet=True)
+		try:
+			render(frames)
+			sys.stdout.flush()
+			send(taskResult=0)
+		except Exception:
+			traceback.print_exc()
+			sys.stdout.flush()
+			send(taskResult=1)
+
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
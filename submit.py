@@ -24,6 +24,7 @@ import oswrapper
 import common
 import submit_deadline as deadline
 import database
+import rqserver
 import sequence
 #import settingsData
 #import userPrefs
@@ -376,7 +377,10 @@ class RenderSubmitUI(QtWidgets.QMainWindow, UI.TemplateUI):
 
 		# Show/hide specific UI elements based on selected queue manager
 		# rq_show_list = [self.ui.flags_label, self.ui.flags_lineEdit]
-		rq_show_list = [self.ui.interactiveLicense_checkBox]
+		rq_show_list = [self.ui.interactiveLicense_checkBox, 
+						self.ui.dependencies_label, self.ui.dependencies_lineEdit, 
+						self.ui.maxRetries_label, self.ui.maxRetries_spinBox, 
+						self.ui.adaptiveTaskSize_checkBox, self.ui.sessionMode_checkBox]
 		dl_show_list = [self.ui.group_label, self.ui.group_frame,
 						self.ui.pool2_comboBox, self.ui.getPools_toolButton]
 
@@ -795,13 +799,7 @@ class RenderSubmitUI(QtWidgets.QMainWindow, UI.TemplateUI):
 					self.ui.taskSize_spinBox.setEnabled(True)
 
 				# Generate task list for rendering
-				self.taskList = []
-				sequences = list(sequence.seqRange(self.numList, gen_range=True))
-				for seq in sequences:
-					chunks = list(sequence.chunks(seq, taskSize))
-					for chunk in chunks:
-						#self.taskList.append(list(sequence.seqRange(chunk))[0])
-						self.taskList.append(sequence.numRange(chunk))
+				self.taskList = sequence.chunkRange(self.numList, taskSize)
 
 				return True
 
@@ -1016,6 +1014,8 @@ class RenderSubmitUI(QtWidgets.QMainWindow, UI.TemplateUI):
 				if submit_args['frames']:
 					submit_args['taskSize'] = self.ui.taskSize_spinBox.value()
 					frames_msg = "%d frame(s) to be rendered; %d task(s) to be submitted.\n" %(len(self.numList), len(self.taskList))
+					if submit_args['adaptiveTaskSize']:
+						frames_msg = "%d frame(s) to be rendered. The task size will be set automatically from the render times of the first few frames.\n" %len(self.numList)
 				else:
 					submit_args['frames'] = "Unknown"
 					submit_args['taskSize'] = "Unknown"
@@ -1064,11 +1064,15 @@ class RenderSubmitUI(QtWidgets.QMainWindow, UI.TemplateUI):
 
 		submit_args['frames'] = self.ui.frames_lineEdit.text()
 		submit_args['taskSize'] = self.ui.taskSize_spinBox.value()
+		submit_args['adaptiveTaskSize'] = self.getCheckBoxValue(self.ui.adaptiveTaskSize_checkBox)  # RQ only
 		submit_args['pool'] = self.ui.pool_comboBox.currentText()
 		submit_args['secondaryPool'] = self.ui.pool2_comboBox.currentText()  # Deadline only
 		submit_args['group'] = self.ui.group_comboBox.currentText()  # Deadline only
 		submit_args['priority'] = self.ui.priority_spinBox.value()
 		submit_args['comment'] = self.ui.comment_lineEdit.text()
+		submit_args['dependencies'] = self.ui.dependencies_lineEdit.text()  # RQ only
+		submit_args['maxRetries'] = self.ui.maxRetries_spinBox.value()  # RQ only
+		submit_args['sessionMode'] = self.getCheckBoxValue(self.ui.sessionMode_checkBox)  # RQ only
 		submit_args['username'] = os.environ.get('IC_USERNAME', getpass.getuser())
 
 		# Environment variables...
@@ -1096,6 +1100,7 @@ class RenderSubmitUI(QtWidgets.QMainWindow, UI.TemplateUI):
 			#submit_args['flags'] = ""  # RQ only
 			submit_args['version'] = os.environ.get('MAYA_VER', "2018")  #jobData.getAppVersion('Maya')
 			submit_args['renderer'] = self.ui.renderer_comboBox.currentText()  # Maya submit only
+			submit_args['requiresGpu'] = submit_args['renderer'] == "redshift"  # RQ only
 			submit_args['camera'] = self.ui.camera_comboBox.currentText()
 
 			scene = self.makePathAbsolute(self.ui.mayaScene_comboBox.currentText()).replace("\\", "/")
@@ -1190,8 +1195,12 @@ class RenderSubmitUI(QtWidgets.QMainWindow, UI.TemplateUI):
 		try:  # If running from Render Queue main client UI
 			rq = self.parent.rq
 		except:  # Otherwise instatiate new Render Queue class
-			databaseLocation = '/mnt/anubis/PersonalJobs/999925_Mike_Bonnington/dev/renderqueue/rq_database'  # temp assignment - should read from prefs file
-			rq = database.RenderQueue(databaseLocation)
+			databaseServer = os.environ.get('RQ_SERVER')
+			if databaseServer:  # Submit via render queue server
+				rq = rqserver.RenderQueueClient(databaseServer)
+			else:
+				databaseLocation = '/mnt/anubis/PersonalJobs/999925_Mike_Bonnington/dev/renderqueue/rq_database'  # temp assignment - should read from prefs file
+				rq = database.RenderQueue(databaseLocation)
 
 		try:
 			jobNameBase = kwargs['jobName']
@@ -0,0 +1,365 @@
+#!/usr/bin/python
+
+# tasklog.py
+#
+# Mike Bonnington <mjbonnington@gmail.com>
+# (c) 2019
+#
+# Render Queue Task Logs
+# Functions to write and read the logs of render tasks.
+# While a task is rendering, its output is written to logs/<taskID>.log. The
+# log is capped in size: when it grows past the limit, it is compressed to
+# <taskID>.log.1.gz (earlier parts move to .log.2.gz and so on, and the
+# oldest is dropped) and a new log is started. When the task finishes, the
+# log is compressed and appended to <taskID>.log.gz, so each attempt at the
+# task is kept as a gzip member in the same file.
+# Logs are read from the end, so viewing the log of a verbose render never
+# loads the whole file.
+# Optionally, workers write logs to a folder on local disk instead and copy
+# new output to the shared log in large chunks every so often, which saves
+# the file server from a constant stream of small writes. LogServer serves
+# the local logs so the latest output can be fetched from the worker with
+# fetchLog() while the shared log is behind. The server is unauthenticated,
+# so it only listens on a single address: localhost by default, or the
+# address set with the 'taskLogBind' database config value. The Render Queue
+# binds it to the worker's farm IP address (the address viewers connect to)
+# unless 'taskLogBind' is set, e.g. to "" to listen on all interfaces.
+
+
+import gzip
+import json
+import os
+import re
+import shutil
+import socket
+import tempfile
+import threading
+
+try:
+	import socketserver
+except ImportError:
+	import SocketServer as socketserver  # Python 2.x
+
+
+# Default limits
+MAX_SIZE = 64  # Size of log before rotating (MB)
+BACKUPS = 2  # Number of rotated parts kept
+TAIL_SIZE = 64 * 1024  # Amount of a log to read when viewing (bytes)
+UPLOAD_INTERVAL = 30  # Seconds between copying local logs to the shared log
+
+CHUNK_SIZE = 64 * 1024
+LOCAL_DIR = os.path.join(tempfile.gettempdir(), 'renderqueue_logs')
+DEFAULT_PORT = 42078
+DEFAULT_BIND = 'localhost'
+
+
+def isTaskLog(filename, jobIDs=None):
+	""" Return True if 'filename' is a task log, including rotated and
+		compressed parts, optionally belonging to one of the given jobs.
+	"""
+	match = re.match(r'^(.+)_\d+\.log(\.\d+)?(\.gz)?$', filename)
+	if not match:
+		return False
+	return jobIDs is None or match.group(1) in jobIDs
+
+
+def compress(path, dest=None):
+	""" Compress the file at 'path', appending it to 'dest' (default: the
+		path with '.gz' added) as a new gzip member, then remove it.
+		Returns True if successful.
+	"""
+	if dest is None:
+		dest = path + '.gz'
+	try:
+		with open(path, 'rb') as f_in:
+			with gzip.open(dest, 'ab') as f_out:
+				shutil.copyfileobj(f_in, f_out, CHUNK_SIZE)
+		os.remove(path)
+		return True
+	except (IOError, OSError) as e:
+		print("Warning: Unable to compress log %s: %s" %(path, e))
+		return False
+
+
+def tail(path, size=TAIL_SIZE):
+	""" Return the last 'size' bytes of the log at 'path', starting at the
+		beginning of a line, and the offset to continue reading from with
+		follow(). If the task has finished and its log has been compressed,
+		the offset is None. Returns None if there is no log.
+	"""
+	try:
+		with open(path, 'rb') as f:
+			f.seek(0, os.SEEK_END)
+			end = f.tell()
+			start = max(0, end - size)
+			f.seek(start)
+			data = f.read(end - start)
+		if start:
+			data = data[data.find(b"\n") + 1:]
+		return decode(data), end
+
+	except (IOError, OSError):
+		pass
+
+	# Decompress finished log, keeping only the end of it
+	try:
+		data = b""
+		with gzip.open(path + '.gz', 'rb') as f:
+			for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+				data = (data + chunk)[-size:]
+		if len(data) == size:
+			data = data[data.find(b"\n") + 1:]
+		return decode(data), None
+
+	except (IOError, OSError, EOFError):
+		return None
+
+
+def follow(path, offset, size=TAIL_SIZE):
+	""" Return the complete lines written to the log at 'path' since
+		'offset', and the offset to continue reading from next time. If more
+		than 'size' bytes have been written, only the last 'size' bytes are
+		returned. If the log has been rotated, it is read from the start.
+		Returns an empty string and None when the log has been closed.
+	"""
+	try:
+		with open(path, 'rb') as f:
+			f.seek(0, os.SEEK_END)
+			end = f.tell()
+			if end < offset:
+				offset = 0
+			skip = end - offset > size
+			if skip:
+				offset = end - size
+			f.seek(offset)
+			data = f.read(end - offset)
+	except (IOError, OSError):
+		return "", None
+
+	if skip:
+		start = data.find(b"\n") + 1
+		data = data[start:]
+		offset += start
+	length = data.rfind(b"\n") + 1
+	return decode(data[:length]), offset + length
+
+
+def decode(data):
+	""" Decode log data, which may contain anything the renderer printed.
+	"""
+	return data.decode('utf-8', 'replace')
+
+
+class TaskLog(object):
+	""" File-like object to write a task log, rotating it when it reaches
+		'maxSize' bytes (zero for no limit) and keeping 'backups' rotated
+		parts. When the log is closed it is compressed if 'compressLog' is
+		True. Writes may come from several threads, e.g. the render output
+		and the task logger.
+		If 'localDir' is given, the log is written there and copied to the
+		shared log at 'path' every 'uploadInterval' seconds and when closed.
+		The shared log is always a copy of the start of the local log, so
+		offsets into either are interchangeable.
+	"""
+	def __init__(self, path, maxSize=0, backups=BACKUPS, compressLog=True, 
+		localDir=None, uploadInterval=UPLOAD_INTERVAL):
+		self.path = path
+		self.maxSize = maxSize
+		self.backups = backups
+		self.compressLog = compressLog
+		self.bytesWritten = 0  # Total written, for detecting stalled renders
+		self.lock = threading.Lock()
+
+		if localDir:
+			if not os.path.isdir(localDir):
+				os.makedirs(localDir)
+			self.localPath = os.path.join(localDir, os.path.basename(path))
+		else:
+			self.localPath = path
+		self.file = open(self.localPath, 'ab')
+		self.uploaded = self.file.tell()  # Amount of local log copied
+
+		# Copy the local log to the shared log periodically
+		self.closed = threading.Event()
+		if self.isLocal():
+			self.uploader = threading.Thread(target=self._upload, args=(uploadInterval, ))
+			self.uploader.daemon = True
+			self.uploader.start()
+
+
+	def isLocal(self):
+		""" Return True if the log is written to local disk.
+		"""
+		return self.localPath != self.path
+
+
+	def write(self, data):
+		""" Write data (text or bytes) to the log.
+		"""
+		if not isinstance(data, bytes):
+			data = data.encode('utf-8')
+		with self.lock:
+			if self.file is None:
+				return
+			self.file.write(data)
+			self.bytesWritten += len(data)
+			if self.maxSize and self.file.tell() >= self.maxSize:
+				self.rotate()
+
+
+	def flush(self):
+		""" Flush the log to disk.
+		"""
+		with self.lock:
+			if self.file is not None:
+				self.file.flush()
+
+
+	def upload(self):
+		""" Copy new output from the local log to the shared log. Must be
+			called with the lock held. Returns True if successful.
+		"""
+		self.file.flush()
+		end = self.file.tell()
+		if end <= self.uploaded:
+			return True
+		try:
+			with open(self.localPath, 'rb') as f_in:
+				f_in.seek(self.uploaded)
+				with open(self.path, 'ab') as f_out:
+					shutil.copyfileobj(f_in, f_out, end - self.uploaded)
+			self.uploaded = end
+			return True
+		except (IOError, OSError) as e:
+			print("Warning: Unable to copy log to %s: %s" %(self.path, e))
+			return False
+
+
+	def _upload(self, interval):
+		""" Call upload() every 'interval' seconds until the log is closed.
+		"""
+		while not self.closed.wait(interval):
+			with self.lock:
+				if self.file is not None:
+					self.upload()
+
+
+	def rotate(self):
+		""" Compress the current log to the first backup and start a new one.
+			Must be called with the lock held.
+		"""
+		self.file.close()
+		if self.backups:
+			for i in range(self.backups, 1, -1):
+				older = '%s.%d.gz' %(self.path, i-1)
+				if os.path.isfile(older):
+					os.rename(older, '%s.%d.gz' %(self.path, i))
+			backup = '%s.1.gz' %self.path
+			if os.path.isfile(backup):
+				os.remove(backup)
+			compress(self.localPath, backup)
+		if self.isLocal() and os.path.isfile(self.path):
+			os.remove(self.path)  # Superseded by the backup
+		self.file = open(self.localPath, 'wb')
+		self.uploaded = 0
+
+
+	def close(self):
+		""" Close the log, compressing it if required, and copy it to the
+			shared location if written locally. Further writes are ignored.
+		"""
+		with self.lock:
+			if self.file is None:
+				return
+			self.closed.set()
+			if self.compressLog:
+				self.file.close()
+				if compress(self.localPath, self.path + '.gz') and self.isLocal():
+					if os.path.isfile(self.path):
+						os.remove(self.path)  # Superseded by the compressed log
+			else:
+				uploaded = self.isLocal() and self.upload()
+				self.file.close()
+				if uploaded:
+					os.remove(self.localPath)
+			self.file = None
+
+
+# ----------------------------------------------------------------------------
+# Begin log server
+# ----------------------------------------------------------------------------
+
+class LogRequestHandler(socketserver.StreamRequestHandler):
+	""" Handle requests for logs. Each request and response is a single line
+		of JSON, e.g.
+		  -> {"taskID": "<jobID>_0001", "offset": null, "size": 65536}
+		  <- {"result": {"text": "...", "offset": 1234}}
+		The result has the same form as RenderQueue.tailTaskLog().
+	"""
+	def handle(self):
+		line = self.rfile.readline()
+		try:
+			request = json.loads(line.decode('utf-8'))
+			taskID = request['taskID']
+			if not re.match(r'^\w+$', taskID):
+				raise ValueError("Invalid task ID")
+			path = os.path.join(self.server.location, '%s.log' %taskID)
+			size = int(request.get('size', TAIL_SIZE))
+			offset = request.get('offset')
+			if offset is None:
+				result = tail(path, size)
+				if result is not None and result[1] is not None:
+					result = {'text': result[0], 'offset': result[1]}
+				else:
+					result = None  # Only logs still being written are served
+			else:
+				text, offset = follow(path, offset, size)
+				result = {'text': text, 'offset': offset}
+			response = {'result': result}
+		except Exception as e:
+			response = {'error': "%s: %s" %(type(e).__name__, e)}
+
+		self.wfile.write((json.dumps(response) + "\n").encode('utf-8'))
+
+
+class LogServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+	""" Serve the logs written to the local folder 'location', so viewers
+		can see the latest output of tasks rendering on this worker. Runs in
+		a background thread once started. Requests are not authenticated,
+		so only listen on 'host' if it's reachable by trusted machines only.
+	"""
+	allow_reuse_address = True
+	daemon_threads = True
+
+	def __init__(self, location=LOCAL_DIR, port=DEFAULT_PORT, host=DEFAULT_BIND):
+		socketserver.TCPServer.__init__(self, (host, port), LogRequestHandler)
+		self.location = location
+
+
+	def start(self):
+		""" Start serving requests in a background thread.
+		"""
+		thread = threading.Thread(target=self.serve_forever)
+		thread.daemon = True
+		thread.start()
+
+
+def fetchLog(host, taskID, offset=None, size=TAIL_SIZE, port=DEFAULT_PORT, timeout=2):
+	""" Fetch the end of a task log, or the lines written since 'offset',
+		from the log server on the worker rendering the task. Returns the
+		result in the same form as RenderQueue.tailTaskLog(), or None if the
+		worker doesn't have the log or can't be reached.
+	"""
+	request = json.dumps({'taskID': taskID, 'offset': offset, 'size': size})
+	try:
+		sock = socket.create_connection((host, port), timeout)
+		try:
+			sock.sendall((request + "\n").encode('utf-8'))
+			rfile = sock.makefile('rb')
+			line = rfile.readline()
+			rfile.close()
+		finally:
+			sock.close()
+		return json.loads(line.decode('utf-8')).get('result')
+	except (socket.error, ValueError):
+		return None
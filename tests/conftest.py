@@ -0,0 +1,71 @@
+# conftest.py
+#
+# Shared fixtures for the Render Queue tests.
+# Each test gets a new database in a temporary folder. The modules under
+# test are imported from the folder above.
+
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+
+
+@pytest.fixture
+def rq(tmp_path_factory):
+	""" Return a RenderQueue connected to a new, empty database. The folder
+		isn't named after the test, as the database identifies task folders
+		by name, e.g. 'completed'.
+	"""
+	return database.RenderQueue(str(tmp_path_factory.mktemp('rq') / 'database'))
+
+
+@pytest.fixture
+def makeJob(rq):
+	""" Return a function to submit a job with sensible defaults, taking
+		any job values as keyword arguments. Returns the job ID.
+	"""
+	def makeJob(**kwargs):
+		job = {
+			'jobName': 'test',
+			'jobType': 'Generic',
+			'frames': '1-10',
+			'taskSize': 5,
+			'priority': 50,
+			'username': 'tester',
+			'submitTime': '2019/01/01 00:00:00',
+			'pool': "None",
+			'tasks': ['1-5', '6-10'],
+		}
+		job.update(kwargs)
+		return rq.newJob(**job)
+	return makeJob
+
+
+@pytest.fixture
+def makeWorker(rq):
+	""" Return a function to create an enabled, online worker. Returns the
+		worker ID.
+	"""
+	def makeWorker(name='node', **kwargs):
+		kwargs.setdefault('ip_address', '127.0.0.1')
+		kwargs.setdefault('enable', True)
+		kwargs.setdefault('pool', "None")
+		workerID = rq.newWorker(name=name, **kwargs)
+		rq.checkinWorker(workerID, 'localhost')
+		return workerID
+	return makeWorker
+
+
+def taskState(rq, jobID, taskNo):
+	""" Return the name of the folder holding the task, e.g. 'queued', or
+		the worker ID if it's rendering, or None if it doesn't exist.
+	"""
+	taskID = rq.getTaskID(jobID, taskNo)
+	datafile = rq.findTasks(taskIDs=[taskID]).get(taskID)
+	if datafile is None:
+		return None
+	return os.path.basename(os.path.dirname(datafile))
@@ -0,0 +1,65 @@
+# test_adaptive.py
+#
+# Tests for adaptive task sizing.
+
+
+import time
+
+from conftest import taskState
+
+
+def renderProbe(rq, jobID, taskNo, workerID, duration):
+	""" Render a probe task, as if it took 'duration' seconds.
+	"""
+	assert rq.dequeueTask(jobID, taskNo, workerID)
+	datafile = rq.findTasks(taskIDs=[rq.getTaskID(jobID, taskNo)]).popitem()[1]
+	task = rq.read(datafile)
+	task['startTime'] = time.time() - duration
+	rq.write(task, datafile)
+	assert rq.completeTask(jobID, taskNo, workerID)
+
+
+def makeAdaptiveJob(makeJob, **kwargs):
+	return makeJob(frames='1-20', tasks=['1-10', '11-20'], taskSize=10, 
+		adaptiveTaskSize=True, **kwargs)
+
+
+def test_probes_are_rendered_first(rq, makeJob):
+	jobID = makeAdaptiveJob(makeJob)
+	job = rq.getJob(jobID)
+	assert job['tasks'] == ['1', '11', '20']
+	assert job['probeTasks'] == 3
+	assert job['pendingFrames'] == '2-10, 12-19'
+
+
+def test_tasks_sized_from_probe_render_times(rq, makeJob, makeWorker):
+	jobID = makeAdaptiveJob(makeJob, targetTaskDuration=350)
+	workerID = makeWorker()
+	renderProbe(rq, jobID, 0, workerID, 50)
+	renderProbe(rq, jobID, 1, workerID, 100)
+	assert rq.getJob(jobID)['pendingFrames']  # Waiting for the last probe
+	renderProbe(rq, jobID, 2, workerID, 500)
+
+	job = rq.getJob(jobID)
+	assert 'pendingFrames' not in job
+	assert job['taskSize'] == 3  # Median 100 seconds per frame
+	assert job['tasks'][3:] == ['2-4', '5-7', '8-10', '12-14', '15-17', '18-19']
+	for taskNo in range(3, 9):
+		assert taskState(rq, jobID, taskNo) == 'queued'
+
+
+def test_submitted_task_size_used_if_all_probes_fail(rq, makeJob, makeWorker):
+	jobID = makeAdaptiveJob(makeJob, maxRetries=0)
+	workerID = makeWorker()
+	for taskNo in range(3):
+		assert rq.dequeueTask(jobID, taskNo, workerID)
+		assert rq.failTask(jobID, taskNo, workerID)
+
+	job = rq.getJob(jobID)
+	assert job['taskSize'] == 10
+	assert len(job['tasks']) == 3 + 2
+
+
+def test_small_job_is_not_probed(rq, makeJob):
+	jobID = makeJob(frames='1-3', tasks=['1-3'], adaptiveTaskSize=True)
+	assert rq.getJob(jobID)['tasks'] == ['1-3']
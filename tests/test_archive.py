@@ -0,0 +1,60 @@
+# test_archive.py
+#
+# Tests for archiving jobs.
+
+
+import json
+import os
+
+import archive
+from conftest import taskState
+
+
+def test_archived_job_is_removed_and_can_be_read(rq, makeJob, makeWorker):
+	jobID = makeJob(jobName='shot010_comp')
+	workerID = makeWorker()
+	assert rq.dequeueTask(jobID, 0, workerID)
+	assert rq.completeTask(jobID, 0, workerID)
+
+	assert rq.archiveJob(jobID)
+	assert not rq.getJob(jobID)
+	assert rq.findTasks(jobIDs=[jobID]) == {}
+
+	record = rq.getArchivedJob(jobID)
+	assert record['job']['jobName'] == 'shot010_comp'
+	assert [(task['taskNo'], task['status']) for task in record['tasks']] == \
+		[(0, 'completed'), (1, 'queued')]
+	assert record['tasks'][0]['attempts'][0][:2] == ["Done", workerID]
+
+
+def test_find_archived_jobs(rq, makeJob):
+	jobA = makeJob(jobName='shot010_comp', username='alice')
+	jobB = makeJob(jobName='shot020_light', username='bob')
+	assert rq.archiveJobs([jobA]) == [jobA]
+	assert rq.archiveJobs([jobB]) == [jobB]  # Appended as a separate member
+
+	assert [entry['jobID'] for entry in rq.findArchivedJobs(username='bob')] == [jobB]
+	assert [entry['jobID'] for entry in rq.findArchivedJobs(jobName='COMP')] == [jobA]
+	assert rq.getArchivedJob(jobA)['job']['username'] == 'alice'
+	assert rq.getArchivedJob(jobB)['job']['username'] == 'bob'
+	assert rq.getArchivedJob('missing') is None
+	assert sorted(record['job']['jobID'] for record in rq.archive.readRecords()) == sorted([jobA, jobB])
+
+
+def test_archiving_releases_dependents(rq, makeJob):
+	jobA = makeJob()
+	jobB = makeJob(dependencies=jobA)
+	assert rq.archiveJobs([jobA]) == [jobA]
+	assert taskState(rq, jobB, 0) == 'queued'
+
+
+def test_migrate_loose_job_files(tmp_path):
+	with open(str(tmp_path / 'job1.json'), 'w') as f:
+		json.dump({'jobID': 'job1', 'jobName': 'old', 'username': 'carol'}, f)
+
+	jobArchive = archive.JobArchive(str(tmp_path))
+	assert jobArchive.migrate() == 1
+	assert not os.path.exists(str(tmp_path / 'job1.json'))
+	record = jobArchive.getJob('job1')
+	assert record['job'] == {'jobID': 'job1', 'jobName': 'old', 'username': 'carol'}
+	assert record['tasks'] == []
@@ -0,0 +1,108 @@
+# test_dependencies.py
+#
+# Tests for job dependencies and the release of waiting tasks.
+
+
+import threading
+
+import database
+from conftest import taskState
+
+
+def test_tasks_wait_for_dependency(rq, makeJob):
+	jobA = makeJob()
+	jobB = makeJob(dependencies=jobA)
+	assert taskState(rq, jobB, 0) == 'waiting'
+	assert taskState(rq, jobB, 1) == 'waiting'
+	assert jobB in rq.getJob(jobA)['dependents']
+
+
+def test_completed_frames_release_per_frame_dependents(rq, makeJob):
+	jobA = makeJob()
+	jobB = makeJob(dependencies='%s:perframe' %jobA)
+	assert rq.completeTask(jobA, 0)
+	assert taskState(rq, jobB, 0) == 'queued'
+	assert taskState(rq, jobB, 1) == 'waiting'
+	assert rq.completeTask(jobA, 1)
+	assert taskState(rq, jobB, 1) == 'queued'
+
+
+def test_frames_already_rendered_are_not_waited_for(rq, makeJob):
+	jobA = makeJob()
+	rq.completeTask(jobA, 0)
+	jobB = makeJob(dependencies='%s:perframe' %jobA)
+	assert taskState(rq, jobB, 0) == 'queued'
+	assert rq.read(rq.findTasks(taskIDs=[rq.getTaskID(jobB, 1)]).popitem()[1])['waitingFor'] == {jobA: '6-10'}
+
+
+def test_concurrent_releases_are_not_lost(rq, makeJob):
+	""" Two dependencies finishing at the same time must both be removed
+		from the waiting task.
+	"""
+	jobs = [makeJob(tasks=['1-10']) for i in range(8)]
+	jobB = makeJob(tasks=['1-10'], dependencies=", ".join(jobs))
+
+	def complete(jobID):
+		database.RenderQueue(rq.db['root']).completeTask(jobID, 0)
+
+	threads = [threading.Thread(target=complete, args=(jobID, )) for jobID in jobs]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+
+	assert taskState(rq, jobB, 0) == 'queued'
+
+
+def test_concurrent_submits_are_all_registered(rq, makeJob):
+	jobA = makeJob()
+	dependents = []
+
+	def submit():
+		client = database.RenderQueue(rq.db['root'])
+		dependents.append(client.newJob(jobName='dependent', priority=50, 
+			frames='1-10', tasks=['1-10'], dependencies=jobA))
+
+	threads = [threading.Thread(target=submit) for i in range(8)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+
+	assert sorted(rq.getJob(jobA)['dependents']) == sorted(dependents)
+
+
+def test_frames_completed_during_submit_release_tasks(rq, makeJob, monkeypatch):
+	""" A dependency task completed after the dependent job has looked up
+		the frames already rendered, but before its tasks are written, must
+		still release them.
+	"""
+	jobA = makeJob(tasks=['1-10'])
+	other = database.RenderQueue(rq.db['root'])
+	resolve = rq.resolveDependencies
+
+	def resolveThenComplete(dependencies):
+		resolved = resolve(dependencies)
+		thread = threading.Thread(target=other.completeTask, args=(jobA, 0))
+		thread.start()  # Waits for the new job's lock
+		thread.join(0.5)
+		resolveThenComplete.thread = thread
+		return resolved
+
+	monkeypatch.setattr(rq, 'resolveDependencies', resolveThenComplete)
+	jobB = makeJob(tasks=['1-10'], dependencies=jobA)
+	resolveThenComplete.thread.join()
+	assert taskState(rq, jobB, 0) == 'queued'
+
+
+def test_deleting_dependency_releases_tasks(rq, makeJob):
+	jobA = makeJob()
+	jobB = makeJob(dependencies=jobA)
+	rq.deleteJob(jobA)
+	assert taskState(rq, jobB, 0) == 'queued'
+
+
+def test_missing_dependency_is_ignored(rq, makeJob, caplog):
+	jobB = makeJob(dependencies='missing')
+	assert taskState(rq, jobB, 0) == 'queued'
+	assert "Dependency on job missing ignored" in caplog.text
@@ -0,0 +1,41 @@
+# test_events.py
+#
+# Tests for the event log.
+
+
+import json
+import os
+
+import events
+
+
+def writeShard(path, times):
+	with open(path, 'w') as f:
+		for i, timestamp in enumerate(times):
+			f.write(json.dumps({'event': 'test', 'time': timestamp, 'n': i}) + "\n")
+
+
+def test_shards_are_merged_in_time_order(tmp_path):
+	writeShard(str(tmp_path / 'a.jsonl'), [1, 3, 5])
+	writeShard(str(tmp_path / 'b.jsonl'), [2, 4])
+	times = [entry['time'] for entry in events.readEvents(str(tmp_path))]
+	assert times == [1, 2, 3, 4, 5]
+
+
+def test_time_range_keeps_events_appended_out_of_order(tmp_path):
+	writeShard(str(tmp_path / 'a.jsonl'), [1, 2, 6, 3, 4])
+	times = [entry['time'] for entry in events.readEvents(str(tmp_path), start=2, end=5)]
+	assert sorted(times) == [2, 3, 4]
+
+
+def test_bulk_task_events_record_worker(rq, makeJob, makeWorker):
+	jobID = makeJob()
+	workerID = makeWorker()
+	assert rq.dequeueTask(jobID, 0, workerID)
+	assert rq.dequeueTask(jobID, 1, workerID)
+	assert rq.completeTasks([(jobID, 0)]) == 1
+	assert rq.failTasks([(jobID, 1)]) == 1
+
+	entries = events.readEvents(rq.events.location, events=['complete', 'fail'])
+	assert [(entry['event'], entry['workerID']) for entry in entries] == \
+		[('complete', workerID), ('fail', workerID)]
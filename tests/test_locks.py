@@ -0,0 +1,70 @@
+# test_locks.py
+#
+# Tests for the named locks shared by clients of the database.
+
+
+import os
+import time
+
+import database
+
+
+def makeStale(rq, name):
+	""" Backdate a lock file so it looks abandoned.
+	"""
+	lockfile = os.path.join(rq.db['config'], '%s.lock' %name)
+	old = time.time() - 3600
+	os.utime(lockfile, (old, old))
+	return lockfile
+
+
+def test_lock_is_exclusive(rq):
+	other = database.RenderQueue(rq.db['root'])
+	assert rq.acquireLock('test')
+	assert not other.acquireLock('test')
+	rq.releaseLock('test')
+	assert other.acquireLock('test')
+
+
+def test_lease_is_renewed_by_holder_only(rq):
+	other = database.RenderQueue(rq.db['root'])
+	assert rq.acquireLock('lease', renew=True)
+	assert rq.acquireLock('lease', renew=True)
+	assert not other.acquireLock('lease', renew=True)
+
+
+def test_stale_lock_is_broken_by_one_client(rq):
+	first = database.RenderQueue(rq.db['root'])
+	second = database.RenderQueue(rq.db['root'])
+	assert rq.acquireLock('test')
+	makeStale(rq, 'test')
+	assert first.acquireLock('test', timeout=60)
+	assert not second.acquireLock('test', timeout=60)
+
+
+def test_lock_created_since_is_not_removed(rq):
+	""" A client which found a stale lock must not remove a lock another
+		client created after breaking it.
+	"""
+	other = database.RenderQueue(rq.db['root'])
+	assert rq.acquireLock('test')
+	lockfile = makeStale(rq, 'test')
+	with open(lockfile) as f:
+		stale = f.read()
+
+	# Another client breaks the stale lock and takes it
+	assert other.acquireLock('test', timeout=60)
+
+	# The first client's attempt to remove the stale lock now fails
+	assert not rq.removeLockFile(lockfile, stale)
+	with open(lockfile) as f:
+		assert f.read().split(' ')[0] == other.clientID
+
+
+def test_release_leaves_other_clients_lock(rq):
+	other = database.RenderQueue(rq.db['root'])
+	assert rq.acquireLock('test')
+	makeStale(rq, 'test')
+	assert other.acquireLock('test', timeout=60)
+	rq.releaseLock('test')  # Lock was taken over while stale
+	assert not rq.acquireLock('test')
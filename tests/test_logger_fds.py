@@ -0,0 +1,62 @@
+# test_logger_fds.py
+#
+# Task logger leak check.
+# Sets up and closes a task logger for each of many simulated tasks, the way
+# the worker does, and checks that the number of open file descriptors,
+# threads and registered loggers is the same afterwards, in both direct and
+# queued logging modes.
+
+
+import logging
+import os
+import threading
+
+import pytest
+
+import common
+
+
+TASKS = 10000
+
+
+def countFds():
+	""" Return the number of file descriptors open in this process, or None
+		if it can't be determined (Linux only).
+	"""
+	try:
+		return len(os.listdir('/proc/self/fd'))
+	except OSError:
+		return None
+
+
+def getCounts(name):
+	""" Return the resources which should not grow as tasks are logged.
+	"""
+	return {
+		'fds': countFds(),
+		'threads': threading.active_count(),
+		'handlers': len(logging.getLogger(name).handlers),
+		'loggers': len(logging.Logger.manager.loggerDict),
+		'registered': len(common.loggers),
+	}
+
+
+@pytest.mark.parametrize('queued', [False, True])
+def test_task_loggers_do_not_leak(tmp_path, queued):
+	if queued and common.QueueHandler is None:
+		pytest.skip("Queued logging not available")
+
+	name = 'logger_fds_probe'
+	before = getCounts(name)
+
+	for i in range(TASKS):
+		logger_name = 'task_%04d_logger' %i
+		logger = common.setup_logger(logger_name, 
+			str(tmp_path / ('task_%04d.log' %i)), queued=queued)
+		logger.info("Render completed successfully")
+		assert logger.handlers == logging.getLogger(logger_name).handlers
+		common.close_logger(logger_name)
+		assert not logger.handlers
+
+	assert getCounts(name) == before
+	assert os.path.getsize(str(tmp_path / ('task_%04d.log' %(TASKS-1)))) > 0
@@ -0,0 +1,69 @@
+# test_reaper.py
+#
+# Tests for requeueing tasks held by workers which have stopped checking in.
+
+
+import os
+import time
+
+import database
+from conftest import taskState
+
+
+def stopWorker(rq, workerID, age=600):
+	""" Make the worker look as if it last checked in 'age' seconds ago.
+	"""
+	then = time.time() - age
+	os.utime(rq.getWorkerDatafile(workerID), (then, then))
+
+
+def test_orphaned_task_is_requeued(rq, makeJob, makeWorker):
+	jobID = makeJob()
+	workerID = makeWorker()
+	assert rq.dequeueTask(jobID, 0, workerID)
+	stopWorker(rq, workerID)
+
+	assert rq.reapOrphanedTasks(timeout=60) == [rq.getTaskID(jobID, 0)]
+	assert taskState(rq, jobID, 0) == 'queued'
+	task = rq.read(os.path.join(rq.db['queued'], '%s.json' %rq.getTaskID(jobID, 0)))
+	assert task['attempts'][-1]['result'] == "Orphaned"
+	assert task['attempts'][-1]['workerID'] == workerID
+
+
+def test_live_worker_keeps_its_task(rq, makeJob, makeWorker):
+	jobID = makeJob()
+	workerID = makeWorker()
+	assert rq.dequeueTask(jobID, 0, workerID)
+
+	assert rq.reapOrphanedTasks(timeout=60) == []
+	assert taskState(rq, jobID, 0) == workerID
+
+
+def test_only_lease_holder_reaps(rq, makeJob, makeWorker):
+	other = database.RenderQueue(rq.db['root'])
+	assert rq.reapOrphanedTasks(timeout=60) == []
+	assert other.reapOrphanedTasks(timeout=60) is None
+	assert rq.reapOrphanedTasks(timeout=60) == []
+
+
+def test_completion_while_reaping_is_refused(rq, makeJob, makeWorker, monkeypatch):
+	""" A worker finishing its task while it's being reaped mustn't leave
+		the task both completed and queued.
+	"""
+	jobID = makeJob()
+	workerID = makeWorker()
+	assert rq.dequeueTask(jobID, 0, workerID)
+	stopWorker(rq, workerID)
+
+	worker = database.RenderQueue(rq.db['root'])
+	completed = []
+	recordAttempt = rq.recordAttempt
+	def recordAttemptAndComplete(task, result, resources=None):
+		completed.append(worker.completeTask(jobID, 0, workerID))
+		recordAttempt(task, result, resources)
+	monkeypatch.setattr(rq, 'recordAttempt', recordAttemptAndComplete)
+
+	assert rq.reapOrphanedTasks(timeout=60) == [rq.getTaskID(jobID, 0)]
+	assert len(completed) == 1 and not completed[0]
+	assert taskState(rq, jobID, 0) == 'queued'
+	assert not os.listdir(rq.db['completed'])
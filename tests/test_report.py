@@ -0,0 +1,71 @@
+# test_report.py
+#
+# Tests for the farm usage report.
+
+
+import time
+
+import report
+
+
+def getRow(results, group, key):
+	return [row for row in results[group] if row['key'] == key][0]
+
+
+def test_count_frames():
+	assert report.countFrames('1-10') == 10
+	assert report.countFrames('1-5, 10, 20-21') == 8
+	assert report.countFrames('1-5, 10, 20-21') == 8  # Cached
+	assert report.countFrames('') == 0
+
+
+def test_render_statistics():
+	rpt = report.Report()
+	rpt.add({'event': 'submit', 'time': 0, 'jobID': 'job1', 'jobName': 'shot', 
+		'username': 'tester', 'priority': 50, 'tasks': 2})
+	rpt.add({'event': 'dequeue', 'time': 10, 'jobID': 'job1', 'taskNo': 0, 'workerID': 'w1'})
+	rpt.add({'event': 'dequeue', 'time': 30, 'jobID': 'job1', 'taskNo': 1, 'workerID': 'w2'})
+	rpt.add({'event': 'complete', 'time': 130, 'jobID': 'job1', 'taskNo': 0, 
+		'workerID': 'w1', 'frames': '1-5', 'duration': 120})
+	rpt.add({'event': 'fail', 'time': 90, 'jobID': 'job1', 'taskNo': 1, 
+		'workerID': 'w2', 'frames': '6-10', 'duration': 60, 'retry': False})
+	results = rpt.getResults()
+
+	job = getRow(results, 'job', 'job1')
+	assert (job['tasks'], job['failed'], job['frames']) == (2, 1, 5)
+	assert job['jobName'] == 'shot'
+	assert job['meanRenderTime'] == 90
+	assert (job['meanQueueWait'], job['maxQueueWait']) == (20, 30)
+	assert getRow(results, 'user', 'tester')['tasks'] == 2
+	assert getRow(results, 'priority', 50)['tasks'] == 2
+	assert getRow(results, 'worker', 'w1')['frames'] == 5
+	assert getRow(results, 'worker', 'w2')['failed'] == 1
+	assert sum(row['nodeHours'] for row in results['hour']) == round(180 / 3600.0, 3)
+
+
+def test_retried_task_waits_from_retry_time():
+	rpt = report.Report()
+	rpt.add({'event': 'submit', 'time': 0, 'jobID': 'job1', 'priority': 50, 'tasks': 1})
+	rpt.add({'event': 'dequeue', 'time': 0, 'jobID': 'job1', 'taskNo': 0})
+	rpt.add({'event': 'fail', 'time': 10, 'jobID': 'job1', 'taskNo': 0, 
+		'duration': 10, 'retry': True, 'notBefore': 40})
+	rpt.add({'event': 'dequeue', 'time': 50, 'jobID': 'job1', 'taskNo': 0})
+	assert getRow(rpt.getResults(), 'job', 'job1')['maxQueueWait'] == 10
+
+
+def test_report_period(rq, makeJob, makeWorker):
+	""" Tasks queued before the report period still have their wait times
+		counted, but only events inside the period are reported.
+	"""
+	jobID = makeJob()
+	workerID = makeWorker()
+	assert rq.dequeueTask(jobID, 0, workerID)
+	assert rq.completeTask(jobID, 0, workerID)
+
+	rpt = report.Report()
+	rpt.read(rq.events.location)
+	assert getRow(rpt.getResults(), 'job', jobID)['tasks'] == 1
+
+	rpt = report.Report()
+	rpt.read(rq.events.location, start=time.time() + 60)
+	assert rpt.getResults()['job'] == []
@@ -0,0 +1,44 @@
+# test_requeue.py
+#
+# Tests for requeuing tasks.
+
+
+from conftest import taskState
+
+
+def test_requeue_task_from_worker(rq, makeJob, makeWorker):
+	jobID = makeJob()
+	workerID = makeWorker()
+	task = rq.claimTask(workerID)
+	assert taskState(rq, jobID, task['taskNo']) == workerID
+	assert rq.requeueTask(jobID, task['taskNo'])
+	assert taskState(rq, jobID, task['taskNo']) == 'queued'
+
+
+def test_requeue_task_leaves_waiting_task(rq, makeJob):
+	jobA = makeJob()
+	jobB = makeJob(dependencies=jobA)
+	assert not rq.requeueTask(jobB, 0)
+	assert taskState(rq, jobB, 0) == 'waiting'
+
+
+def test_requeue_tasks_leaves_waiting_tasks(rq, makeJob, makeWorker):
+	jobA = makeJob()
+	jobB = makeJob(dependencies='%s:perframe' %jobA)
+	rq.completeTask(jobA, 0)  # Releases the first task of job B
+	workerID = makeWorker()
+	assert rq.dequeueTask(jobA, 1, workerID)
+
+	assert rq.requeueTasks([(jobA, 1), (jobB, 0), (jobB, 1)]) == 1
+	assert taskState(rq, jobA, 1) == 'queued'
+	assert taskState(rq, jobB, 0) == 'queued'
+	assert taskState(rq, jobB, 1) == 'waiting'
+
+
+def test_requeue_jobs_leaves_waiting_tasks(rq, makeJob):
+	jobA = makeJob()
+	jobB = makeJob(dependencies=jobA)
+	rq.completeTask(jobA, 0)
+	assert rq.requeueJobs([jobA, jobB]) == 1
+	assert taskState(rq, jobA, 0) == 'queued'
+	assert taskState(rq, jobB, 0) == 'waiting'
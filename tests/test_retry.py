@@ -0,0 +1,74 @@
+# test_retry.py
+#
+# Tests for retrying failed tasks with backoff, and excluding workers which
+# repeatedly fail a job.
+
+
+import os
+import time
+
+from conftest import taskState
+
+
+def failOn(rq, jobID, taskNo, workerID):
+	""" Dequeue the task on the worker and fail it. Returns the task data.
+	"""
+	assert rq.dequeueTask(jobID, taskNo, workerID)
+	assert rq.failTask(jobID, taskNo, workerID)
+	return rq.read(rq.findTasks(taskIDs=[rq.getTaskID(jobID, taskNo)]).popitem()[1])
+
+
+def test_failed_task_is_retried_with_backoff(rq, makeJob, makeWorker):
+	jobID = makeJob(maxRetries=2, retryDelay=100, maxWorkerFailures=10)
+	workerID = makeWorker()
+
+	start = time.time()
+	task = failOn(rq, jobID, 0, workerID)
+	assert taskState(rq, jobID, 0) == 'queued'
+	assert start + 100 <= task['notBefore'] <= time.time() + 100
+
+	start = time.time()
+	task = failOn(rq, jobID, 0, workerID)
+	assert taskState(rq, jobID, 0) == 'queued'
+	assert start + 200 <= task['notBefore'] <= time.time() + 200
+
+	task = failOn(rq, jobID, 0, workerID)
+	assert taskState(rq, jobID, 0) == 'failed'
+	assert [attempt['result'] for attempt in task['attempts']] == ["Failed"]*3
+
+
+def test_task_is_not_dispatched_before_retry_delay(rq, makeJob, makeWorker):
+	jobID = makeJob(tasks=['1-10'], retryDelay=100)
+	workerID = makeWorker()
+	failOn(rq, jobID, 0, workerID)
+	assert rq.getTaskToRender(workerID) is None
+
+	datafile = os.path.join(rq.db['queued'], '%s.json' %rq.getTaskID(jobID, 0))
+	task = rq.read(datafile)
+	task['notBefore'] = time.time() - 1
+	rq.write(task, datafile)
+	assert rq.getTaskToRender(workerID)['taskNo'] == 0
+
+
+def test_task_failed_without_worker_is_not_retried(rq, makeJob, makeWorker):
+	jobID = makeJob()
+	assert rq.dequeueTask(jobID, 0, makeWorker())
+	assert rq.failTask(jobID, 0)
+	assert taskState(rq, jobID, 0) == 'failed'
+
+
+def test_worker_excluded_after_repeated_failures(rq, makeJob, makeWorker):
+	jobID = makeJob(tasks=['1-3', '4-6', '7-10'], retryDelay=0, maxWorkerFailures=2)
+	workerA = makeWorker('nodeA')
+	workerB = makeWorker('nodeB')
+	failOn(rq, jobID, 0, workerA)
+	assert rq.getTaskToRender(workerA) is not None
+	failOn(rq, jobID, 1, workerA)
+
+	assert rq.getJob(jobID)['blacklist'] == [workerA]
+	assert rq.getTaskToRender(workerA) is None
+	assert rq.getTaskToRender(workerB) is not None
+
+	rq.requeueJob(jobID)
+	assert rq.getJob(jobID)['blacklist'] == []
+	assert rq.getTaskToRender(workerA) is not None
@@ -0,0 +1,34 @@
+# test_rqserver.py
+#
+# Tests for the render queue server's query cache.
+
+
+import os
+
+import rqserver
+
+
+def test_write_invalidates_dependent_queries(rq, makeJob, makeWorker):
+	""" Every part of the database a write method modifies must be listed,
+		otherwise queries are served stale results from the cache.
+	"""
+	jobID = makeJob()
+	workerID = makeWorker()
+	server = rqserver.RenderQueueServer(rq.db['root'], 
+		os.path.join(rq.db['root'], 'rqserver.sock'), cache_ttl=60)
+	try:
+		assert server.dispatch('getUsage') == {'users': {}, 'jobs': {}}
+		assert server.dispatch('dequeueTask', [jobID, 0, workerID])
+		datafile = rq.findTasks(taskIDs=[rq.getTaskID(jobID, 0)]).popitem()[1]
+		task = rq.read(datafile)
+		task['startTime'] -= 60
+		rq.write(task, datafile)
+		assert server.dispatch('failTask', [jobID, 0, workerID])
+		assert 'tester' in server.dispatch('getUsage')['users']
+	finally:
+		server.server.server_close()
+
+
+def test_write_methods_exist():
+	for method in list(rqserver.READ_METHODS) + list(rqserver.WRITE_METHODS):
+		assert callable(getattr(rqserver.database.RenderQueue, method))
@@ -0,0 +1,67 @@
+# test_split.py
+#
+# Tests for splitting queued tasks.
+
+
+import threading
+
+import sequence
+
+
+def getFrames(rq, jobID):
+	""" Return the frames of all the job's tasks, read from the task files.
+	"""
+	frames = []
+	for datafile in rq.findTasks(jobIDs=[jobID]).values():
+		frames += sequence.numList(rq.read(datafile)['frames'], quiet=True)
+	return sorted(frames)
+
+
+def test_split_task(rq, makeJob):
+	jobID = makeJob(frames='1-10', tasks=['1-10'])
+	assert rq.splitTask(jobID, 0, parts=3) == 2
+	assert rq.getJob(jobID)['tasks'] == ['1-4', '5-8', '9-10']
+	assert len(rq.findTasks(jobIDs=[jobID])) == 3
+	assert getFrames(rq, jobID) == list(range(1, 11))
+
+
+def test_single_frame_task_is_not_split(rq, makeJob):
+	jobID = makeJob(frames='1', tasks=['1'])
+	assert rq.splitTask(jobID, 0) == 0
+	assert rq.getJob(jobID)['tasks'] == ['1']
+
+
+def test_dequeued_task_is_not_split(rq, makeJob, makeWorker):
+	jobID = makeJob()
+	assert rq.dequeueTask(jobID, 0, makeWorker())
+	assert rq.splitTask(jobID, 0) == 0
+	assert len(rq.getJob(jobID)['tasks']) == 2
+
+
+def test_split_during_job_writes_keeps_task_numbers(rq, makeJob):
+	""" Other writes to the job data file mustn't overwrite the tasks added
+		by a split, otherwise the next split would reuse their numbers.
+	"""
+	jobID = makeJob(frames='1-64', tasks=['1-64'])
+	done = threading.Event()
+
+	def setPriorities():
+		priority = 0
+		while not done.is_set():
+			priority = (priority + 1) % 100
+			rq.setPriority(jobID, priority)
+
+	thread = threading.Thread(target=setPriorities)
+	thread.start()
+	try:
+		for i in range(20):
+			for taskNo in range(len(rq.getJob(jobID)['tasks'])):
+				rq.splitTask(jobID, taskNo)
+	finally:
+		done.set()
+		thread.join()
+
+	tasks = rq.getJob(jobID)['tasks']
+	assert len(tasks) > 1
+	assert len(rq.findTasks(jobIDs=[jobID])) == len(tasks)
+	assert getFrames(rq, jobID) == list(range(1, 65))
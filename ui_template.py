@@ -12,6 +12,7 @@
 # Currently only Maya and Nuke are supported.
 
 
+import collections
 import json
 import os
 import platform
@@ -32,6 +33,9 @@ import rsc_rc  # Import resource file as generated by pyside-rcc
 # The vendor string must be set in order to store window geometry
 VENDOR = "UNIT"
 
+# Maximum number of icons and tinted pixmaps to keep in the icon cache
+ICON_CACHE_SIZE = 256
+
 
 # ----------------------------------------------------------------------------
 # Settings data class
@@ -79,6 +83,36 @@ class SettingsData(object):
 # ----------------------------------------------------------------------------
 # End of settings data class
 # ============================================================================
+# Icon cache
+# ----------------------------------------------------------------------------
+
+# Icons and tinted pixmaps, shared by all windows, so each image is only
+# loaded and tinted once. The least recently used are discarded when the
+# cache is full.
+icon_cache = collections.OrderedDict()
+
+
+def getCachedIcon(key):
+	""" Return the cached icon or pixmap for 'key', or None.
+	"""
+	try:
+		value = icon_cache.pop(key)
+	except KeyError:
+		return None
+	icon_cache[key] = value  # Mark as most recently used
+	return value
+
+
+def cacheIcon(key, value):
+	""" Add an icon or pixmap to the cache.
+	"""
+	icon_cache[key] = value
+	while len(icon_cache) > ICON_CACHE_SIZE:
+		icon_cache.popitem(last=False)
+
+# ----------------------------------------------------------------------------
+# End of icon cache
+# ============================================================================
 # Main window class
 # ----------------------------------------------------------------------------
 
@@ -109,8 +143,11 @@ class TemplateUI(object):
 			print(prefs_file)
 			self.prefs.read()
 
-		# Load UI file
-		self.ui = QtCompat.loadUi(self.checkFilePath(ui_file), self)
+		# Load UI - use the compiled UI module, compiling it if necessary, as
+		# it's much quicker than parsing the UI file
+		self.ui = self.loadCompiledUI(ui_file)
+		if self.ui is None:
+			self.ui = QtCompat.loadUi(self.checkFilePath(ui_file), self)
 
 		# Store some system UI colours & define colour palette
 		tmpWidget = QtWidgets.QWidget()
@@ -176,6 +213,56 @@ class TemplateUI(object):
 		self.shortcutReloadStyleSheet.activated.connect(self.loadStyleSheet)
 
 
+	def loadCompiledUI(self, ui_file):
+		""" Set up the UI from the Python module compiled from 'ui_file' by
+			compile_ui.py, e.g. renderqueue_ui.py for renderqueue.ui. As with
+			QtCompat.loadUi(), widgets are added as attributes of this
+			window. If the module doesn't exist or is older than the UI file,
+			the UI file is compiled first, so this is only slow the first
+			time a window is opened after the UI file has changed. Returns
+			None if the UI can't be compiled, e.g. because there is no
+			compiler for the Qt binding in use.
+		"""
+		uifile = self.checkFilePath(ui_file)
+		if uifile is None:
+			return None
+		pyfile = '%s_ui.py' %os.path.splitext(uifile)[0]
+		try:
+			compiled = os.path.getmtime(pyfile) >= os.path.getmtime(uifile)
+		except OSError:
+			compiled = False
+		if not compiled:
+			import compile_ui
+			if not compile_ui.compileFile(uifile):
+				return None
+
+		name = os.path.splitext(os.path.basename(pyfile))[0]
+		try:
+			try:
+				import importlib.util
+				spec = importlib.util.spec_from_file_location(name, pyfile)
+				module = importlib.util.module_from_spec(spec)
+				spec.loader.exec_module(module)
+			except ImportError:  # Python 2.x
+				import imp
+				module = imp.load_source(name, pyfile)
+		except (ImportError, SyntaxError) as e:
+			print("Warning: Unable to load compiled UI %s: %s" %(pyfile, e))
+			return None
+
+		for attr in dir(module):
+			if attr.startswith('Ui_'):
+				form = getattr(module, attr)()
+				break
+		else:
+			return None
+
+		form.setupUi(self)
+		for attr, widget in vars(form).items():
+			setattr(self, attr, widget)
+		return self
+
+
 	def getInfo(self):
 		""" Return some version info about Python, Qt, binding, etc.
 		"""
@@ -498,7 +585,15 @@ class TemplateUI(object):
 			states.
 			tintNormal (bool): whether to tint the normal state icon or leave
 			it as-is.
+			Icons are cached, keyed by the colours used, so they are only
+			generated again if the UI colours change.
 		"""
+		key = ('icon', icon_name, tintNormal, self.col['text'].rgba(), 
+			self.col['disabled'].rgba(), self.col['highlighted-text'].rgba())
+		icon = getCachedIcon(key)
+		if icon is not None:
+			return icon
+
 		icon = QtGui.QIcon()
 		if tintNormal:
 			icon.addPixmap(self.iconTint(icon_name, self.col['text']), QtGui.QIcon.Normal, QtGui.QIcon.Off)
@@ -507,13 +602,20 @@ class TemplateUI(object):
 		icon.addPixmap(self.iconTint(icon_name, self.col['disabled']), QtGui.QIcon.Disabled, QtGui.QIcon.Off)
 		icon.addPixmap(self.iconTint(icon_name, self.col['highlighted-text']), QtGui.QIcon.Active, QtGui.QIcon.Off)
 		icon.addPixmap(self.iconTint(icon_name, self.col['highlighted-text']), QtGui.QIcon.Selected, QtGui.QIcon.Off)
+		cacheIcon(key, icon)
 		return icon
 
 
 	def iconTint(self, icon_name, tint=None):
 		""" Return a QIcon using the specified PNG image.
 			If tint (QColor) is given, tint the image with the given color.
+			Pixmaps are cached.
 		"""
+		key = ('pixmap', icon_name, None if tint is None else QtGui.QColor(tint).rgba())
+		pixmap = getCachedIcon(key)
+		if pixmap is not None:
+			return pixmap
+
 		if icon_name.endswith('svg'):
 			w, h = 64, 64
 			svg_renderer = QtSvg.QSvgRenderer(self.checkFilePath('icons/%s' %icon_name))
@@ -534,6 +636,7 @@ class TemplateUI(object):
 			painter.drawRect(pixmap.rect())
 			painter.end()
 
+		cacheIcon(key, pixmap)
 		return pixmap
 
 
@@ -794,9 +897,9 @@ class TemplateUI(object):
 		if os.path.isfile(filename):
 			return filename
 		else:
-			# Append current dir to searchpath and try each in turn
-			searchpath.append(os.path.dirname(__file__))
-			for folder in searchpath:
+			# Append current dir to searchpath and try each in turn (without
+			# modifying the list passed in, or the default)
+			for folder in searchpath + [os.path.dirname(__file__)]:
 				filepath = os.path.join(folder, filename)
 				if os.path.isfile(filepath):
 					return filepath
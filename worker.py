@@ -9,9 +9,13 @@
 # and interfaces with the various plugins.
 
 
+import json
 import os
 import platform
+import signal
 import subprocess
+import threading
+import time
 
 from Qt import QtCore
 
@@ -19,9 +23,215 @@ from Qt import QtCore
 import common
 import oswrapper
 import sequence
+import tasklog
 
 
+# Persistent render sessions, keyed by worker ID
+sessions = {}
+
+# Held while a render process is reaped or signalled, so a process is never
+# signalled after it has been reaped, when its ID may have been reused
+reapLock = threading.Lock()
+
+
+def processGroupArgs():
+	""" Return keyword arguments for subprocess.Popen to start a process in
+		a new process group, so it can be killed along with any child
+		processes it spawns.
+	"""
+	if platform.system() == "Windows":
+		return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+	else:
+		return {'preexec_fn': os.setsid}
+
+
+def getProcessGroup(pgid):
+	""" Return the IDs of the processes in the specified process group,
+		read from /proc (Linux only).
+	"""
+	pids = []
+	for name in os.listdir('/proc'):
+		if not name.isdigit():
+			continue
+		try:
+			with open('/proc/%s/stat' %name) as f:
+				fields = f.read().rsplit(')', 1)[1].split()  # From field 3
+			if int(fields[2]) == pgid:
+				pids.append(int(name))
+		except (IOError, OSError, ValueError, IndexError):
+			pass  # Process has exited
+	return pids
+
+
+def pollProcess(process):
+	""" Check if a process has exited, reaping it if so. Returns the exit
+		code, or None if it's still running. Processes which may be killed
+		with killProcessGroup() must only be reaped with this function.
+	"""
+	with reapLock:
+		return process.poll()
+
+
+def signalProcessGroup(process, sig):
+	""" Send a signal to a process started with processGroupArgs() and its
+		child processes, unless the process has already been reaped.
+		Returns True if the signal was sent.
+	"""
+	with reapLock:
+		if process.returncode is not None:
+			return False
+		try:
+			if platform.system() == "Windows":
+				subprocess.call(['taskkill', '/F', '/T', '/PID', str(process.pid)])
+			else:
+				os.killpg(process.pid, sig)
+			return True
+		except OSError:
+			return False  # Process group has already exited
+
+
+def killProcessGroup(process, grace=5):
+	""" Terminate a process started with processGroupArgs() along with its
+		child processes. Anything still running after 'grace' seconds is
+		killed. The process isn't reaped here, that's left to the thread
+		waiting for it, but this returns as soon as it has been.
+	"""
+	if platform.system() == "Windows":
+		signalProcessGroup(process, None)
+		return
+
+	if not signalProcessGroup(process, signal.SIGTERM):
+		return
+
+	for i in range(int(grace*10)):
+		if process.returncode is not None:
+			break
+		time.sleep(0.1)
+
+	# Kill any remaining processes in the group, including children which
+	# outlived the main process. Once the main process has been reaped its
+	# process group ID may be reused, so the children can't be killed.
+	signalProcessGroup(process, signal.SIGKILL)
+
+
+# ----------------------------------------------------------------------------
+# Begin render session class
+# ----------------------------------------------------------------------------
+
+class RenderSession(object):
+	""" A persistent application process which keeps a job's scene loaded
+		and renders consecutive tasks from the same job. The process runs
+		the command loop in session.py.
+	"""
+	def __init__(self, jobID, args):
+		self.jobID = jobID
+		self.args = args
+		self.process = None
+		self.loadTime = None
+		self.outputBytes = 0  # Output read from the application so far
+
+
+	def start(self, outfile):
+		""" Start the application and wait for the scene to load. Output is
+			written to 'outfile'. Returns True if the session is ready.
+		"""
+		try:
+			self.process = subprocess.Popen(
+				self.args, 
+				stdin=subprocess.PIPE, 
+				stdout=subprocess.PIPE, 
+				stderr=subprocess.STDOUT, 
+				universal_newlines=True, 
+				bufsize=1, 
+				**processGroupArgs())
+		except OSError as e:
+			outfile.write("ERROR: Failed to start render session: %s\n" %e)
+			return False
+
+		response = self.read(outfile)
+		if response and response.get('ready'):
+			self.loadTime = response.get('loadTime')
+			return True
+		self.close()
+		return False
+
+
+	def read(self, outfile):
+		""" Copy the application's output to 'outfile' until a message from
+			the command loop is received, and return the message. Returns None
+			if the process exits.
+		"""
+		marker = "[RenderQueue] "
+		for line in iter(self.process.stdout.readline, ''):
+			self.outputBytes += len(line)
+			if line.startswith(marker):
+				return json.loads(line[len(marker):])
+			outfile.write(line)
+			outfile.flush()
+		return None
+
+
+	def render(self, frames, outfile):
+		""" Render the specified frames. Returns the result code, or None if
+			the session has died.
+		"""
+		try:
+			self.process.stdin.write(json.dumps({'frames': frames}) + "\n")
+			self.process.stdin.flush()
+		except (IOError, OSError, ValueError):
+			return None
+
+		response = self.read(outfile)
+		if response is None:
+			return None
+		return response.get('taskResult', 1)
+
+
+	def isAlive(self):
+		""" Return True if the application process is still running.
+		"""
+		return self.process is not None and pollProcess(self.process) is None
+
+
+	def close(self, timeout=10):
+		""" Ask the application to quit, killing it if it doesn't exit
+			within 'timeout' seconds.
+		"""
+		if not self.isAlive():
+			return
+		try:
+			self.process.stdin.write(json.dumps({'quit': True}) + "\n")
+			self.process.stdin.close()
+		except (IOError, OSError, ValueError):
+			pass
+
+		for i in range(int(timeout*10)):
+			if pollProcess(self.process) is not None:
+				break
+			time.sleep(0.1)
+		else:
+			killProcessGroup(self.process, grace=0)
+			while pollProcess(self.process) is None:
+				time.sleep(0.1)
+
+
+def closeSession(workerID):
+	""" Close the render session held by the specified worker, if any.
+	"""
+	session = sessions.pop(workerID, None)
+	if session is not None:
+		session.close()
+
+
+def closeAllSessions():
+	""" Close all render sessions.
+	"""
+	for workerID in list(sessions.keys()):
+		closeSession(workerID)
+
 # ----------------------------------------------------------------------------
+# End render session class
+# ============================================================================
 # Begin worker thread class
 # ----------------------------------------------------------------------------
 
@@ -32,10 +242,15 @@ class WorkerThread(QtCore.QThread):
 	# printMessage = QtCore.Signal(str)
 	# printProgress = QtCore.Signal(str)
 	# updateProgressBar = QtCore.Signal(int)
-	taskCompleted = QtCore.Signal(str, int) #, float
-	taskFailed = QtCore.Signal(str, int) #, float
-
-	def __init__(self, job, task, worker, logfile, ignore_errors=True):
+	taskCompleted = QtCore.Signal(str, int, str, float, dict)
+	taskFailed = QtCore.Signal(str, int, str, float, dict)
+	taskCancelled = QtCore.Signal(str, int)
+
+	def __init__(self, job, task, worker, logfile, ignore_errors=True, 
+		timeout=0, stall_timeout=0, log_max_size=0, log_backups=tasklog.BACKUPS, 
+		log_compress=True, log_local_dir=None, 
+		log_upload_interval=tasklog.UPLOAD_INTERVAL, heartbeat=None, 
+		heartbeat_interval=15):
 		QtCore.QThread.__init__(self)
 		self.job = job
 		self.task = task
@@ -43,12 +258,28 @@ class WorkerThread(QtCore.QThread):
 		self.logfile = logfile
 		self.ignore_errors = ignore_errors
 		self.files_processed = 0
+		self.process = None
+		self.session = None
+		self.outputBytes = 0  # Output read from the render process so far
+		self.resources = {}
+		self.timeout = timeout
+		self.stall_timeout = stall_timeout
+		self.heartbeat = heartbeat
+		self.heartbeat_interval = heartbeat_interval
+		self.cancelled = False
+		self.reported = False  # Set once the result has been signalled
+		self.done = threading.Event()
 
 		print(self)
 
-		# Set up logging
-		logger_name = '%s_logger' %os.path.splitext(os.path.basename(logfile))[0]
-		self.task_logger = common.setup_logger(logger_name, logfile)
+		# Set up logging - render output and log messages are written to the
+		# same size-capped log, buffered on local disk if 'log_local_dir'
+		# is set
+		self.log = tasklog.TaskLog(logfile, log_max_size, log_backups, 
+			compressLog=log_compress, localDir=log_local_dir, 
+			uploadInterval=log_upload_interval)
+		self.logger_name = '%s_logger' %os.path.splitext(os.path.basename(logfile))[0]
+		self.task_logger = common.setup_logger(self.logger_name, self.log)
 
 
 	def __del__(self):
@@ -56,7 +287,25 @@ class WorkerThread(QtCore.QThread):
 
 
 	def run(self):
-		self._render_task()
+		""" Render the task. If an error occurs, e.g. because the job or
+			task data is invalid, the render is killed and the task is failed.
+			The log is always closed.
+		"""
+		try:
+			self._render_task()
+
+		except Exception:
+			self.done.set()  # Stop the watchdog
+			self.killProcess()
+			self.task_logger.exception("Error rendering task on worker %s (%s)" 
+				%(self.worker['name'], self.worker['id']))
+			if not self.reported:
+				self.reported = True
+				self.taskFailed.emit(self.task['jobID'], self.task['taskNo'], 
+					self.worker['id'], self.resources.get('wallTime', 0.0), self.resources)
+
+		finally:
+			self.closeLog()
 
 
 	def _render_task(self):
@@ -112,6 +361,10 @@ class WorkerThread(QtCore.QThread):
 				args.append('-r')
 				args.append(self.job['renderer'])
 
+			if self.job.get('maxThreads'):
+				args.append('-n')
+				args.append(str(self.job['maxThreads']))
+
 			# Set arnold verbosity (temp)
 			if self.job['renderer'] == "arnold":
 				args.append('-ai:lve')
@@ -176,6 +429,10 @@ class WorkerThread(QtCore.QThread):
 			if self.job['interactiveLicense']:
 				args.append('-i')
 
+			if self.job.get('maxThreads'):
+				args.append('-m')
+				args.append(str(self.job['maxThreads']))
+
 			# if self.job['flags']:
 			# 	args.append(self.job['flags'])
 
@@ -198,17 +455,41 @@ class WorkerThread(QtCore.QThread):
 		# self.renderProcess.start(cmdStr)
 		# self.updateRenderQueueView()
 
-		cmd_str = " ".join(args)
-		self.task_logger.info("Render command:\n%s" %cmd_str)
+		start_time = time.time()
 
-		# Execute the command, redirect output to log, catch errors
-		try:
-			with open(self.logfile, 'a') as outfile:
-				result = subprocess.check_call(
-					args, stdout=outfile, stderr=outfile)
+		# Start the watchdog to kill the render if it hangs
+		watchdog = threading.Thread(target=self._watchdog)
+		watchdog.daemon = True
+		watchdog.start()
 
-		except subprocess.CalledProcessError as e:
-			result = e.returncode
+		# Keep the worker alive while rendering, so the task isn't reaped
+		# if the UI is busy
+		if self.heartbeat is not None:
+			heartbeat = threading.Thread(target=self._heartbeat)
+			heartbeat.daemon = True
+			heartbeat.start()
+
+		if self.job.get('sessionMode'):
+			# Render in a persistent application process
+			result = self._render_in_session()
+
+		else:
+			cmd_str = " ".join(args)
+			self.task_logger.info("Render command:\n%s" %cmd_str)
+
+			# Execute the command, redirect output to log, catch errors
+			try:
+				result = self._execute(args, self.log)
+
+			except OSError as e:
+				self.task_logger.error("Failed to start render process: %s" %e)
+				result = 1
+
+		self.done.set()
+		watchdog.join()
+		self.resources['wallTime'] = round(time.time() - start_time, 2)
+		self.task_logger.info("Resources used: %s" %", ".join(
+			"%s=%s" %(key, self.resources[key]) for key in sorted(self.resources)))
 		# renderProcess = QtCore.QProcess(self)
 		# renderProcess.start(args[0], args[1:])
 
@@ -218,20 +499,385 @@ class WorkerThread(QtCore.QThread):
 
 		# Complete or fail the task depending on return code
 		#print(result)
-		if result == 0:  # Normal exit code
+		self.reported = True
+		if self.cancelled:  # Killed by user, return task to the queue
+			self.task_logger.warning("Render cancelled on worker %s (%s)" 
+				%(self.worker['name'], self.worker['id']))
+			self.taskCancelled.emit(self.task['jobID'], self.task['taskNo'])
+		elif result == 0:  # Normal exit code
 			self.task_logger.info("Render completed successfully on worker %s (%s)" 
 				%(self.worker['name'], self.worker['id']))
-			self.taskCompleted.emit(self.task['jobID'], self.task['taskNo']) #, taskTime=1)
+			self.taskCompleted.emit(self.task['jobID'], self.task['taskNo'], 
+				self.worker['id'], self.resources['wallTime'], self.resources)
 		else:  # Failure
 			self.task_logger.error("Render failed on worker %s (%s)" 
 				%(self.worker['name'], self.worker['id']))
-			self.taskFailed.emit(self.task['jobID'], self.task['taskNo']) #, taskTime=1)
+			self.taskFailed.emit(self.task['jobID'], self.task['taskNo'], 
+				self.worker['id'], self.resources['wallTime'], self.resources)
 
 		divider = "="*80
 		self.task_logger.info("Log ends\n%s" %divider)
 
 		return result
 
+
+	def closeLog(self):
+		""" Close the task logger, then close the log, copying it to the
+			shared log folder if it was buffered locally.
+		"""
+		common.close_logger(self.logger_name)
+		self.log.close()
+
+
+	def _execute(self, args, outfile, interval=0.5):
+		""" Run the render process and wait for it to finish, applying the
+			job's resource limits and recording the resources used in
+			self.resources. Returns the exit code.
+			Optional limits set on the job:
+			'maxMemory' - resident memory (GB), the process is killed if it
+			uses more (see enforceMemoryLimit()).
+			'maxThreads' - passed to the renderer as a command line flag
+			and/or environment variables.
+			Time limits are enforced separately by the watchdog.
+			CPU time and peak memory are read with os.wait4() and I/O is
+			sampled from /proc while the process runs, where available.
+		"""
+		env = os.environ.copy()
+		if self.job.get('maxThreads'):
+			for key in ['OMP_NUM_THREADS', 'HOUDINI_MAXTHREADS']:
+				env[key] = str(self.job['maxThreads'])
+
+		# Output is copied to the log by a separate thread, so the log can
+		# be rotated while the render is running
+		self.process = subprocess.Popen(
+			args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env, 
+			**processGroupArgs())
+		pid = self.process.pid
+		pump = threading.Thread(target=self._copyOutput, args=(self.process.stdout, outfile))
+		pump.daemon = True
+		pump.start()
+
+		while True:
+			# Check if the process has exited, collecting resource usage.
+			# This is the only place the process is reaped.
+			if hasattr(os, 'wait4'):
+				with reapLock:
+					try:
+						exited, status, rusage = os.wait4(pid, os.WNOHANG)
+					except OSError:  # Exit status lost, e.g. SIGCHLD ignored, as subprocess does
+						exited, status, rusage = pid, 0, None
+						self.process.returncode = 0
+					if exited:
+						if os.WIFSIGNALED(status):
+							self.process.returncode = -os.WTERMSIG(status)
+						else:
+							self.process.returncode = os.WEXITSTATUS(status)
+				if exited:
+					result = self.process.returncode
+					if rusage is not None:
+						self.recordRusage(rusage)
+					break
+			else:
+				result = pollProcess(self.process)
+				if result is not None:
+					break
+
+			# Sample resources and enforce limits
+			self.sampleProcess(pid)
+			self.enforceMemoryLimit(self.process)
+
+			time.sleep(interval)
+
+		pump.join(5)  # Don't wait for children which outlived the process
+		self.resources.pop('rss', None)
+		return result
+
+
+	def enforceMemoryLimit(self, process):
+		""" Kill the process if the memory it was last sampled using exceeds
+			the job's 'maxMemory' limit (GB). Returns True if it was killed.
+		"""
+		max_memory = self.job.get('maxMemory')
+		if not max_memory or self.resources.get('rss', 0) <= float(max_memory) * 1024:
+			return False
+		self.task_logger.error("Memory limit of %s GB exceeded, killing render" %max_memory)
+		self.resources['limitExceeded'] = 'maxMemory'
+		killProcessGroup(process, grace=0)
+		return True
+
+
+	def _copyOutput(self, pipe, outfile):
+		""" Copy the output of the render process to the log until the
+			process closes it.
+		"""
+		fd = pipe.fileno()
+		try:
+			for data in iter(lambda: os.read(fd, tasklog.CHUNK_SIZE), b""):
+				self.outputBytes += len(data)
+				outfile.write(data)
+				outfile.flush()
+		except (IOError, OSError):
+			pass
+		finally:
+			pipe.close()
+
+
+	def _watchdog(self, interval=1):
+		""" Monitor the render and kill it if it runs longer than the hard
+			time limit, or if it stalls, i.e. outputs nothing for the stall
+			period. Messages logged by the worker don't count as output. Limits (seconds) are taken from the job's
+			'timeout' and 'stallTimeout' values, falling back to the limits
+			the thread was created with. A value of zero disables the check.
+			Runs in its own thread until the render finishes.
+		"""
+		timeout = float(self.job.get('timeout', self.timeout) or 0)
+		stall_timeout = float(self.job.get('stallTimeout', self.stall_timeout) or 0)
+		if not (timeout or stall_timeout):
+			return
+
+		start_time = last_output = time.time()
+		last_size = None
+
+		while not self.done.wait(interval):
+			now = time.time()
+			size = self.getOutputBytes()
+			if size != last_size:
+				last_size = size
+				last_output = now
+
+			if timeout and now - start_time > timeout:
+				self.task_logger.error("Time limit of %s seconds exceeded, killing render" %timeout)
+				self.resources['limitExceeded'] = 'timeout'
+			elif stall_timeout and now - last_output > stall_timeout:
+				self.task_logger.error("No output for %s seconds, render appears to have stalled, killing render" %stall_timeout)
+				self.resources['limitExceeded'] = 'stalled'
+			else:
+				continue
+
+			self.killProcess()
+			return
+
+
+	def getOutputBytes(self):
+		""" Return the number of bytes of output read from the render
+			process, or from the render session, so far.
+		"""
+		if self.session is not None:
+			return self.session.outputBytes
+		return self.outputBytes
+
+
+	def _heartbeat(self):
+		""" Call the heartbeat function every 'heartbeat_interval' seconds
+			until the render finishes. Runs in its own thread.
+		"""
+		while not self.done.wait(self.heartbeat_interval):
+			try:
+				self.heartbeat()
+			except Exception as e:
+				self.task_logger.warning("Heartbeat failed: %s" %e)
+
+
+	def killProcess(self):
+		""" Kill the render process and any processes it has spawned.
+		"""
+		process = self.process
+		if process is None and self.session is not None:
+			process = self.session.process
+		if process is not None and process.returncode is None:
+			killProcessGroup(process)
+
+
+	def stop(self):
+		""" Cancel the render. The task is returned to the queue rather
+			than being failed.
+		"""
+		self.cancelled = True
+		killer = threading.Thread(target=self.killProcess)
+		killer.daemon = True
+		killer.start()
+
+
+	def recordRusage(self, rusage):
+		""" Store CPU time (seconds) and peak memory (MB) from the process's
+			resource usage.
+		"""
+		self.resources['cpuUser'] = round(rusage.ru_utime, 2)
+		self.resources['cpuSystem'] = round(rusage.ru_stime, 2)
+		if platform.system() == "Darwin":
+			max_rss = rusage.ru_maxrss / 1024.0**2  # Bytes
+		else:
+			max_rss = rusage.ru_maxrss / 1024.0  # KB
+		self.resources['maxRss'] = round(max(max_rss, self.resources.get('maxRss', 0)), 1)
+
+
+	def sampleProcess(self, pid):
+		""" Read current memory and cumulative I/O of the process from /proc
+			(Linux only). Memory is the total for the process group, so
+			renderers which spawn child processes count in full.
+		"""
+		try:
+			rss = 0
+			for member in getProcessGroup(pid):
+				try:
+					with open('/proc/%d/status' %member) as f:
+						for line in f:
+							if line.startswith('VmRSS:'):
+								rss += int(line.split()[1]) / 1024.0  # KB
+				except (IOError, OSError):
+					pass  # Process has exited
+			self.resources['rss'] = rss
+			self.resources['maxRss'] = max(rss, self.resources.get('maxRss', 0))
+			with open('/proc/%d/io' %pid) as f:
+				for line in f:
+					key, value = line.split(':')
+					if key == 'read_bytes':
+						self.resources['readBytes'] = int(value)
+					elif key == 'write_bytes':
+						self.resources['writeBytes'] = int(value)
+		except (IOError, OSError, ValueError):
+			pass
+
+
+	def sampleCpuTime(self, pid):
+		""" Return the user and system CPU time (seconds) used so far by the
+			process and the children it has waited for, read from /proc
+			(Linux only), or None if not available.
+		"""
+		try:
+			with open('/proc/%d/stat' %pid) as f:
+				fields = f.read().rsplit(')', 1)[1].split()  # From field 3
+			ticks = float(os.sysconf('SC_CLK_TCK'))
+			user = (int(fields[11]) + int(fields[13])) / ticks
+			system = (int(fields[12]) + int(fields[14])) / ticks
+			return user, system
+		except (IOError, OSError, ValueError, IndexError, AttributeError):
+			return None
+
+
+	def _monitor_session(self, session, stop, interval=0.5):
+		""" Sample the resources used by a render session while it renders
+			the task, killing it if it exceeds the job's memory limit, until
+			'stop' is set. The session renders other tasks too, so CPU time
+			and I/O are recorded as the amount used since the task started.
+			Runs in its own thread.
+		"""
+		pid = session.process.pid
+		cpu_start = self.sampleCpuTime(pid)
+		self.sampleProcess(pid)
+		io_start = {}
+		for key in ['readBytes', 'writeBytes']:
+			io_start[key] = self.resources.pop(key, 0)
+
+		while not stop.wait(interval):
+			self.sampleProcess(pid)
+			if self.enforceMemoryLimit(session.process):
+				break
+
+		self.sampleProcess(pid)
+		cpu_end = self.sampleCpuTime(pid)
+		if cpu_start and cpu_end:
+			self.resources['cpuUser'] = round(cpu_end[0] - cpu_start[0], 2)
+			self.resources['cpuSystem'] = round(cpu_end[1] - cpu_start[1], 2)
+		for key, value in io_start.items():
+			if key in self.resources:
+				self.resources[key] -= value
+		self.resources.pop('rss', None)
+
+
+	def _render_in_session(self):
+		""" Render the task in the worker's persistent session, starting a
+			new session if the worker doesn't have one for this job. If the
+			session dies, it is discarded and the task fails. The job's memory
+			limit applies to the session and its resource use is recorded, as
+			for a render process.
+		"""
+		workerID = self.worker['id']
+		session = sessions.get(workerID)
+		if session is not None and (session.jobID != self.job['jobID'] or not session.isAlive()):
+			closeSession(workerID)
+			session = None
+
+		if session is None:
+			args = self._session_args()
+			self.task_logger.info("Starting render session:\n%s" %" ".join(args))
+			session = RenderSession(self.job['jobID'], args)
+			self.session = session
+			if not session.start(self.log):
+				self.task_logger.error("Render session failed to start")
+				return 1
+			sessions[workerID] = session
+			self.task_logger.info("Scene loaded in %.1f seconds" %(session.loadTime or 0))
+		else:
+			self.task_logger.info("Rendering in existing session")
+			self.session = session
+
+		stop = threading.Event()
+		monitor = threading.Thread(target=self._monitor_session, args=(session, stop))
+		monitor.daemon = True
+		monitor.start()
+		try:
+			result = session.render(self.task['frames'], self.log)
+		finally:
+			stop.set()
+			monitor.join()
+
+		if result is None:
+			self.task_logger.error("Render session exited unexpectedly")
+			closeSession(workerID)
+			return 1
+		return result
+
+
+	def _session_args(self):
+		""" Construct the command to start a render session for the job.
+			Generic jobs use the job's command, which must run the session
+			command loop itself, e.g. 'python session.py --app dummy'.
+		"""
+		script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'session.py')
+
+		if self.job['jobType'] == "Generic":
+			args = self.job['command'].split()
+			if self.job['flags']:
+				args += self.job['flags'].split()
+
+		elif self.job['jobType'] == "Maya":
+			if platform.system() == "Windows":
+				args = ['C:/Program Files/Autodesk/Maya2018/bin/mayapy.exe']
+			elif platform.system() == "Darwin":
+				args = ['/Applications/Autodesk/maya2018/Maya.app/Contents/bin/mayapy']
+			else:
+				args = ['/usr/autodesk/maya2018/bin/mayapy']
+			args += [script, '--app', 'maya', 
+				'--scene', self.job['scene'], 
+				'--project', self.job['mayaProject']]
+			if self.job['renderer']:
+				args += ['--renderer', self.job['renderer']]
+			if self.job['renderLayers']:
+				args += ['--layer', self.job['renderLayer']]
+
+		elif self.job['jobType'] == "Houdini":
+			args = ['/opt/hfs/bin/hython', script, '--app', 'houdini', 
+				'--scene', self.job['scene'], 
+				'--driver', self.job['outputDriver']]
+
+		elif self.job['jobType'] == "Nuke":
+			if platform.system() == "Windows":
+				args = ['C:/Program Files/Nuke10.0v3/Nuke10.0.exe']
+			elif platform.system() == "Darwin":
+				args = ['/Applications/Nuke10.0v3/Nuke10.0v3.app/Contents/MacOS/Nuke10.0v3']
+			else:
+				args = ['/usr/local/bin/nuke']
+			if self.job['nukeX']:
+				args.append('--nukex')
+			if self.job['interactiveLicense']:
+				args.append('-i')
+			args += ['-t', script, '--app', 'nuke', '--scene', self.job['scene']]
+			if self.job['renderLayers']:  # (Write nodes)
+				args += ['--write', self.job['renderLayer']]
+
+		return args
+
 # ----------------------------------------------------------------------------
 # End worker thread class
 # ============================================================================